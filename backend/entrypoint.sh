@@ -23,6 +23,16 @@ python manage.py migrate study_tracker
 # 他のマイグレーションがあれば実行
 python manage.py migrate
 
+# 獲得金額が未保存の終了済みセッションをバックフィル（未設定の行がなければ何もしない）
+python manage.py backfill_session_earnings
+
+# 既存のセッション履歴から日別集計を作成（集計テーブルが空の場合のみ。獲得金額のバックフィル後に実行する）
+python manage.py rebuild_study_rollups --if-empty
+
+# 期限切れのJWTリフレッシュトークンとセッションを削除
+python manage.py prune_expired_tokens
+python manage.py purge_expired_sessions
+
 # Admin ユーザーを作成
 echo "Creating superuser..."
 python manage.py shell -c "
@@ -52,6 +62,32 @@ else:
     print(f'✅ スーパーユーザーを作成しました: {username} ({email})')
 "
 
+# AI学習分析の非同期ワーカーを起動（AI_WORKER_ENABLED=True の場合のみ）
+if [ "$AI_WORKER_ENABLED" = "True" ]; then
+    echo "Starting analysis worker..."
+    python manage.py run_analysis_worker &
+fi
+
+# 期限切れトークンの定期削除（TOKEN_PRUNE_INTERVAL 秒ごと、設定時のみ）
+if [ -n "$TOKEN_PRUNE_INTERVAL" ]; then
+    python manage.py prune_expired_tokens --every "$TOKEN_PRUNE_INTERVAL" &
+fi
+
+# 期限切れセッションの定期削除（SESSION_PURGE_INTERVAL 秒ごと、設定時のみ）
+if [ -n "$SESSION_PURGE_INTERVAL" ]; then
+    python manage.py purge_expired_sessions --every "$SESSION_PURGE_INTERVAL" &
+fi
+
+# 貯金目標の残高をセッション履歴から定期的に再計算（GOAL_RECONCILE_INTERVAL 秒ごと、設定時のみ）
+if [ -n "$GOAL_RECONCILE_INTERVAL" ]; then
+    python manage.py reconcile_goals --every "$GOAL_RECONCILE_INTERVAL" &
+fi
+
+# 週間・月間ランキングの定期的な再構築（LEADERBOARD_REBUILD_INTERVAL 秒ごと、設定時のみ）
+if [ -n "$LEADERBOARD_REBUILD_INTERVAL" ]; then
+    python manage.py rebuild_leaderboards --every "$LEADERBOARD_REBUILD_INTERVAL" &
+fi
+
 # Djangoアプリケーションを起動
 echo "Starting application..."
 cd /app/study_project
@@ -67,6 +67,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'study_tracker.middleware.RateLimitMiddleware',  # レート制限ミドルウェア
+    'study_tracker.middleware.AdmissionControlMiddleware',  # 高コストなエンドポイントの同時実行数制御
 ]
 
 ROOT_URLCONF = 'study_project.urls'
@@ -103,6 +104,9 @@ DATABASES = {
     )
 }
 
+# テスト（benchmark タグのテストは --tag benchmark を指定した場合のみ実行）
+TEST_RUNNER = 'study_project.test_runner.TestRunner'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -147,7 +151,10 @@ CSRF_TRUSTED_ORIGINS = [origin.strip() for origin in os.environ.get('CSRF_TRUSTE
 
 # Cookie認証のための設定
 CORS_ALLOW_CREDENTIALS = True
-CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+CORS_EXPOSE_HEADERS = [
+    'Content-Type', 'X-CSRFToken', 'ETag',
+    'X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset', 'Retry-After',
+]
 
 # CORSを許可するメソッド
 CORS_ALLOW_METHODS = [
@@ -166,6 +173,7 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'if-none-match',  # 条件付きGET（ETag）
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -186,7 +194,7 @@ CSRF_COOKIE_DOMAIN = None
 SESSION_COOKIE_DOMAIN = None
 
 # セッション設定 - JWT認証では必要ないが、Django管理画面用に残しておく
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'  # キャッシュから読み込み、DBにも書き込む
 SESSION_COOKIE_NAME = 'sessionid'
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 1  # 1日に短縮
@@ -201,13 +209,80 @@ CSRF_COOKIE_DOMAIN = None
 CSRF_HEADER_NAME = 'HTTP_X_CSRFTOKEN'  # 標準ヘッダー名
 CSRF_FAILURE_VIEW = 'django.views.csrf.csrf_failure'
 
+# キャッシュ設定
+# 統計などのユーザー別キャッシュはデータバージョン付きのキーで保存し、
+# 古いエントリは TIMEOUT または MAX_ENTRIES 超過時に削除される
+# REDIS_URL を設定すると全ワーカーで共有する Redis を使用（レート制限を全体で正しく適用するため本番では推奨）
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 300,
+            'KEY_PREFIX': 'study-savings',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'study-savings',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '10000')),
+            },
+        }
+    }
+USER_DATA_CACHE_TIMEOUT = int(os.environ.get('USER_DATA_CACHE_TIMEOUT', '300'))  # ユーザー別キャッシュのTTL（秒）
+STATS_CACHE_TIMEOUT = int(os.environ.get('STATS_CACHE_TIMEOUT', '600'))  # 統計レスポンスのTTL（秒）
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', '300'))  # JWT認証ユーザーの共有キャッシュのTTL（秒）
+
+# オフライン記録の一括登録（1リクエストあたりの最大セッション数）
+SESSION_BATCH_MAX_SIZE = int(os.environ.get('SESSION_BATCH_MAX_SIZE', '500'))
+
+# ランキング（上位ページの共有キャッシュのTTL、秒）
+LEADERBOARD_CACHE_TIMEOUT = int(os.environ.get('LEADERBOARD_CACHE_TIMEOUT', '30'))
+
+# レート制限（スライディングウィンドウ、JWT認証済みはユーザーID・それ以外はIPアドレスごと）
+RATE_LIMITS = {
+    # 認証関連エンドポイント
+    'auth': {
+        'window': int(os.environ.get('RATE_LIMIT_AUTH_WINDOW', '60')),  # 秒
+        'max_requests': int(os.environ.get('RATE_LIMIT_AUTH_MAX_REQUESTS', '10')),
+    },
+    # API全般
+    'api': {
+        'window': int(os.environ.get('RATE_LIMIT_API_WINDOW', '60')),  # 秒
+        'max_requests': int(os.environ.get('RATE_LIMIT_API_MAX_REQUESTS', '100')),
+    },
+}
+
+# 高コストなエンドポイントの同時実行数制御（REDIS_URL 設定時はクラスター全体、未設定時はプロセスごと）
+ADMISSION_POOLS = {
+    'ai': int(os.environ.get('ADMISSION_AI_CAPACITY', '4')),  # AI 呼び出しの同時実行数
+    'reports': int(os.environ.get('ADMISSION_REPORTS_CAPACITY', '16')),  # 統計系の同時実行コストの上限
+}
+# URL 名ごとのプール・コスト・対象メソッド（per_user=True は同じユーザーの同時実行を1件まで）
+ADMISSION_ROUTES = {
+    'analyze-learning': {'pool': 'ai', 'cost': 1, 'methods': ('POST',), 'per_user': True},
+    'analyze-learning-stream': {'pool': 'ai', 'cost': 1, 'methods': ('POST',), 'per_user': True},
+    'stats': {'pool': 'reports', 'cost': 1, 'methods': ('GET',), 'per_user': False},
+    'stats-series': {'pool': 'reports', 'cost': 1, 'methods': ('GET',), 'per_user': False},
+    'leaderboard': {'pool': 'reports', 'cost': 1, 'methods': ('GET',), 'per_user': False},
+    'stats-features': {'pool': 'reports', 'cost': 2, 'methods': ('GET',), 'per_user': False},
+    'study-session-export': {'pool': 'reports', 'cost': 2, 'methods': ('GET',), 'per_user': True},
+}
+ADMISSION_LEASE_SECONDS = int(os.environ.get('ADMISSION_LEASE_SECONDS', '300'))  # 解放されなかったスロットが自動で空くまでの秒数
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', '5'))  # 503 の Retry-After（秒）
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # 基本的に認証必要
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  # JWT認証のみサポート
+        'study_tracker.authentication.CachedJWTAuthentication',  # JWT認証のみサポート（ユーザーはキャッシュから解決）
     ],
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -230,6 +305,7 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',  # ユーザーIDフィールド
     'USER_ID_CLAIM': 'user_id',  # ユーザーIDクレーム
 }
+JWT_BLACKLIST_NEGATIVE_TTL = int(os.environ.get('JWT_BLACKLIST_NEGATIVE_TTL', '300'))  # ブラックリストに含まれないという判定を共有キャッシュに保存する秒数
 
 # ロギング設定
 LOGGING = {
@@ -280,6 +356,18 @@ if not DEBUG:
 # Vertex AI設定
 GCP_PROJECT_ID = os.environ.get('GCP_PROJECT_ID', '')
 GCP_REGION = os.environ.get('GCP_REGION', 'us-central1')
+AI_MODEL_NAME = os.environ.get('AI_MODEL_NAME', 'gemini-2.0-flash')
+AI_BACKEND = os.environ.get('AI_BACKEND', 'vertex')  # 'vertex' または 'stub'（Vertex AI を呼び出さないスタブ、開発・負荷試験用）
+AI_STUB_LATENCY_MS = int(os.environ.get('AI_STUB_LATENCY_MS', '0'))  # スタブの応答遅延（ミリ秒）
+AI_PROMPT_TOKEN_BUDGET = int(os.environ.get('AI_PROMPT_TOKEN_BUDGET', '2000'))  # 学習分析プロンプトの推定トークン数の上限
+
+# AI学習分析の非同期ワーカー（manage.py run_analysis_worker）
+AI_WORKER_CONCURRENCY = int(os.environ.get('AI_WORKER_CONCURRENCY', '2'))  # 同時実行数
+AI_JOB_STALE_SECONDS = int(os.environ.get('AI_JOB_STALE_SECONDS', '600'))  # 実行中のまま放置されたジョブを再登録するまでの秒数
+
+# AI学習分析結果のキャッシュ（入力が同じ場合は再生成しない）
+AI_ANALYSIS_CACHE_TTL = int(os.environ.get('AI_ANALYSIS_CACHE_TTL', str(60 * 60 * 24)))  # 有効期間（秒）
+AI_ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get('AI_ANALYSIS_CACHE_MAX_ENTRIES', '10'))  # ユーザーごとの保存件数上限
 
 # 認証周り
 #ログイン処理時に認証で行うクラスにallauthを追加する
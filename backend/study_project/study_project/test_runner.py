@@ -0,0 +1,16 @@
+"""
+テストランナー
+
+benchmark タグのテスト（大量データを作成するため時間がかかる）はデフォルトでは除外し、
+--tag benchmark を指定した場合のみ実行します。
+"""
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """--tag の指定がない場合は benchmark タグのテストを除外する DiscoverRunner"""
+
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        if not tags:
+            exclude_tags = set(exclude_tags or ()) | {'benchmark'}
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Subject, StudySession, SavingsGoal
+from .models import (
+    Subject, StudySession, SavingsGoal, DailyStudyRollup, LeaderboardEntry, LearningAnalysis, LearningAnalysisJob
+)
 
 
 class SubjectAdmin(admin.ModelAdmin):
@@ -20,6 +22,31 @@ class SavingsGoalAdmin(admin.ModelAdmin):
     search_fields = ('title',)
 
 
+class DailyStudyRollupAdmin(admin.ModelAdmin):
+    list_display = ('date', 'user', 'subject', 'total_seconds', 'earned_amount', 'session_count')
+    list_filter = ('user', 'date')
+
+
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ('period', 'period_start', 'subject_name', 'user', 'total_seconds', 'earned_amount')
+    list_filter = ('period', 'period_start')
+    search_fields = ('subject_name', 'user__username')
+
+
+class LearningAnalysisAdmin(admin.ModelAdmin):
+    list_display = ('user', 'model_name', 'hit_count', 'last_used_at', 'created_at')
+    list_filter = ('model_name',)
+
+
+class LearningAnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'status', 'cached', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+
+
 admin.site.register(Subject, SubjectAdmin)
 admin.site.register(StudySession, StudySessionAdmin)
 admin.site.register(SavingsGoal, SavingsGoalAdmin)
+admin.site.register(DailyStudyRollup, DailyStudyRollupAdmin)
+admin.site.register(LeaderboardEntry, LeaderboardEntryAdmin)
+admin.site.register(LearningAnalysis, LearningAnalysisAdmin)
+admin.site.register(LearningAnalysisJob, LearningAnalysisJobAdmin)
@@ -0,0 +1,77 @@
+"""
+高コストなエンドポイントの同時実行数制御（アドミッション制御）
+
+プールごとに容量（スロット数）を決め、リクエストはルートのコスト分のスロットを
+cache.add で確保してから処理します。スロットにはリース期限（TTL）があるため、
+プロセスが異常終了して解放されなかった場合も一定時間後に自動的に空きます。
+ユーザー単位の同時実行（同じユーザーの AI 分析は1件まで）も同じ仕組みで制限します。
+REDIS_URL で共有キャッシュを設定するとクラスター全体、未設定の場合はプロセスごとの制限になります。
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+SLOT_KEY = 'admission:{pool}:slot:{index}'
+USER_KEY = 'admission:{pool}:user:{ident}'
+
+
+class Admission:
+    """確保したスロットとユーザーロック。release() で解放する"""
+
+    def __init__(self, keys, token):
+        self.keys = keys
+        self.token = token
+        self.released = False
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        # リース期限切れ後に他のリクエストが確保したキーは削除しない
+        owned = [key for key, value in cache.get_many(self.keys).items() if value == self.token]
+        if owned:
+            cache.delete_many(owned)
+
+
+class AdmissionRejected(Exception):
+    """容量不足、または同じユーザーの処理が実行中のため受け付けられない場合の例外"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _acquire(key, token):
+    return cache.add(key, token, settings.ADMISSION_LEASE_SECONDS)
+
+
+def admit(pool, cost=1, ident=None):
+    """
+    pool のスロットを cost 個確保して Admission を返す
+
+    ident を指定した場合はユーザー単位のロックも確保します。確保できない場合は
+    確保済みのものを解放して AdmissionRejected（reason は 'user' または 'capacity'）を送出します。
+    """
+    token = uuid.uuid4().hex
+    admission = Admission([], token)
+
+    if ident is not None:
+        user_key = USER_KEY.format(pool=pool, ident=ident)
+        if not _acquire(user_key, token):
+            raise AdmissionRejected('user')
+        admission.keys.append(user_key)
+
+    slots = 0
+    for index in range(settings.ADMISSION_POOLS[pool]):
+        if slots >= cost:
+            break
+        slot_key = SLOT_KEY.format(pool=pool, index=index)
+        if _acquire(slot_key, token):
+            admission.keys.append(slot_key)
+            slots += 1
+
+    if slots < cost:
+        admission.release()
+        raise AdmissionRejected('capacity')
+    return admission
@@ -1,175 +1,286 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel
 from django.conf import settings
 import logging
-import os
 import json
+import hashlib
 from datetime import datetime, timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.utils import timezone
 
+from .caching import get_data_version
+from .features import compute_learning_features, load_session_columns
+from .llm_backends import get_backend
+from .models import LearningAnalysis
+from .prompts import build_learning_prompt
+from .stats import get_period_totals, get_subject_totals
+
 logger = logging.getLogger(__name__)
 
-# Vertex AIの初期化
-def initialize_vertex_ai():
+class AIGenerationError(Exception):
+    """AIモデルからの応答生成に失敗した場合の例外"""
+
+
+# プロンプトを送信して応答テキストを返す（失敗時は AIGenerationError）
+def generate_content(prompt, model_name=None, temperature=0.2, backend=None):
+    model_name = model_name or settings.AI_MODEL_NAME
     try:
-        # 環境変数から値を取得するか、settings.pyから取得
-        project_id = os.getenv('GCP_PROJECT_ID', getattr(settings, 'GCP_PROJECT_ID', None))
-        location = os.getenv('GCP_REGION', getattr(settings, 'GCP_REGION', 'us-central1'))
-
-        if not project_id:
-            raise ValueError("GCP_PROJECT_IDが設定されていません")
-
-        vertexai.init(
-            project=project_id,
-            location=location
-        )
-        logger.info("Vertex AI initialized successfully")
+        return (backend or get_backend()).generate(prompt, model_name, temperature)
     except Exception as e:
-        logger.error(f"Failed to initialize Vertex AI: {str(e)}")
-        raise
+        logger.error(f"Error generating AI response: {str(e)}")
+        raise AIGenerationError(str(e)) from e
 
-# Geminiモデルのインスタンス取得
-def get_gemini_model(model_name="gemini-2.0-flash"):
+# プロンプトを送信し、生成された応答テキストをチャンク単位で返すジェネレーター
+def generate_content_stream(prompt, model_name=None, temperature=0.2, backend=None):
+    model_name = model_name or settings.AI_MODEL_NAME
     try:
-        initialize_vertex_ai()
-        model = GenerativeModel(model_name)
-        return model
+        yield from (backend or get_backend()).stream(prompt, model_name, temperature)
     except Exception as e:
-        logger.error(f"Failed to load Gemini model: {str(e)}")
-        raise
+        logger.error(f"Error streaming AI response: {str(e)}")
+        raise AIGenerationError(str(e)) from e
 
 # 汎用的なプロンプト送信関数
-def generate_response(prompt, model_name="gemini-2.0-flash", temperature=0.2):
+def generate_response(prompt, model_name=None, temperature=0.2):
     try:
-        model = get_gemini_model(model_name)
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        logger.error(f"Error generating AI response: {str(e)}")
+        return generate_content(prompt, model_name, temperature)
+    except AIGenerationError:
         return "AI分析を生成できませんでした。後でもう一度お試しください。"
 
-# 学習分析のための関数
-def analyze_learning(user, study_purpose):
+# 分析入力の形式やプロンプトを変更した場合は更新する（キャッシュキーに含まれる）
+ANALYSIS_PROMPT_VERSION = 3
+
+ANALYSIS_ERROR_MESSAGE = "学習データの分析中にエラーが発生しました。後でもう一度お試しください。"
+
+
+def collect_learning_data(user, study_purpose):
     """
-    ユーザーの学習目的と学習データに基づいて分析を行う
+    学習分析の入力データを正規化した辞書として収集する
+
+    同じ学習状況からは同じ辞書が得られるように、数値は丸め、並び順は固定します。
     """
-    try:
-        # 現在の日時
-        now = timezone.now()
-
-        # 今月の勉強時間を計算
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        month_sessions = user.study_sessions.filter(
-            end_time__isnull=False,
-            start_time__gte=month_start
-        )
-
-        total_month_hours = sum(
-            [session.duration.total_seconds() / 3600 if session.duration else 0 for session in month_sessions]
-        )
-
-        # 今週の勉強時間を計算
-        week_start = now - timedelta(days=now.weekday())
-        week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_sessions = user.study_sessions.filter(
-            end_time__isnull=False,
-            start_time__gte=week_start
-        )
-
-        total_week_hours = sum(
-            [session.duration.total_seconds() / 3600 if session.duration else 0 for session in week_sessions]
-        )
-
-        # 30日以内の勉強セッションを取得
-        thirty_days_ago = now - timedelta(days=30)
-        recent_sessions = user.study_sessions.filter(
-            end_time__isnull=False,
-            start_time__gte=thirty_days_ago
-        ).order_by('-start_time')
-
-        # 科目ごとの勉強時間を集計
-        subject_hours = {}
-        for session in recent_sessions:
-            subject_name = session.subject.name
-            hours = session.duration.total_seconds() / 3600 if session.duration else 0
-
-            if subject_name in subject_hours:
-                subject_hours[subject_name] += hours
-            else:
-                subject_hours[subject_name] = hours
-
-        # 最近のセッション情報を整形
-        recent_sessions_data = []
-        for session in recent_sessions[:15]:  # 最新15セッションまで
-            session_data = {
-                "date": session.start_time.strftime("%Y-%m-%d"),
-                "subject": session.subject.name,
-                "duration_hours": round(session.duration.total_seconds() / 3600, 2) if session.duration else 0,
-                "notes": session.notes[:100] + "..." if session.notes and len(session.notes) > 100 else session.notes
-            }
-            recent_sessions_data.append(session_data)
-
-        # 科目の時給換算額も取得
-        subjects_data = []
-        for subject in user.subjects.all():
-            subjects_data.append({
-                "name": subject.name,
-                "hourly_rate": float(subject.hourly_rate)
-            })
-
-        # 貯金目標情報
-        savings_goals = []
-        for goal in user.savings_goals.all():
-            goal_data = {
-                "title": goal.title,
-                "target_amount": float(goal.target_amount),
-                "current_amount": float(goal.current_amount),
-                "deadline": goal.deadline.strftime("%Y-%m-%d") if goal.deadline else "未設定",
-                "is_achieved": goal.is_achieved,
-                "progress_percentage": goal.progress_percentage
+    # 現在の日時
+    now = timezone.now()
+
+    # 日別集計から今月・今週・過去30日の勉強時間を計算
+    today = timezone.localdate()
+    thirty_days_ago = now - timedelta(days=30)
+    totals = get_period_totals(user, {
+        'month': today.replace(day=1),
+        'week': today - timedelta(days=today.weekday()),
+    })
+
+    # 科目ごとの勉強時間を集計
+    subject_hours = {
+        subject['name']: round(subject['total_seconds'] / 3600, 2)
+        for subject in get_subject_totals(user, since=timezone.localdate(thirty_days_ago))
+        if subject['total_seconds']
+    }
+
+    # 最近のセッション情報を整形（最新15セッションまで）
+    recent_sessions = user.study_sessions.filter(
+        end_time__isnull=False,
+        start_time__gte=thirty_days_ago
+    ).select_related('subject').order_by('-start_time', '-id')[:15]
+
+    recent_sessions_data = []
+    for session in recent_sessions:
+        recent_sessions_data.append({
+            "date": timezone.localtime(session.start_time).strftime("%Y-%m-%d"),
+            "subject": session.subject.name,
+            "duration_hours": round(session.duration.total_seconds() / 3600, 2) if session.duration else 0,
+            "notes": session.notes[:100] + "..." if session.notes and len(session.notes) > 100 else session.notes
+        })
+
+    # 科目の時給換算額も取得
+    subjects = list(user.subjects.order_by('id'))
+    subjects_data = [
+        {"name": subject.name, "hourly_rate": float(subject.hourly_rate)}
+        for subject in subjects
+    ]
+
+    # セッション履歴全体から学習パターン（時間帯・曜日・セッション長・連続日数・科目別傾向）を抽出
+    features = compute_learning_features(
+        load_session_columns(user),
+        {subject.id: subject.name for subject in subjects},
+        today
+    )
+    learning_patterns = {
+        "hour_of_day_hours": features['hour_of_day_hours'],
+        "weekday_hours": features['weekday_hours'],
+        "session_length": features['session_length'],
+        "streaks": features['streaks'],
+        "subject_trends": [
+            {
+                "name": trend['name'],
+                "recent_4_weeks_hours": trend['recent_hours'],
+                "previous_4_weeks_hours": trend['previous_hours'],
+                "slope_hours_per_week": trend['slope_hours_per_week'],
             }
-            savings_goals.append(goal_data)
+            for trend in features['subject_trends']
+        ],
+    }
+
+    # 貯金目標情報
+    savings_goals = []
+    for goal in user.savings_goals.order_by('id'):
+        savings_goals.append({
+            "title": goal.title,
+            "target_amount": float(goal.target_amount),
+            "current_amount": float(goal.current_amount),
+            "deadline": goal.deadline.strftime("%Y-%m-%d") if goal.deadline else "未設定",
+            "is_achieved": goal.is_achieved,
+            "progress_percentage": round(goal.progress_percentage, 2)
+        })
+
+    return {
+        "study_purpose": (study_purpose or '').strip(),
+        "total_month_hours": round(totals['month']['total_seconds'] / 3600, 2),
+        "total_week_hours": round(totals['week']['total_seconds'] / 3600, 2),
+        "subject_hours": subject_hours,
+        "subjects": subjects_data,
+        "recent_sessions": recent_sessions_data,
+        "savings_goals": savings_goals,
+        "learning_patterns": learning_patterns,
+    }
+
+
+def analysis_cache_key(user, study_purpose, model_name):
+    """
+    学習データのバージョン・日付・学習目的・モデル名・プロンプトのバージョンとトークン上限からキャッシュキー（SHA-256）を計算する
+
+    学習データを集計せずに計算できるため、キャッシュヒット時はセッション履歴を読み込みません。
+    期間集計（今週・今月・過去30日）は日付で変わるため、日付もキーに含めます。
+    """
+    payload = json.dumps(
+        {
+            "version": ANALYSIS_PROMPT_VERSION,
+            "model": model_name,
+            "token_budget": settings.AI_PROMPT_TOKEN_BUDGET,
+            "data_version": get_data_version(user.id),
+            "date": timezone.localdate().isoformat(),
+            "study_purpose": (study_purpose or '').strip(),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
 
-        # プロンプトを構築
-        prompt = f"""
-        あなたは学習コーチAIです。以下のデータを分析して、ユーザーの学習状況についてのインサイトと今後のアクションプランを提案してください。
 
-        【学習の目的】
-        {study_purpose}
+def get_cached_analysis(user, input_hash):
+    """有効期限内のキャッシュ済み分析結果を返す（なければ None）"""
+    now = timezone.now()
+    cached = LearningAnalysis.objects.filter(
+        user=user,
+        input_hash=input_hash,
+        created_at__gte=now - timedelta(seconds=settings.AI_ANALYSIS_CACHE_TTL)
+    ).only('id', 'result').first()
+    if cached is None:
+        return None
 
-        【学習データ】
-        - 今月の合計勉強時間: {round(total_month_hours, 2)}時間
-        - 今週の合計勉強時間: {round(total_week_hours, 2)}時間
+    LearningAnalysis.objects.filter(id=cached.id).update(last_used_at=now, hit_count=F('hit_count') + 1)
+    return cached.result
 
-        【科目別勉強時間（過去30日）】
-        {json.dumps(subject_hours, ensure_ascii=False, indent=2)}
 
-        【科目情報（時給換算額）】
-        {json.dumps(subjects_data, ensure_ascii=False, indent=2)}
+def store_analysis(user, input_hash, model_name, result):
+    """分析結果を保存し、ユーザーごとの上限を超えた古いエントリ（LRU）を削除する"""
+    now = timezone.now()
+    defaults = {
+        'model_name': model_name,
+        'result': result,
+        'hit_count': 0,
+        'last_used_at': now,
+        'created_at': now,
+    }
+    try:
+        with transaction.atomic():
+            LearningAnalysis.objects.update_or_create(user=user, input_hash=input_hash, defaults=defaults)
+    except IntegrityError:
+        # ワーカーと Web リクエストが同じキーを同時に保存した場合は、先に保存された行を更新する
+        LearningAnalysis.objects.filter(user=user, input_hash=input_hash).update(**defaults)
+
+    stale_ids = LearningAnalysis.objects.filter(user=user).order_by('-last_used_at').values_list(
+        'id', flat=True
+    )[settings.AI_ANALYSIS_CACHE_MAX_ENTRIES:]
+    LearningAnalysis.objects.filter(id__in=list(stale_ids)).delete()
 
-        【最近の学習セッション】
-        {json.dumps(recent_sessions_data, ensure_ascii=False, indent=2)}
 
-        【貯金目標情報】
-        {json.dumps(savings_goals, ensure_ascii=False, indent=2)}
+def run_learning_analysis(user, study_purpose, force_refresh=False, backend=None):
+    """
+    学習分析を実行し、{'analysis': 分析テキスト, 'cached': キャッシュ利用有無, 'failed': 失敗有無} を返す
+
+    学習データが前回から変わっていない場合は、学習データを集計せず AI も呼び出さずに保存済みの結果を返します。
+    force_refresh=True の場合は常に AI で再生成します。
+    backend を省略した場合は settings.AI_BACKEND のバックエンドを使用します。
+    """
+    try:
+        model_name = settings.AI_MODEL_NAME
+        input_hash = analysis_cache_key(user, study_purpose, model_name)
+
+        if not force_refresh:
+            cached_result = get_cached_analysis(user, input_hash)
+            if cached_result is not None:
+                logger.info(f"学習分析キャッシュヒット: user={user.id}")
+                return {'analysis': cached_result, 'cached': True, 'failed': False}
 
-        学習状況を分析して、以下の点についてのインサイトと今後のアクションを提案してください：
-        1. 学習パターンの分析（いつ、どのように勉強しているか）
-        2. 学習効率の評価と改善点
-        3. 目標達成に向けた具体的なネクストアクション
-        4. モチベーション維持のためのアドバイス
-        5. 学習目的に照らした進捗評価
+        data = collect_learning_data(user, study_purpose)
 
-        回答は日本語で、友好的かつ励ましの要素を含め、具体的なアドバイスを提供してください。
-        箇条書きやリストを適切に使用して読みやすくしてください。
-        """
+        # AIモデルからレスポンスを取得（失敗した結果はキャッシュしない）
+        try:
+            result = generate_content(build_learning_prompt(data), model_name, backend=backend)
+        except AIGenerationError:
+            return {'analysis': "AI分析を生成できませんでした。後でもう一度お試しください。", 'cached': False, 'failed': True}
 
-        # AIモデルからレスポンスを取得
-        response = generate_response(prompt)
-        return response
+        store_analysis(user, input_hash, model_name, result)
+        return {'analysis': result, 'cached': False, 'failed': False}
 
     except Exception as e:
         logger.error(f"Error analyzing learning data: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
-        return "学習データの分析中にエラーが発生しました。後でもう一度お試しください。"
+        return {'analysis': ANALYSIS_ERROR_MESSAGE, 'cached': False, 'failed': True}
+
+
+def stream_learning_analysis(user, study_purpose, force_refresh=False, backend=None):
+    """
+    学習分析をストリーミングで実行し、(イベント名, データ) を順に返すジェネレーター
+
+    イベントは 'chunk'（生成されたテキストの断片）、'done'（完了）、
+    'error'（失敗）のいずれかです。生成が完了したテキストは通常の分析と
+    同じキャッシュに保存されます。
+    """
+    try:
+        model_name = settings.AI_MODEL_NAME
+        input_hash = analysis_cache_key(user, study_purpose, model_name)
+
+        if not force_refresh:
+            cached_result = get_cached_analysis(user, input_hash)
+            if cached_result is not None:
+                yield 'chunk', {'text': cached_result}
+                yield 'done', {'cached': True}
+                return
+
+        data = collect_learning_data(user, study_purpose)
+
+        chunks = []
+        for text in generate_content_stream(build_learning_prompt(data), model_name, backend=backend):
+            chunks.append(text)
+            yield 'chunk', {'text': text}
+
+        store_analysis(user, input_hash, model_name, ''.join(chunks))
+        yield 'done', {'cached': False}
+
+    except AIGenerationError:
+        yield 'error', {'message': "AI分析を生成できませんでした。後でもう一度お試しください。"}
+    except Exception as e:
+        logger.error(f"Error streaming learning analysis: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        yield 'error', {'message': ANALYSIS_ERROR_MESSAGE}
+
+
+# 学習分析のための関数
+def analyze_learning(user, study_purpose, force_refresh=False):
+    """
+    ユーザーの学習目的と学習データに基づいて分析を行う
+    """
+    return run_learning_analysis(user, study_purpose, force_refresh)['analysis']
@@ -0,0 +1,97 @@
+"""
+AI学習分析の非同期ジョブ
+
+API は LearningAnalysisJob を登録してすぐにジョブIDを返し、
+run_analysis_worker コマンドのワーカーがジョブを取得して分析を実行します。
+ジョブの取得は status を条件にした UPDATE で行うため、複数ワーカーでも
+同じジョブを重複して実行しません。
+"""
+import logging
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .ai_services import run_learning_analysis
+from .models import LearningAnalysisJob
+
+logger = logging.getLogger('study_tracker')
+
+ACTIVE_STATUSES = (LearningAnalysisJob.STATUS_PENDING, LearningAnalysisJob.STATUS_RUNNING)
+
+
+def enqueue_analysis_job(user, study_purpose, force_refresh=False):
+    """
+    分析ジョブを登録する
+
+    同じ学習目的の未完了ジョブが既にある場合は新規登録せずにそのジョブを返します。
+    """
+    study_purpose = (study_purpose or '').strip()
+    existing = LearningAnalysisJob.objects.filter(
+        user=user,
+        status__in=ACTIVE_STATUSES,
+        study_purpose=study_purpose
+    ).order_by('-created_at').first()
+    if existing:
+        return existing
+
+    return LearningAnalysisJob.objects.create(
+        user=user,
+        study_purpose=study_purpose,
+        force_refresh=force_refresh
+    )
+
+
+def claim_jobs(limit):
+    """待機中のジョブを古い順に最大 limit 件取得し、実行中に変更して返す"""
+    claimed = []
+    candidate_ids = LearningAnalysisJob.objects.filter(
+        status=LearningAnalysisJob.STATUS_PENDING
+    ).order_by('created_at').values_list('id', flat=True)[:limit * 2]
+
+    for job_id in candidate_ids:
+        # 他のワーカーが先に取得した場合は更新件数が0になる
+        updated = LearningAnalysisJob.objects.filter(
+            id=job_id,
+            status=LearningAnalysisJob.STATUS_PENDING
+        ).update(status=LearningAnalysisJob.STATUS_RUNNING, started_at=timezone.now())
+        if updated:
+            claimed.append(job_id)
+        if len(claimed) >= limit:
+            break
+    return claimed
+
+
+def run_analysis_job(job_id, backend=None):
+    """
+    取得済みのジョブを実行して結果を保存する（ワーカースレッドから呼ばれる）
+
+    backend を省略した場合は settings.AI_BACKEND のバックエンドを使用します。
+    """
+    close_old_connections()
+    try:
+        job = LearningAnalysisJob.objects.select_related('user').get(id=job_id)
+        outcome = run_learning_analysis(job.user, job.study_purpose, force_refresh=job.force_refresh, backend=backend)
+
+        job.result = outcome['analysis']
+        job.cached = outcome['cached']
+        job.status = LearningAnalysisJob.STATUS_FAILED if outcome['failed'] else LearningAnalysisJob.STATUS_SUCCEEDED
+        job.finished_at = timezone.now()
+        job.save(update_fields=['result', 'cached', 'status', 'finished_at'])
+        logger.info(f"学習分析ジョブ完了: job={job_id} status={job.status}")
+    except Exception as e:
+        logger.error(f"学習分析ジョブエラー: job={job_id} {str(e)}")
+        LearningAnalysisJob.objects.filter(id=job_id).update(
+            status=LearningAnalysisJob.STATUS_FAILED,
+            finished_at=timezone.now()
+        )
+    finally:
+        close_old_connections()
+
+
+def requeue_stale_jobs(stale_after):
+    """実行中のまま stale_after 秒以上経過したジョブ（ワーカー停止など）を待機中に戻す"""
+    return LearningAnalysisJob.objects.filter(
+        status=LearningAnalysisJob.STATUS_RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=stale_after)
+    ).update(status=LearningAnalysisJob.STATUS_PENDING, started_at=None)
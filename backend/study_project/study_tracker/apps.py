@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StudyTrackerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'study_tracker'
+
+    def ready(self):
+        # シグナルハンドラーを登録
+        from . import signals  # noqa: F401
@@ -0,0 +1,159 @@
+"""
+ユーザー解決をキャッシュする JWT 認証
+
+simplejwt の JWTAuthentication はリクエストごとに User を主キーで取得します。
+CachedJWTAuthentication はトークンの user_id クレームをキーに、共有キャッシュ → DB の順に
+ユーザーを解決します。キャッシュにはパスワードハッシュを含む User 全体ではなく、
+認証と表示に必要なフィールド（CACHED_USER_FIELDS）とセッション認証ハッシュだけを保存し、
+他のフィールドは参照時に DB から読み込みます（遅延読み込みのフィールドは save() で上書きされません）。
+ユーザーの保存・削除（プロフィール更新、パスワード変更、無効化）時に
+invalidate_cached_user で共有キャッシュのエントリを削除するため、無効化はすぐに反映されます。
+
+認証状態の確認（/auth/check/ など）も同じキャッシュを使い、セッション
+（cached_db）のユーザーIDからDBを参照せずにユーザーを解決します。
+"""
+import threading
+from collections import Counter
+
+from allauth.socialaccount.models import SocialAccount
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .caching import record_cache_result
+
+AUTH_USER_KEY = 'auth_user:{user_id}'
+SOCIAL_ACCOUNTS_KEY = 'social_accounts:{user_id}'
+METRICS_NAMESPACE = 'auth_user'
+
+# 共有キャッシュに保存するユーザーのフィールド
+CACHED_USER_FIELDS = ('id', 'username', 'email', 'is_active')
+
+# ヒット数・ミス数はこの件数ごとに共有キャッシュのカウンターへまとめて加算する
+METRICS_FLUSH_EVERY = 100
+
+_metrics_lock = threading.Lock()
+_pending_counts = Counter()
+
+
+def _record(result):
+    with _metrics_lock:
+        _pending_counts[result] += 1
+        if sum(_pending_counts.values()) < METRICS_FLUSH_EVERY:
+            return
+        counts = dict(_pending_counts)
+        _pending_counts.clear()
+    for name, delta in counts.items():
+        record_cache_result(METRICS_NAMESPACE, name, delta)
+
+
+def invalidate_cached_user(user_id):
+    """キャッシュ済みのユーザーを削除する"""
+    cache.delete(AUTH_USER_KEY.format(user_id=user_id))
+
+
+def _to_cache_entry(user):
+    """
+    キャッシュに保存する辞書を返す
+
+    セッション認証ハッシュ（パスワードハッシュの HMAC）は、現在と SECRET_KEY_FALLBACKS の分を保存します。
+    """
+    entry = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+    entry['session_auth_hashes'] = [user.get_session_auth_hash(), *user.get_session_auth_fallback_hash()]
+    return entry
+
+
+def _from_cache_entry(entry):
+    """キャッシュの辞書から、保存したフィールドだけを読み込んだ User を作る"""
+    model = get_user_model()
+    user = model.from_db(router.db_for_read(model), CACHED_USER_FIELDS, [entry[field] for field in CACHED_USER_FIELDS])
+    user._session_auth_hashes = entry['session_auth_hashes']
+    return user
+
+
+def get_cached_user(user_id):
+    """
+    主キーからユーザーを返す（共有キャッシュ → DB）
+
+    存在しない場合は None を返します。無効なユーザーはキャッシュせずにそのまま返します。
+    """
+    key = AUTH_USER_KEY.format(user_id=user_id)
+    entry = cache.get(key)
+    if entry is not None:
+        _record('hit')
+        return _from_cache_entry(entry)
+
+    _record('miss')
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None or not user.is_active:
+        return user
+    entry = _to_cache_entry(user)
+    cache.set(key, entry, settings.AUTH_USER_CACHE_TIMEOUT)
+    return _from_cache_entry(entry)
+
+
+def get_session_user(request):
+    """
+    セッションにログインしているユーザーをキャッシュから返す（ログインしていなければ None）
+
+    django.contrib.auth.get_user と同じく、認証バックエンドとセッションの
+    認証ハッシュ（パスワード変更で無効になる）を確認します。
+    """
+    session = getattr(request, 'session', None)
+    if session is None:
+        return None
+
+    user_id = session.get(SESSION_KEY)
+    if user_id is None or session.get(BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return None
+
+    user = get_cached_user(get_user_model()._meta.pk.to_python(user_id))
+    if user is None or not user.is_active:
+        return None
+
+    session_hash = session.get(HASH_SESSION_KEY)
+    if not session_hash:
+        return None
+    if not any(constant_time_compare(session_hash, user_hash) for user_hash in user._session_auth_hashes):
+        return None
+    return user
+
+
+def get_social_accounts(user_id):
+    """ユーザーの連携済みソーシャルアカウント（[{'provider': ...}]）をキャッシュから返す"""
+    key = SOCIAL_ACCOUNTS_KEY.format(user_id=user_id)
+    accounts = cache.get(key)
+    if accounts is None:
+        accounts = list(SocialAccount.objects.filter(user_id=user_id).values('provider').order_by('id'))
+        cache.set(key, accounts, settings.AUTH_USER_CACHE_TIMEOUT)
+    return accounts
+
+
+def invalidate_social_accounts(user_id):
+    cache.delete(SOCIAL_ACCOUNTS_KEY.format(user_id=user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """キャッシュからユーザーを解決する JWTAuthentication"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        # USER_ID_FIELD は主キー（id）
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return user
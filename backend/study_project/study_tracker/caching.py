@@ -0,0 +1,207 @@
+"""
+ユーザーごとのデータバージョンとレスポンスキャッシュ
+
+ユーザーのデータ（セッション・科目・貯金目標）が変わるたびにデータバージョンを
+更新し、キャッシュキーにバージョンを含めることで古いエントリを参照しないように
+します。古いバージョンのエントリは TTL で期限切れになるか、キャッシュの
+MAX_ENTRIES を超えた時点で削除されます。
+
+データバージョンは DB（UserDataVersion）に保存します。キャッシュがプロセス内メモリ
+（REDIS_URL 未設定）の場合も、ワーカーや reconcile_goals などのバックグラウンドの
+コマンドが更新したバージョンを全プロセスがすぐに参照できます。
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.cache import parse_etags, patch_cache_control, patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import UserDataVersion
+
+logger = logging.getLogger('study_tracker')
+
+CACHE_ENTRY_KEY = '{namespace}:{user_id}:{version}:{extra}'
+CACHE_COUNTER_KEY = 'cache_metrics:{namespace}:{result}'
+
+
+def get_data_version(user_id):
+    """ユーザーの現在のデータバージョンを返す（未登録なら '0'）"""
+    version = UserDataVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first()
+    return str(version or 0)
+
+
+def bump_data_version(user_id):
+    """
+    ユーザーのデータバージョンを更新し、関連キャッシュを無効化する
+
+    トランザクション内で呼ばれた場合はデータの変更と同時にコミットされます。
+    """
+    if UserDataVersion.objects.filter(user_id=user_id).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            UserDataVersion.objects.create(user_id=user_id, version=1)
+    except IntegrityError:
+        # 他のリクエストが先に行を作成した場合
+        UserDataVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+
+
+def record_cache_result(namespace, result, delta=1):
+    key = CACHE_COUNTER_KEY.format(namespace=namespace, result=result)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # add と incr の間にエントリが削除された場合
+        cache.set(key, delta, None)
+
+
+def get_cache_metrics(namespace):
+    """キャッシュのヒット数・ミス数・ヒット率を返す"""
+    hits = cache.get(CACHE_COUNTER_KEY.format(namespace=namespace, result='hit'), 0)
+    misses = cache.get(CACHE_COUNTER_KEY.format(namespace=namespace, result='miss'), 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def get_or_build_user_data(namespace, user_id, builder, timeout=None, extra='', version=None):
+    """
+    ユーザーのデータバージョンをキーにしてキャッシュし、なければ builder() で作成する
+
+    extra には日付など、データ以外で結果が変わる要素を指定します。
+    version には ETag の計算に使ったデータバージョン（ConditionalGetMixin.data_version）を
+    渡せます。省略時は DB から取得します。
+    """
+    if timeout is None:
+        timeout = settings.USER_DATA_CACHE_TIMEOUT
+    if version is None:
+        version = get_data_version(user_id)
+
+    key = CACHE_ENTRY_KEY.format(
+        namespace=namespace,
+        user_id=user_id,
+        version=version,
+        extra=extra
+    )
+    data = cache.get(key)
+    if data is not None:
+        record_cache_result(namespace, 'hit')
+        return data
+
+    record_cache_result(namespace, 'miss')
+    logger.debug(f"キャッシュミス: {namespace} (user={user_id})")
+    data = builder()
+    cache.set(key, data, timeout)
+    return data
+
+
+class UserDataVersionMixin:
+    """
+    ユーザー所有データの ViewSet 用 Mixin
+
+    作成時にリクエストユーザーを所有者として保存し、作成・更新・削除のたびに
+    ユーザーのデータバージョンを更新します。
+    """
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+        bump_data_version(self.request.user.id)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        bump_data_version(self.request.user.id)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        bump_data_version(self.request.user.id)
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+
+def user_data_etag(request, view_name, extra='', version=None):
+    """
+    ユーザーのデータバージョンから強い ETag を作る
+
+    レスポンス本文ではなく、データバージョン・パス（クエリ含む）・
+    レンダラーの組み合わせをハッシュするため、本文を生成せずに比較できます。
+    """
+    if version is None:
+        version = get_data_version(request.user.id)
+    raw = ':'.join([
+        view_name,
+        str(request.user.id),
+        version,
+        request.get_full_path(),
+        request.accepted_media_type or '',
+        extra,
+    ])
+    return '"%s"' % hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class ConditionalGetMixin:
+    """
+    If-None-Match による条件付き GET に対応する APIView / ViewSet 用 Mixin
+
+    認証・コンテンツネゴシエーションの直後に ETag を計算し、一致した場合は
+    ハンドラーを実行せずに 304 Not Modified を返します。
+    etag_actions を指定した ViewSet ではそのアクションのみ対象になります。
+    ETag の計算に使ったデータバージョンは data_version に保存し、ハンドラーは
+    get_or_build_user_data(version=self.data_version) で同じバージョンのキャッシュを参照します。
+    """
+    etag_actions = None
+    etag = None
+    data_version = None
+
+    def get_etag_extra(self):
+        """データ以外で結果が変わる要素（日付など）を返す"""
+        return ''
+
+    def use_etag(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        return self.etag_actions is None or getattr(self, 'action', None) in self.etag_actions
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.use_etag(request):
+            self.data_version = get_data_version(request.user.id)
+            self.etag = user_data_etag(request, type(self).__name__, self.get_etag_extra(), self.data_version)
+            if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+            if self.etag in if_none_match:
+                raise NotModified()
+            # '*' は対象が存在する場合のみ一致とみなす（詳細は取得できなければ 404）
+            if '*' in if_none_match and self.resource_exists():
+                raise NotModified()
+
+    def resource_exists(self):
+        """詳細（lookup 付き）のリクエストでは対象のオブジェクトを取得して存在を確認する"""
+        lookup_url_kwarg = getattr(self, 'lookup_url_kwarg', None) or getattr(self, 'lookup_field', None)
+        if lookup_url_kwarg and lookup_url_kwarg in self.kwargs:
+            self.get_object()
+        return True
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = self.etag
+            # 共有キャッシュには保存させず、毎回サーバーで再検証させる
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+        return response
@@ -0,0 +1,97 @@
+"""
+勉強セッション履歴のストリーミングエクスポート
+
+クエリセットを .iterator(chunk_size) で少しずつ読み込み、CSV / NDJSON の行を
+チャンク単位で返すジェネレーターです。StreamingHttpResponse と組み合わせることで、
+件数によらず一定のメモリでエクスポートできます。
+"""
+import csv
+import io
+import json
+
+from django.utils import timezone
+
+from .serializers import StudySessionListRepresentation
+
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_COLUMNS = (
+    'id', 'subject', 'subject_name', 'start_time', 'end_time',
+    'duration', 'notes', 'earned_amount', 'is_active', 'created_at'
+)
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Accept-Encoding ヘッダーが gzip を受け付けるかを返す
+
+    q 値を解釈し、gzip（指定がなければ *）の q 値が 0 より大きい場合のみ True です。
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+def _rows(queryset, chunk_size):
+    tz = timezone.get_current_timezone()
+    rows = queryset.values(*StudySessionListRepresentation.values_fields).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield StudySessionListRepresentation.to_representation(row, tz)
+
+
+def _chunked(lines, chunk_size):
+    """行をまとめて1つのチャンクとして返す（レスポンスの書き込み回数を減らすため）"""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _csv_lines(queryset, chunk_size):
+    output = io.StringIO()
+    writer = csv.writer(output)
+
+    def line(values):
+        writer.writerow(values)
+        value = output.getvalue()
+        output.seek(0)
+        output.truncate()
+        return value
+
+    # Excel で文字化けしないように BOM を付ける
+    yield '\ufeff' + line(CSV_COLUMNS)
+    for row in _rows(queryset, chunk_size):
+        yield line([row[column] for column in CSV_COLUMNS])
+
+
+def _ndjson_lines(queryset, chunk_size):
+    for row in _rows(queryset, chunk_size):
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': _csv_lines,
+    'ndjson': _ndjson_lines,
+}
+
+
+def stream_sessions(queryset, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """セッションのクエリセットを指定形式の文字列チャンクとして順に返す"""
+    return _chunked(EXPORT_FORMATS[export_format](queryset, chunk_size), chunk_size)
@@ -0,0 +1,209 @@
+"""
+学習特徴量の抽出
+
+ユーザーの完了済みセッションを1クエリで列（開始時刻・勉強時間・科目ID）として
+読み込み、numpy のベクトル演算で時間帯・曜日の分布、セッション長の分布、
+連続学習日数、科目別の傾向をまとめて計算します。
+AI 学習分析のプロンプトと統計エンドポイントの両方で使います。
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.utils import timezone
+
+from .models import StudySession
+
+# セッション長の区分（分）: 30分未満 / 30〜60分 / 60〜120分 / 120分以上
+SESSION_LENGTH_BUCKETS = (30, 60, 120)
+SESSION_LENGTH_LABELS = ('under_30m', '30m_to_1h', '1h_to_2h', 'over_2h')
+
+# 科目別の傾向を計算する週数
+TREND_WEEKS = 8
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class SessionColumns:
+    """完了済みセッションの列データ（開始時刻はローカル時刻のエポック秒）"""
+
+    def __init__(self, local_start, duration, subject_id):
+        self.local_start = local_start
+        self.duration = duration
+        self.subject_id = subject_id
+
+    def __len__(self):
+        return len(self.duration)
+
+    @property
+    def local_day(self):
+        """ローカル日付（エポックからの日数）"""
+        return self.local_start // 86400
+
+
+def _local_offsets(utc_seconds):
+    """
+    UTC のエポック秒に対するローカルタイムゾーンのオフセット（秒）を返す
+
+    オフセットは時間単位で一意な値ごとに1回だけ計算します（夏時間の切り替えも
+    1時間単位で反映されます）。
+    """
+    tz = timezone.get_current_timezone()
+    hours, inverse = np.unique(utc_seconds // 3600, return_inverse=True)
+    offsets = np.array([
+        (_EPOCH + timedelta(hours=int(hour))).astimezone(tz).utcoffset().total_seconds()
+        for hour in hours
+    ], dtype=np.int64)
+    return offsets[inverse]
+
+
+def load_session_columns(user, since=None):
+    """
+    ユーザーの完了済みセッションを1クエリで列データとして読み込む
+
+    since（datetime）を指定した場合はそれ以降に開始したセッションのみ対象にします。
+    """
+    sessions = StudySession.objects.filter(
+        user=user, end_time__isnull=False, duration__isnull=False
+    )
+    if since is not None:
+        sessions = sessions.filter(start_time__gte=since)
+    rows = list(sessions.order_by().values_list('start_time', 'duration', 'subject_id'))
+
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return SessionColumns(empty, empty.copy(), empty.copy())
+
+    start_times, durations, subject_ids = zip(*rows)
+    utc_start = np.array([int(value.timestamp()) for value in start_times], dtype=np.int64)
+    return SessionColumns(
+        local_start=utc_start + _local_offsets(utc_start),
+        duration=np.array([value.total_seconds() for value in durations], dtype=np.int64),
+        subject_id=np.array(subject_ids, dtype=np.int64),
+    )
+
+
+def _hours(seconds):
+    return round(float(seconds) / 3600, 2)
+
+
+def _streaks(days, today):
+    """学習した日（エポック日数）から現在と最長の連続学習日数を返す"""
+    if len(days) == 0:
+        return 0, 0
+
+    # 前日と連続していない位置で区切り、各区間の長さを求める
+    breaks = np.flatnonzero(np.diff(days) != 1) + 1
+    starts = np.concatenate(([0], breaks))
+    lengths = np.diff(np.concatenate((starts, [len(days)])))
+
+    # 今日または昨日まで続いている区間を現在の連続日数とする
+    current = int(lengths[-1]) if days[-1] >= today - 1 else 0
+    return current, int(lengths.max())
+
+
+def _length_distribution(duration):
+    minutes = duration / 60
+    counts = np.bincount(np.searchsorted(SESSION_LENGTH_BUCKETS, minutes, side='right'),
+                         minlength=len(SESSION_LENGTH_LABELS))
+    if len(minutes):
+        p25, median, p75, p90 = np.percentile(minutes, [25, 50, 75, 90])
+        mean = minutes.mean()
+    else:
+        p25 = median = p75 = p90 = mean = 0.0
+    return {
+        'mean_minutes': round(float(mean), 1),
+        'p25_minutes': round(float(p25), 1),
+        'median_minutes': round(float(median), 1),
+        'p75_minutes': round(float(p75), 1),
+        'p90_minutes': round(float(p90), 1),
+        'buckets': dict(zip(SESSION_LENGTH_LABELS, counts.tolist())),
+    }
+
+
+def _subject_trends(columns, today, subject_names):
+    """
+    科目ごとの直近 TREND_WEEKS 週の週別勉強時間と傾き（時間/週）を計算する
+
+    週は今日を終点とした7日区切りで、古い週から順に並べます。
+    """
+    if not subject_names:
+        return []
+
+    # セッションの科目IDを subject_names の並び順（行番号）に対応付ける
+    ids = np.array(list(subject_names), dtype=np.int64)
+    order = np.argsort(ids)
+    positions = np.minimum(np.searchsorted(ids[order], columns.subject_id), len(ids) - 1)
+    rows = order[positions]
+
+    weeks_ago = (today - columns.local_day) // 7
+    mask = (ids[rows] == columns.subject_id) & (weeks_ago >= 0) & (weeks_ago < TREND_WEEKS)
+
+    # (科目, 週) ごとの勉強秒数を1回の bincount で集計
+    cells = rows[mask] * TREND_WEEKS + (TREND_WEEKS - 1 - weeks_ago[mask])
+    weekly = np.bincount(
+        cells, weights=columns.duration[mask], minlength=len(ids) * TREND_WEEKS
+    ).reshape(len(ids), TREND_WEEKS) / 3600
+
+    # 週番号に対する最小二乗の傾きを全科目まとめて計算
+    x = np.arange(TREND_WEEKS) - (TREND_WEEKS - 1) / 2
+    slopes = weekly @ x / (x @ x)
+
+    half = TREND_WEEKS // 2
+    trends = []
+    for (subject_id, name), hours, slope in zip(subject_names.items(), weekly, slopes):
+        trends.append({
+            'id': subject_id,
+            'name': name,
+            'weekly_hours': [round(float(value), 2) for value in hours],
+            'recent_hours': round(float(hours[half:].sum()), 2),
+            'previous_hours': round(float(hours[:half].sum()), 2),
+            'slope_hours_per_week': round(float(slope), 3),
+        })
+    return trends
+
+
+def compute_learning_features(columns, subject_names, today=None):
+    """
+    列データから学習特徴量を計算する
+
+    subject_names は {科目ID: 科目名} の辞書です（科目別の傾向の並び順になります）。
+    """
+    if today is None:
+        today = timezone.localdate()
+    today_index = (today - _EPOCH.date()).days
+
+    local_day = columns.local_day
+    hour = (columns.local_start % 86400) // 3600
+    # 1970-01-01 は木曜日（月曜日=0 とした場合の 3）
+    weekday = (local_day + 3) % 7
+    days_ago = today_index - local_day
+    study_days = np.unique(local_day)
+    current_streak, longest_streak = _streaks(study_days, today_index)
+
+    return {
+        'session_count': len(columns),
+        'total_hours': _hours(columns.duration.sum()),
+        'last_7_days_hours': _hours(columns.duration[days_ago < 7].sum()),
+        'last_30_days_hours': _hours(columns.duration[days_ago < 30].sum()),
+        'hour_of_day_hours': [
+            round(float(value), 2)
+            for value in np.bincount(hour, weights=columns.duration, minlength=24) / 3600
+        ],
+        'weekday_hours': [
+            round(float(value), 2)
+            for value in np.bincount(weekday, weights=columns.duration, minlength=7) / 3600
+        ],
+        'session_length': _length_distribution(columns.duration),
+        'streaks': {
+            'current_days': current_streak,
+            'longest_days': longest_streak,
+            'active_days_last_30': int(np.count_nonzero(today_index - study_days < 30)),
+        },
+        'subject_trends': _subject_trends(columns, today_index, subject_names),
+    }
+
+
+def get_learning_features(user, today=None):
+    """ユーザーの学習特徴量を計算する（セッションと科目の2クエリ）"""
+    subject_names = dict(user.subjects.order_by('id').values_list('id', 'name'))
+    return compute_learning_features(load_session_columns(user), subject_names, today)
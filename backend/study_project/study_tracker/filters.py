@@ -0,0 +1,110 @@
+"""
+一覧エンドポイント用のサーバーサイドフィルター
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+def parse_date_param(value, name):
+    """日付（YYYY-MM-DD）のクエリパラメータを date に変換する（不正な値は ValidationError）"""
+    try:
+        # 形式は正しくても存在しない日付（2024-02-30 など）は ValueError になる
+        date = parse_date(value)
+    except ValueError:
+        raise ValidationError({name: '日付が正しくありません。'})
+    if date is None:
+        raise ValidationError({name: '日付の形式が正しくありません。'})
+    return date
+
+
+def parse_datetime_param(value, name, end_of_day=False):
+    """
+    日付（YYYY-MM-DD）または日時のクエリパラメータを aware な datetime に変換する
+
+    日付のみの場合、end_of_day=True なら翌日0時（その日を含む上限）を返します。
+    """
+    try:
+        # 形式は正しくても存在しない日付（2024-02-30 など）は ValueError になる
+        parsed = parse_datetime(value)
+        date = parse_date(value) if parsed is None else None
+    except ValueError:
+        raise ValidationError({name: '日付が正しくありません。'})
+    if parsed is None:
+        if date is None:
+            raise ValidationError({name: '日付の形式が正しくありません。'})
+        if end_of_day:
+            date += timedelta(days=1)
+        parsed = datetime.combine(date, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class StudySessionFilter(BaseFilterBackend):
+    """
+    勉強セッションの絞り込み
+
+    - subject: 科目ID
+    - from / to: 開始日時の範囲（日付指定の場合 to はその日を含む）
+    - status: active（進行中） / finished（終了済み）
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        subject = params.get('subject')
+        if subject:
+            if not subject.isdigit():
+                raise ValidationError({'subject': '科目IDが正しくありません。'})
+            queryset = queryset.filter(subject_id=subject)
+
+        if params.get('from'):
+            queryset = queryset.filter(start_time__gte=parse_datetime_param(params['from'], 'from'))
+        if params.get('to'):
+            queryset = queryset.filter(start_time__lt=parse_datetime_param(params['to'], 'to', end_of_day=True))
+
+        status = params.get('status')
+        if status == 'active':
+            queryset = queryset.filter(end_time__isnull=True)
+        elif status == 'finished':
+            queryset = queryset.filter(end_time__isnull=False)
+        elif status:
+            raise ValidationError({'status': 'active または finished を指定してください。'})
+
+        return queryset
+
+
+class SubjectFilter(BaseFilterBackend):
+    """
+    勉強科目の絞り込み
+
+    - name: 科目名（部分一致）
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get('name')
+        if name:
+            queryset = queryset.filter(name__icontains=name)
+        return queryset
+
+
+class SavingsGoalFilter(BaseFilterBackend):
+    """
+    貯金目標の絞り込み
+
+    - status: active（未達成） / achieved（達成済み）
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        status = request.query_params.get('status')
+        if status == 'active':
+            queryset = queryset.filter(is_achieved=False)
+        elif status == 'achieved':
+            queryset = queryset.filter(is_achieved=True)
+        elif status:
+            raise ValidationError({'status': 'active または achieved を指定してください。'})
+        return queryset
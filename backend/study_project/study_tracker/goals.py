@@ -0,0 +1,140 @@
+"""
+貯金目標への獲得金額の加算と、セッション履歴からの残高の再計算
+
+加算のルールは1つで、stop() / batch の加算と reconcile_goals の再計算の両方がこれに従います。
+
+- セッションの獲得金額は加算時刻（CREDIT_TIME: 終了時刻と登録時刻の遅い方）に加算します。
+  同じ加算時刻のセッション（1回の一括登録）はまとめて1回の加算です。
+- 加算先は、加算時刻までに作成された未達成の目標のうち最も古いもの（作成日時, id の順）です。
+  加算後の金額が目標金額以上になった時点で達成とし、目標金額を超えた分もその目標に残します。
+- 加算先の目標がない場合、その獲得金額はどの目標にも加算しません（後から作成した目標には遡って加算しません）。
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.lookups import GreaterThanOrEqual
+
+from .caching import bump_data_version
+from .models import SavingsGoal, StudySession
+
+CENT = Decimal('0.01')
+
+# セッションの加算時刻（stop() は終了時刻、一括登録は登録時刻）
+CREDIT_TIME = Greatest(F('end_time'), F('created_at'))
+
+GoalChange = namedtuple('GoalChange', [
+    'goal_id', 'user_id', 'title', 'current_amount', 'new_amount', 'is_achieved', 'new_is_achieved'
+])
+
+
+def credit_time(session):
+    """終了済みのセッションの加算時刻（CREDIT_TIME と同じ値）を返す"""
+    return max(session.end_time, session.created_at)
+
+
+def credit_active_goal(user_id, amount, credited_at):
+    """
+    ユーザーの未達成の貯金目標のうち、credited_at までに作成された最も古いものに金額を加算する
+
+    加算先の目標の行をロックしてから加算・達成判定を行うため、同時に複数の加算が
+    行われても加算が失われることはありません。ロックの待機中に他の加算で目標が
+    達成された場合は、次の未達成の目標を選び直します。
+    加算した目標の id（加算先の目標がない場合は None）を返します。トランザクション内で呼び出してください。
+    """
+    if not amount:
+        return None
+
+    goals = SavingsGoal.objects.select_for_update().filter(
+        user_id=user_id, is_achieved=False, created_at__lte=credited_at
+    ).order_by('created_at', 'id')
+    while True:
+        goal_id = goals.values_list('id', flat=True).first()
+        if goal_id is None:
+            return None
+
+        # UPDATE の右辺は更新前の値を参照するため、達成判定には加算後の金額を使う
+        credited = SavingsGoal.objects.filter(id=goal_id, is_achieved=False).update(
+            current_amount=F('current_amount') + amount,
+            is_achieved=Case(
+                When(GreaterThanOrEqual(F('current_amount') + amount, F('target_amount')), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField()
+            )
+        )
+        if credited:
+            return goal_id
+
+
+def _credit_groups(user_ids):
+    """ユーザーごとの加算時刻と、その時刻に加算する獲得金額の合計を加算時刻の順に返す"""
+    return StudySession.objects.filter(
+        user_id__in=user_ids, end_time__isnull=False
+    ).annotate(credited_at=CREDIT_TIME).values('user_id', 'credited_at').annotate(
+        amount=Sum('earned_amount')
+    ).order_by('user_id', 'credited_at')
+
+
+def allocated_goals(user_ids):
+    """
+    ユーザーの貯金目標に、セッション履歴を加算のルールどおりに割り当てた結果を返す
+
+    各目標（作成日時, id の順）に allocated（割り当て額）と achieved（達成したか）を付けたリストです。
+    目標の作成日時は加算時刻の順に並ぶため、加算先は「まだ達成していない最初の目標」を
+    先頭から順に進めるだけで決まり、ユーザーごとにセッション数 + 目標数に比例する時間で計算できます。
+    """
+    goals_by_user = {}
+    for goal in SavingsGoal.objects.filter(user_id__in=user_ids).order_by('user_id', 'created_at', 'id'):
+        goal.allocated = Decimal('0')
+        goal.achieved = False
+        goals_by_user.setdefault(goal.user_id, []).append(goal)
+
+    position = dict.fromkeys(goals_by_user, 0)
+    for group in _credit_groups(list(goals_by_user)).iterator(chunk_size=2000):
+        goals = goals_by_user[group['user_id']]
+        index = position[group['user_id']]
+        if index >= len(goals) or not group['amount']:
+            continue
+        goal = goals[index]
+        if goal.created_at > group['credited_at']:
+            continue
+        # SQLite では集計結果が数値型で返るため、DecimalField と同じ精度に揃える
+        goal.allocated += Decimal(str(group['amount'])).quantize(CENT)
+        if goal.allocated >= goal.target_amount:
+            goal.achieved = True
+            position[group['user_id']] = index + 1
+
+    return [goal for goals in goals_by_user.values() for goal in goals]
+
+
+def reconcile_goals(user_ids, dry_run=False):
+    """
+    指定したユーザーの貯金目標の current_amount と is_achieved をセッション履歴から再計算する
+
+    差分のある目標の GoalChange のリストを返します。dry_run の場合は更新しません。
+    """
+    with transaction.atomic():
+        if not dry_run:
+            # 再計算中に stop() などの加算が割り込んで上書きされないよう、先に目標の行をロックする
+            list(SavingsGoal.objects.select_for_update().filter(user_id__in=user_ids).values_list('id', flat=True))
+
+        changes = []
+        for goal in allocated_goals(user_ids):
+            if goal.current_amount != goal.allocated or goal.is_achieved != goal.achieved:
+                changes.append(GoalChange(
+                    goal.id, goal.user_id, goal.title,
+                    goal.current_amount, goal.allocated, goal.is_achieved, goal.achieved
+                ))
+
+        if not dry_run and changes:
+            SavingsGoal.objects.bulk_update([
+                SavingsGoal(id=change.goal_id, current_amount=change.new_amount, is_achieved=change.new_is_achieved)
+                for change in changes
+            ], ['current_amount', 'is_achieved'])
+
+    if not dry_run:
+        for user_id in {change.user_id for change in changes}:
+            bump_data_version(user_id)
+    return changes
@@ -0,0 +1,211 @@
+"""
+週間・月間ランキング（LeaderboardEntry）の更新・再構築・参照処理
+
+ランキング行は日別集計（DailyStudyRollup）から作成します。セッションの終了・一括登録・
+更新・削除時は、影響を受けるユーザーの該当期間の行だけを再計算します。
+上位の取得と順位の計算は (期間, 開始日, 科目名, 値の降順) のインデックスを使い、
+全ユーザーのセッションを集計せずに応答します。
+編集による科目名の変更などのずれは rebuild_leaderboards で定期的に解消します。
+科目名は normalize_subject_name で正規化するため、「Math」と「math 」は同じランキングになります。
+"""
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DailyStudyRollup, LeaderboardEntry
+from .stats import bucket_start, next_bucket_start, previous_bucket_start
+
+PERIODS = ('week', 'month')
+METRICS = {
+    'hours': 'total_seconds',
+    'earnings': 'earned_amount',
+}
+LEADERBOARD_PAGE_KEY = 'leaderboard:{period}:{start}:{subject}:{metric}:{offset}:{limit}'
+
+# 全科目の合計の行の科目名
+ALL_SUBJECTS = ''
+
+
+def normalize_subject_name(name):
+    """ランキングの科目名を正規化する（前後・連続する空白をまとめ、大文字・小文字を区別しない）"""
+    return ' '.join((name or '').split()).casefold()
+
+
+def current_period_start(period, today=None):
+    return bucket_start(today or timezone.localdate(), period)
+
+
+def _entries(period, start, rollups):
+    """日別集計をユーザー・科目名ごと、およびユーザーごとの合計にまとめた LeaderboardEntry を返す"""
+    totals = defaultdict(lambda: [0, 0])
+    rows = rollups.values('user_id', 'subject__name').annotate(
+        seconds=Sum('total_seconds'),
+        earned=Sum('earned_amount')
+    ).order_by()
+
+    for row in rows.iterator(chunk_size=2000):
+        for subject_name in (normalize_subject_name(row['subject__name']), ALL_SUBJECTS):
+            total = totals[(row['user_id'], subject_name)]
+            total[0] += row['seconds']
+            total[1] += row['earned']
+
+    # 並行する更新と行ロックの順序をそろえるため、一意キーの順に並べる
+    return [
+        LeaderboardEntry(
+            period=period,
+            period_start=start,
+            subject_name=subject_name,
+            user_id=user_id,
+            total_seconds=seconds,
+            earned_amount=earned
+        )
+        for (user_id, subject_name), (seconds, earned) in sorted(totals.items())
+    ]
+
+
+def _period_rollups(period, start):
+    return DailyStudyRollup.objects.filter(date__gte=start, date__lt=next_bucket_start(start, period))
+
+
+def _upsert(entries):
+    LeaderboardEntry.objects.bulk_create(
+        entries,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['period', 'period_start', 'subject_name', 'user'],
+        update_fields=['total_seconds', 'earned_amount', 'updated_at']
+    )
+
+
+def _replace_entries(board, entries):
+    """board の行を entries に置き換える（entries にない行を削除してから作成・更新する）"""
+    keep = {(entry.user_id, entry.subject_name) for entry in entries}
+    stale_ids = [
+        entry_id
+        for entry_id, user_id, subject_name in board.values_list('id', 'user_id', 'subject_name').iterator()
+        if (user_id, subject_name) not in keep
+    ]
+    with transaction.atomic():
+        for i in range(0, len(stale_ids), 1000):
+            LeaderboardEntry.objects.filter(id__in=stale_ids[i:i + 1000]).delete()
+        _upsert(entries)
+
+
+def refresh_leaderboards(keys):
+    """
+    集計キー (user_id, subject_id, date) の日付を含む週・月について、
+    対象ユーザーのランキング行を日別集計から再計算する（None は無視）
+
+    週・月ごとに対象ユーザー全員の行を1つの集計クエリで再計算し、まとめて更新します。
+    """
+    users_by_board = defaultdict(set)
+    for key in keys:
+        if key is not None:
+            for period in PERIODS:
+                users_by_board[(period, bucket_start(key[2], period))].add(key[0])
+
+    for (period, start), user_ids in users_by_board.items():
+        entries = _entries(period, start, _period_rollups(period, start).filter(user_id__in=user_ids))
+        board = LeaderboardEntry.objects.filter(period=period, period_start=start, user_id__in=user_ids)
+        _replace_entries(board, entries)
+
+
+def rebuild_leaderboards(period, start):
+    """
+    指定した期間のランキングを全ユーザーの日別集計から再構築し、作成・更新した行数を返す
+
+    集計にない行だけを削除し、残りは削除せずに upsert するため、同時に実行される
+    refresh_leaderboards と一意制約（unique_leaderboard_entry）で衝突しません。
+    """
+    entries = _entries(period, start, _period_rollups(period, start))
+    _replace_entries(LeaderboardEntry.objects.filter(period=period, period_start=start), entries)
+    return len(entries)
+
+
+def recent_period_starts(period, count, today=None):
+    """現在の期間から過去に遡って count 個分の開始日を返す"""
+    start = current_period_start(period, today)
+    starts = [start]
+    for _ in range(count - 1):
+        start = previous_bucket_start(start, period)
+        starts.append(start)
+    return starts
+
+
+def _board(period, start, subject_name):
+    return LeaderboardEntry.objects.filter(
+        period=period, period_start=start, subject_name=normalize_subject_name(subject_name)
+    )
+
+
+def _value(metric, value):
+    """ランキングの値を表示用に変換する（時間は時間単位、金額は数値）"""
+    if metric == 'hours':
+        return round(value / 3600, 2)
+    return round(float(value), 2)
+
+
+def get_rank(period, start, subject_name, metric, user_id):
+    """
+    ユーザーの順位と値を返す（ランキングに含まれない場合は None）
+
+    順位は自分より値が大きい行の件数 + 1 で、同じ値のユーザーは同順位です。
+    件数は (期間, 開始日, 科目名, 値の降順) のインデックスの範囲を数えるため、
+    コストは順位（自分より上の行数）に比例します。インデックスのみの走査で行は読まないため
+    数万人規模では問題になりませんが、それ以上の規模では値の分布をキャッシュする必要があります。
+    """
+    field = METRICS[metric]
+    board = _board(period, start, subject_name)
+    value = board.filter(user_id=user_id).values_list(field, flat=True).first()
+    if value is None:
+        return None
+    return {
+        'rank': board.filter(**{f'{field}__gt': value}).count() + 1,
+        'value': _value(metric, value),
+    }
+
+
+def _build_page(period, start, subject_name, metric, offset, limit):
+    field = METRICS[metric]
+    board = _board(period, start, subject_name)
+    rows = list(board.order_by(f'-{field}', 'user_id').values_list('user_id', field)[offset:offset + limit])
+    if not rows:
+        return []
+
+    # 先頭の順位だけ件数で求め（get_rank と同じく offset に比例するコスト）、
+    # 以降は同じ値なら同順位として並び順から決める
+    rank = board.filter(**{f'{field}__gt': rows[0][1]}).count() + 1
+    entries = []
+    for i, (user_id, value) in enumerate(rows):
+        if i and value != rows[i - 1][1]:
+            rank = offset + i + 1
+        entries.append({'rank': rank, 'user_id': user_id, 'value': _value(metric, value)})
+    return entries
+
+
+def get_leaderboard_page(period, start, subject_name, metric, offset=0, limit=20):
+    """
+    ランキングの offset 位置から limit 件を返す
+
+    上位のページは全ユーザーで共通のため、LEADERBOARD_CACHE_TIMEOUT 秒だけ共有キャッシュに保存します。
+    """
+    # 科目名は任意の文字列のため、キャッシュキーにはハッシュを使う
+    subject_name = normalize_subject_name(subject_name)
+    key = LEADERBOARD_PAGE_KEY.format(
+        period=period,
+        start=start.isoformat(),
+        subject=hashlib.md5(subject_name.encode('utf-8')).hexdigest(),
+        metric=metric,
+        offset=offset,
+        limit=limit
+    )
+    entries = cache.get(key)
+    if entries is None:
+        entries = _build_page(period, start, subject_name, metric, offset, limit)
+        cache.set(key, entries, settings.LEADERBOARD_CACHE_TIMEOUT)
+    return entries
@@ -0,0 +1,135 @@
+"""
+LLM バックエンド
+
+AI 呼び出しを小さなインターフェース（generate / stream）の裏に隠し、
+Vertex AI とローカルのスタブを settings.AI_BACKEND で切り替えます。
+バックエンドとモデルのインスタンスはプロセス内で一度だけ作成して再利用するため、
+リクエストごとのコストはモデル呼び出し（ネットワーク通信）のみになります。
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend:
+    """LLM バックエンドの基底クラス"""
+    name = None
+
+    def generate(self, prompt, model_name, temperature=0.2):
+        """プロンプトに対する応答テキスト全体を返す"""
+        raise NotImplementedError
+
+    def stream(self, prompt, model_name, temperature=0.2):
+        """プロンプトに対する応答テキストをチャンク単位で返すジェネレーター"""
+        raise NotImplementedError
+
+
+class VertexAIBackend(LLMBackend):
+    """
+    Vertex AI（Gemini）バックエンド
+
+    vertexai.init はプロセスで一度だけ呼び出し、GenerativeModel は
+    (モデル名, 生成設定) ごとにキャッシュします。
+    """
+    name = 'vertex'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._models = {}
+
+    def _initialize(self):
+        import vertexai
+
+        # 環境変数から値を取得するか、settings.pyから取得
+        project_id = os.getenv('GCP_PROJECT_ID', getattr(settings, 'GCP_PROJECT_ID', None))
+        location = os.getenv('GCP_REGION', getattr(settings, 'GCP_REGION', 'us-central1'))
+
+        if not project_id:
+            raise ValueError("GCP_PROJECT_IDが設定されていません")
+
+        vertexai.init(project=project_id, location=location)
+        logger.info("Vertex AI initialized successfully")
+
+    def get_model(self, model_name, temperature):
+        key = (model_name, temperature)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # ロック待ちの間に他のスレッドが作成した場合はそれを使う
+            model = self._models.get(key)
+            if model is None:
+                from vertexai.generative_models import GenerationConfig, GenerativeModel
+
+                if not self._initialized:
+                    self._initialize()
+                    self._initialized = True
+                model = GenerativeModel(
+                    model_name,
+                    generation_config=GenerationConfig(temperature=temperature)
+                )
+                self._models[key] = model
+        return model
+
+    def generate(self, prompt, model_name, temperature=0.2):
+        return self.get_model(model_name, temperature).generate_content(prompt).text
+
+    def stream(self, prompt, model_name, temperature=0.2):
+        for chunk in self.get_model(model_name, temperature).generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class StubBackend(LLMBackend):
+    """
+    Vertex AI を呼び出さないローカル用のスタブ（テスト・負荷試験用）
+
+    プロンプトから決定的な応答を返します。settings.AI_STUB_LATENCY_MS で
+    応答の遅延を模擬できます。
+    """
+    name = 'stub'
+    chunk_size = 8
+
+    def _respond(self, prompt, model_name):
+        latency = settings.AI_STUB_LATENCY_MS
+        if latency:
+            time.sleep(latency / 1000)
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+        return f"[stub:{model_name}] 学習分析（プロンプト{len(prompt)}文字, {digest}）"
+
+    def generate(self, prompt, model_name, temperature=0.2):
+        return self._respond(prompt, model_name)
+
+    def stream(self, prompt, model_name, temperature=0.2):
+        text = self._respond(prompt, model_name)
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+
+BACKEND_CLASSES = {
+    VertexAIBackend.name: VertexAIBackend,
+    StubBackend.name: StubBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    """設定されたバックエンドのプロセス内共通インスタンスを返す"""
+    name = name or settings.AI_BACKEND
+    backend = _backends.get(name)
+    if backend is None:
+        if name not in BACKEND_CLASSES:
+            raise ValueError(f"不明なAIバックエンドです: {name}")
+        with _backends_lock:
+            backend = _backends.setdefault(name, BACKEND_CLASSES[name]())
+    return backend
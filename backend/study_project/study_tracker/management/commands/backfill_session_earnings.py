@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from study_tracker.models import StudySession
+from study_tracker.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "終了済みセッションに適用時給と獲得金額をバッチ単位で書き込みます（未設定の行のみ）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="1バッチあたりの更新件数（デフォルト: 1000）"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = StudySession.objects.filter(
+            end_time__isnull=False,
+            hourly_rate__isnull=True
+        ).select_related('subject').order_by('id')
+
+        updated = 0
+        user_ids = set()
+        last_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            for session in batch:
+                session.apply_earnings()
+            StudySession.objects.bulk_update(batch, ['hourly_rate', 'earned_amount'])
+
+            updated += len(batch)
+            user_ids.update(session.user_id for session in batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"{updated}件更新しました")
+
+        self.stdout.write(self.style.SUCCESS(f"合計{updated}件のセッションに獲得金額を書き込みました"))
+        if user_ids:
+            # 日別集計の獲得金額にも反映する
+            count = rebuild_rollups(user_ids)
+            self.stdout.write(self.style.SUCCESS(f"{len(user_ids)}人分の日別集計を再構築しました（{count}件）"))
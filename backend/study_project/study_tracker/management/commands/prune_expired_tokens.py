@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = "有効期限切れのJWTリフレッシュトークン（OutstandingToken と BlacklistedToken）をバッチ単位で削除します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="1バッチあたりの削除件数（デフォルト: 1000）"
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help="バッチ間の待機秒数（DBの負荷を抑える場合に指定）"
+        )
+        parser.add_argument(
+            '--every',
+            type=int,
+            default=0,
+            help="指定した秒数ごとに繰り返し実行する（0の場合は1回のみ）"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = self.prune(options['batch_size'], options['sleep'])
+            self.stdout.write(self.style.SUCCESS(f"期限切れのトークンを{deleted}件削除しました"))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def prune(self, batch_size, sleep):
+        now = timezone.now()
+        # 主キー順に走査し、古い（期限切れの多い）行から削除する
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by('id')
+
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(id__in=ids).delete()
+
+            deleted += len(ids)
+            if sleep:
+                time.sleep(sleep)
+        return deleted
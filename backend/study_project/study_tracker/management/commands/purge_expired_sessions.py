@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "有効期限切れのセッションをバッチ単位で削除します（clearsessions の一括削除の代わり）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="1バッチあたりの削除件数（デフォルト: 1000）"
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help="バッチ間の待機秒数（DBの負荷を抑える場合に指定）"
+        )
+        parser.add_argument(
+            '--every',
+            type=int,
+            default=0,
+            help="指定した秒数ごとに繰り返し実行する（0の場合は1回のみ）"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = self.purge(options['batch_size'], options['sleep'])
+            self.stdout.write(self.style.SUCCESS(f"期限切れのセッションを{deleted}件削除しました"))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def purge(self, batch_size, sleep):
+        # expire_date のインデックスを使って期限切れの行だけを取得する
+        expired = Session.objects.filter(expire_date__lt=timezone.now()).order_by('expire_date')
+
+        deleted = 0
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                break
+
+            Session.objects.filter(session_key__in=keys).delete()
+
+            deleted += len(keys)
+            if sleep:
+                time.sleep(sleep)
+        return deleted
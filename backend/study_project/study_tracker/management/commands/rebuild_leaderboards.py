@@ -0,0 +1,44 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from study_tracker.leaderboards import PERIODS, rebuild_leaderboards, recent_period_starts
+
+logger = logging.getLogger('study_tracker')
+
+
+class Command(BaseCommand):
+    help = "日別集計から週間・月間ランキング（LeaderboardEntry）を再構築します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--periods',
+            type=int,
+            default=2,
+            help="現在の期間から遡って再構築する期間の数（デフォルト: 2、今週・今月と前週・前月）"
+        )
+        parser.add_argument(
+            '--every',
+            type=int,
+            default=0,
+            help="指定した秒数ごとに繰り返し実行する（0の場合は1回のみ）"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                for period in PERIODS:
+                    for start in recent_period_starts(period, options['periods']):
+                        count = rebuild_leaderboards(period, start)
+                        self.stdout.write(f"{period} {start}: {count}件")
+                self.stdout.write(self.style.SUCCESS("ランキングを再構築しました"))
+            except DatabaseError as e:
+                # 繰り返し実行中はデッドロックなどの一時的なエラーで停止せず、次の回で再試行する
+                if not options['every']:
+                    raise
+                logger.error(f"ランキングの再構築エラー: {str(e)}")
+            if not options['every']:
+                break
+            time.sleep(options['every'])
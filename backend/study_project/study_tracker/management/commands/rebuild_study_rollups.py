@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from study_tracker.models import DailyStudyRollup, StudySession
+from study_tracker.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "勉強セッション履歴から日別集計テーブル（DailyStudyRollup）を再構築します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help="対象ユーザーID（複数指定可、省略時は全ユーザー）"
+        )
+        parser.add_argument(
+            '--if-empty',
+            action='store_true',
+            help="集計テーブルが空の場合のみ再構築する（デプロイ時の初回作成用）"
+        )
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and (
+            DailyStudyRollup.objects.exists() or not StudySession.objects.filter(end_time__isnull=False).exists()
+        ):
+            self.stdout.write("日別集計は作成済みのため再構築しませんでした")
+            return
+
+        count = rebuild_rollups(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"{count}件の日別集計を再構築しました"))
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from study_tracker.goals import reconcile_goals
+from study_tracker.models import SavingsGoal
+
+
+class Command(BaseCommand):
+    help = (
+        "貯金目標の現在額と達成状態をセッション履歴から再計算します"
+        "（stop・一括登録と同じ加算のルールで履歴を再生）"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="1バッチあたりのユーザー数（デフォルト: 500）"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="更新せずに差分のみ表示する"
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help="バッチ間の待機秒数（DBの負荷を抑える場合に指定）"
+        )
+        parser.add_argument(
+            '--every',
+            type=int,
+            default=0,
+            help="指定した秒数ごとに繰り返し実行する（0の場合は1回のみ）"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            changed = self.reconcile(options['batch_size'], options['sleep'], options['dry_run'])
+            if options['dry_run']:
+                self.stdout.write(self.style.SUCCESS(f"差分のある貯金目標: {changed}件（更新していません）"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"貯金目標を{changed}件更新しました"))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def reconcile(self, batch_size, sleep, dry_run):
+        user_ids = SavingsGoal.objects.order_by('user_id').values_list('user_id', flat=True).distinct()
+
+        changed = 0
+        last_user_id = 0
+        while True:
+            batch = list(user_ids.filter(user_id__gt=last_user_id)[:batch_size])
+            if not batch:
+                break
+
+            changes = reconcile_goals(batch, dry_run=dry_run)
+            if dry_run:
+                for change in changes:
+                    self.stdout.write(
+                        f"user={change.user_id} goal={change.goal_id} {change.title}: "
+                        f"{change.current_amount} -> {change.new_amount}"
+                        + (f" (達成: {change.is_achieved} -> {change.new_is_achieved})"
+                           if change.is_achieved != change.new_is_achieved else "")
+                    )
+
+            changed += len(changes)
+            last_user_id = batch[-1]
+            if sleep:
+                time.sleep(sleep)
+        return changed
@@ -0,0 +1,66 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from study_tracker.analysis_jobs import claim_jobs, requeue_stale_jobs, run_analysis_job
+from study_tracker.llm_backends import StubBackend, get_backend
+
+
+class Command(BaseCommand):
+    help = "AI学習分析の非同期ジョブを処理するワーカーを起動します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.AI_WORKER_CONCURRENCY,
+            help="同時に実行する分析ジョブ数（スレッド数）"
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help="待機中のジョブがない場合のポーリング間隔（秒）"
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="待機中のジョブをすべて処理したら終了する"
+        )
+        parser.add_argument(
+            '--stub',
+            action='store_true',
+            help="Vertex AI の代わりにローカルのスタブモデルを使用する"
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        # --stub はこのワーカーのジョブにだけ適用する（settings は書き換えない）
+        backend = get_backend(StubBackend.name if options['stub'] else None)
+
+        requeued = requeue_stale_jobs(settings.AI_JOB_STALE_SECONDS)
+        if requeued:
+            self.stdout.write(f"{requeued}件の停止したジョブを再登録しました")
+        self.stdout.write(f"学習分析ワーカーを起動しました（同時実行数: {concurrency}）")
+
+        running = set()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                while True:
+                    running = {future for future in running if not future.done()}
+                    free_slots = concurrency - len(running)
+
+                    job_ids = claim_jobs(free_slots) if free_slots > 0 else []
+                    for job_id in job_ids:
+                        running.add(executor.submit(run_analysis_job, job_id, backend))
+
+                    if options['once'] and not job_ids and not running:
+                        break
+                    if not job_ids:
+                        time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                self.stdout.write("ワーカーを停止しています（実行中のジョブの完了を待ちます）")
+
+        self.stdout.write(self.style.SUCCESS("学習分析ワーカーを終了しました"))
@@ -1,68 +1,89 @@
-import time
+from django.conf import settings
 from django.http import JsonResponse
-from django.core.cache import cache
 from rest_framework import status
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .admission import AdmissionRejected, admit
+from .ratelimit import SlidingWindowRateLimiter
+
+
+def get_client_ip(request):
+    """
+    クライアントのIPアドレスを取得します。
+    プロキシが設定されている場合はX-Forwarded-Forを参照します。
+    """
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0]
+    else:
+        ip = request.META.get('REMOTE_ADDR')
+    return ip
+
+
+def get_client_key(request):
+    """
+    レート制限・同時実行数制御のクライアントキーを返します。
+    有効なJWTアクセストークンがある場合はユーザーID（DBは参照しない）、
+    それ以外はIPアドレスを使います。
+    """
+    header = request.META.get(jwt_settings.AUTH_HEADER_NAME, '').split()
+    if len(header) == 2 and header[0] in jwt_settings.AUTH_HEADER_TYPES:
+        try:
+            token = AccessToken(header[1])
+            return f"user:{token[jwt_settings.USER_ID_CLAIM]}"
+        except (TokenError, KeyError):
+            pass
+    return f"ip:{get_client_ip(request)}"
+
 
 class RateLimitMiddleware:
     """
     レート制限のミドルウェア
-    
+
     特定のエンドポイントへのリクエスト数を制限し、ブルートフォース攻撃や
     APIの過剰な使用を防止します。
+    カウンターはキャッシュ上でアトミックに更新するため、共有キャッシュ（Redis）を
+    設定すると複数のワーカー間で同じ制限が適用されます。
     """
-    
+
     def __init__(self, get_response):
         self.get_response = get_response
-        # 設定
-        self.rate_limit = {
-            # 認証関連エンドポイント
-            'auth': {
-                'window': 60,  # 60秒（1分）あたり
-                'max_requests': 10  # 最大10リクエスト
-            },
-            # API全般
-            'api': {
-                'window': 60,  # 60秒（1分）あたり
-                'max_requests': 100  # 最大100リクエスト
-            }
+        # 設定（settings.RATE_LIMITS: {'auth': {...}, 'api': {...}}）
+        self.limiters = {
+            request_type: SlidingWindowRateLimiter(
+                request_type, config['max_requests'], config['window']
+            )
+            for request_type, config in settings.RATE_LIMITS.items()
         }
-    
+
     def __call__(self, request):
         # レート制限を適用するかどうかチェック
-        if self._should_rate_limit(request):
-            # クライアントのIPアドレスを取得
-            ip = self._get_client_ip(request)
-            
-            # リクエストパスに基づいてリクエストタイプを決定
-            request_type = 'auth' if '/auth/' in request.path else 'api'
-            
-            # レート制限のキーを作成
-            cache_key = f"rate_limit_{request_type}_{ip}"
-            
-            # 現在の制限情報を取得
-            rate_limit_data = cache.get(cache_key, {'requests': 0, 'reset_time': time.time() + self.rate_limit[request_type]['window']})
-            
-            # 時間枠をリセットする必要があるかチェック
-            if time.time() > rate_limit_data['reset_time']:
-                rate_limit_data = {'requests': 0, 'reset_time': time.time() + self.rate_limit[request_type]['window']}
-            
-            # リクエスト数を増やす
-            rate_limit_data['requests'] += 1
-            
-            # キャッシュを更新
-            cache.set(cache_key, rate_limit_data, self.rate_limit[request_type]['window'])
-            
-            # 制限を超えているかチェック
-            if rate_limit_data['requests'] > self.rate_limit[request_type]['max_requests']:
-                retry_after = int(rate_limit_data['reset_time'] - time.time())
-                return JsonResponse({
-                    'error': 'Too many requests',
-                    'retry_after': retry_after
-                }, status=status.HTTP_429_TOO_MANY_REQUESTS)
-        
-        # 通常のリクエスト処理を続行
-        return self.get_response(request)
-    
+        if not self._should_rate_limit(request):
+            return self.get_response(request)
+
+        # リクエストパスに基づいてリクエストタイプを決定
+        request_type = 'auth' if '/auth/' in request.path else 'api'
+
+        # 認証済み（JWT）ならユーザーID、それ以外はクライアントのIPアドレスごとに制限
+        result = self.limiters[request_type].hit(get_client_key(request))
+
+        # 制限を超えているかチェック
+        if not result.allowed:
+            response = JsonResponse({
+                'error': 'Too many requests',
+                'retry_after': result.reset_after
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(result.reset_after)
+        else:
+            # 通常のリクエスト処理を続行
+            response = self.get_response(request)
+
+        for header, value in result.headers.items():
+            response[header] = value
+        return response
+
     def _should_rate_limit(self, request):
         """
         リクエストがレート制限の対象かどうかを判断します。
@@ -70,21 +91,72 @@ class RateLimitMiddleware:
         # 認証関連エンドポイントは常にレート制限する
         if '/auth/' in request.path:
             return True
-        
+
         # APIエンドポイントはレート制限する
         if request.path.startswith('/api/'):
             return True
-        
+
         return False
-    
-    def _get_client_ip(self, request):
-        """
-        クライアントのIPアドレスを取得します。
-        プロキシが設定されている場合はX-Forwarded-Forを参照します。
-        """
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+
+
+def _release_after(content, admission):
+    """
+    ストリーミングの本文をそのまま返し、終了時にスロットを解放するジェネレーター
+
+    送信開始前に接続が切れた場合はジェネレーターの finally が実行されないため、
+    スロットはリース期限（ADMISSION_LEASE_SECONDS）で解放されます。
+    """
+    try:
+        yield from content
+    finally:
+        admission.release()
+
+
+class AdmissionControlMiddleware:
+    """
+    高コストなエンドポイントの同時実行数を制限するミドルウェア
+
+    settings.ADMISSION_ROUTES に登録した URL 名のリクエストは、プールのスロットを
+    コスト分確保できた場合のみ処理し、確保できない場合はすぐに 503 と Retry-After を
+    返します（per_user のルートは同じユーザーの実行中のリクエストも1件までに制限）。
+    AI 分析が集中しても、ワーカーが埋まらず通常の CRUD は応答できるようにします。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        admission = getattr(request, '_admission', None)
+        if admission is not None:
+            if response.streaming:
+                # ストリーミングは本文を送り終えた（または途中で閉じられた）時点で解放する
+                response.streaming_content = _release_after(response.streaming_content, admission)
+            else:
+                admission.release()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = settings.ADMISSION_ROUTES.get(request.resolver_match.url_name)
+        if route is None or request.method not in route['methods']:
+            return None
+
+        try:
+            request._admission = admit(
+                route['pool'],
+                route['cost'],
+                get_client_key(request) if route['per_user'] else None
+            )
+        except AdmissionRejected as e:
+            message = (
+                '実行中のリクエストが完了してから再度お試しください。'
+                if e.reason == 'user' else
+                'サーバーが混み合っています。しばらくしてから再度お試しください。'
+            )
+            response = JsonResponse({
+                'error': message,
+                'retry_after': settings.ADMISSION_RETRY_AFTER
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(settings.ADMISSION_RETRY_AFTER)
+            return response
+        return None
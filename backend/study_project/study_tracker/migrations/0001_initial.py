@@ -0,0 +1,54 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Subject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='科目名')),
+                ('hourly_rate', models.DecimalField(decimal_places=2, default=1000, max_digits=10, verbose_name='時給換算額')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subjects', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudySession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='開始時間')),
+                ('end_time', models.DateTimeField(blank=True, null=True, verbose_name='終了時間')),
+                ('duration', models.DurationField(blank=True, null=True, verbose_name='勉強時間')),
+                ('notes', models.TextField(blank=True, verbose_name='メモ')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to='study_tracker.subject')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SavingsGoal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200, verbose_name='目標タイトル')),
+                ('target_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='目標金額')),
+                ('current_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='現在の金額')),
+                ('deadline', models.DateField(blank=True, null=True, verbose_name='期限')),
+                ('is_achieved', models.BooleanField(default=False, verbose_name='達成済み')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='savings_goals', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('study_tracker', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStudyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('total_seconds', models.BigIntegerField(default=0, verbose_name='勉強秒数')),
+                ('earned_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='獲得金額')),
+                ('session_count', models.PositiveIntegerField(default=0, verbose_name='セッション数')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='study_tracker.subject')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_study_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date'], name='rollup_user_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailystudyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'subject', 'date'), name='unique_daily_study_rollup'),
+        ),
+    ]
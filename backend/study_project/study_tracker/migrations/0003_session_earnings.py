@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study_tracker', '0002_daily_study_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='earned_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='獲得金額'),
+        ),
+        migrations.AddField(
+            model_name='studysession',
+            name='hourly_rate',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='適用時給'),
+        ),
+    ]
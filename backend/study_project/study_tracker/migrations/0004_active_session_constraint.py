@@ -0,0 +1,45 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:49
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+
+
+def close_duplicate_active_sessions(apps, schema_editor):
+    """ユーザーごとに複数残っている進行中セッションを、最新の1件を除いて勉強時間0として終了させる"""
+    StudySession = apps.get_model('study_tracker', 'StudySession')
+    duplicated = StudySession.objects.filter(end_time__isnull=True).values('user_id').annotate(
+        active_count=Count('id'),
+        latest_id=Max('id')
+    ).filter(active_count__gt=1).order_by()
+
+    for row in duplicated:
+        StudySession.objects.filter(
+            user_id=row['user_id'],
+            end_time__isnull=True
+        ).exclude(id=row['latest_id']).update(end_time=F('start_time'), duration=timedelta(0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study_tracker', '0003_session_earnings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='savingsgoal',
+            index=models.Index(fields=['user', 'is_achieved'], name='goal_user_achieved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', 'end_time', 'start_time'], name='session_user_end_start_idx'),
+        ),
+        # 一意制約を追加する前に既存の重複を解消する
+        migrations.RunPython(close_duplicate_active_sessions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='studysession',
+            constraint=models.UniqueConstraint(condition=models.Q(('end_time__isnull', True)), fields=('user',), name='unique_active_session_per_user'),
+        ),
+    ]
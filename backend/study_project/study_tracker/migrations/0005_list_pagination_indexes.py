@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study_tracker', '0004_active_session_constraint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='savingsgoal',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='goal_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', 'start_time', 'id'], name='session_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', 'subject', 'start_time'], name='session_user_subject_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subject',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='subject_user_created_idx'),
+        ),
+    ]
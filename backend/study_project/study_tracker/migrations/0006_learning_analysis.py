@@ -0,0 +1,37 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('study_tracker', '0005_list_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LearningAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('input_hash', models.CharField(max_length=64, verbose_name='入力ハッシュ')),
+                ('model_name', models.CharField(max_length=100, verbose_name='モデル名')),
+                ('result', models.TextField(verbose_name='分析結果')),
+                ('hit_count', models.PositiveIntegerField(default=0, verbose_name='再利用回数')),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='最終利用日時')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learning_analyses', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'last_used_at'], name='analysis_user_last_used_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='learninganalysis',
+            constraint=models.UniqueConstraint(fields=('user', 'input_hash'), name='unique_learning_analysis_input'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('study_tracker', '0006_learning_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LearningAnalysisJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('study_purpose', models.TextField(blank=True, verbose_name='学習目的')),
+                ('force_refresh', models.BooleanField(default=False, verbose_name='再生成')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '実行中'), ('succeeded', '完了'), ('failed', '失敗')], default='pending', max_length=20, verbose_name='状態')),
+                ('result', models.TextField(blank=True, verbose_name='分析結果')),
+                ('cached', models.BooleanField(default=False, verbose_name='キャッシュ利用')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learning_analysis_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='analysis_job_status_idx'), models.Index(fields=['user', 'status'], name='analysis_job_user_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study_tracker', '0007_learning_analysis_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='client_id',
+            field=models.UUIDField(blank=True, null=True, verbose_name='クライアントID'),
+        ),
+        migrations.AddConstraint(
+            model_name='studysession',
+            constraint=models.UniqueConstraint(fields=('user', 'client_id'), name='unique_session_client_id'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('study_tracker', '0008_session_client_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', '週間'), ('month', '月間')], max_length=5, verbose_name='期間の種類')),
+                ('period_start', models.DateField(verbose_name='期間の開始日')),
+                ('subject_name', models.CharField(blank=True, default='', max_length=100, verbose_name='科目名')),
+                ('total_seconds', models.BigIntegerField(default=0, verbose_name='勉強秒数')),
+                ('earned_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='獲得金額')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'period_start', 'subject_name', '-total_seconds'], name='leaderboard_seconds_idx'), models.Index(fields=['period', 'period_start', 'subject_name', '-earned_amount'], name='leaderboard_earned_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'subject_name', 'user'), name='unique_leaderboard_entry'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def normalize_leaderboard_subjects(apps, schema_editor):
+    """ランキング行の科目名を正規化し、正規化後に同じ科目名になる行の値を1行に合算する"""
+    LeaderboardEntry = apps.get_model('study_tracker', 'LeaderboardEntry')
+    rows = LeaderboardEntry.objects.exclude(subject_name='').order_by('id')
+
+    merged = {}
+    for entry in rows.iterator():
+        name = ' '.join(entry.subject_name.split()).casefold()
+        key = (entry.period, entry.period_start, name, entry.user_id)
+        target = merged.get(key)
+        if target is None:
+            merged[key] = entry
+            if entry.subject_name != name:
+                entry.subject_name = name
+                entry.needs_save = True
+            continue
+
+        target.total_seconds += entry.total_seconds
+        target.earned_amount += entry.earned_amount
+        target.needs_save = True
+        entry.delete()
+
+    for entry in merged.values():
+        if getattr(entry, 'needs_save', False):
+            entry.save(update_fields=['subject_name', 'total_seconds', 'earned_amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study_tracker', '0010_user_data_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_leaderboard_subjects, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study_tracker', '0011_normalize_leaderboard_subjects'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studysession',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -10,6 +12,11 @@ class Subject(models.Model):
     hourly_rate = models.DecimalField("時給換算額", max_digits=10, decimal_places=2, default=1000)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='subject_user_created_idx'),
+        ]
+    
     def __str__(self):
         return self.name
 
@@ -22,21 +29,47 @@ class StudySession(models.Model):
     end_time = models.DateTimeField("終了時間", null=True, blank=True)
     duration = models.DurationField("勉強時間", null=True, blank=True)
     notes = models.TextField("メモ", blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    hourly_rate = models.DecimalField("適用時給", max_digits=10, decimal_places=2, null=True, blank=True)
+    earned_amount = models.DecimalField("獲得金額", max_digits=12, decimal_places=2, default=0)
+    # オフライン記録をまとめて送信する際にクライアントが発行するID（重複送信の判定用）
+    client_id = models.UUIDField("クライアントID", null=True, blank=True)
+    # auto_now_add と同じく登録時刻が入るが、一括登録では bulk_create 前に同じ時刻を設定できる
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'end_time', 'start_time'], name='session_user_end_start_idx'),
+            # 一覧のカーソルページネーション（開始日時 + id）と科目での絞り込み用
+            models.Index(fields=['user', 'start_time', 'id'], name='session_user_start_idx'),
+            models.Index(fields=['user', 'subject', 'start_time'], name='session_user_subject_idx'),
+        ]
+        constraints = [
+            # 進行中（end_time が NULL）のセッションはユーザーごとに1つまで
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(end_time__isnull=True),
+                name='unique_active_session_per_user'
+            ),
+            models.UniqueConstraint(fields=['user', 'client_id'], name='unique_session_client_id'),
+        ]
     
     @property
     def is_active(self):
         return self.end_time is None
         
-    @property
-    def earned_amount(self):
-        """獲得金額を計算"""
-        if not self.duration:
-            return 0
-            
-        from decimal import Decimal
-        hours = Decimal(str(self.duration.total_seconds() / 3600))
-        return self.subject.hourly_rate * hours
+    @staticmethod
+    def calculate_earned_amount(duration, hourly_rate):
+        """勉強時間と時給から獲得金額を計算"""
+        if not duration or hourly_rate is None:
+            return Decimal('0')
+        hours = Decimal(str(duration.total_seconds())) / 3600
+        return round(hourly_rate * hours, 2)
+    
+    def apply_earnings(self):
+        """適用時給を記録し、獲得金額を保存用に計算する（終了時に一度だけ呼ぶ）"""
+        if self.hourly_rate is None:
+            self.hourly_rate = self.subject.hourly_rate
+        self.earned_amount = self.calculate_earned_amount(self.duration, self.hourly_rate)
     
     def __str__(self):
         return f"{self.subject.name} - {self.start_time.strftime('%Y-%m-%d %H:%M')}"
@@ -52,6 +85,12 @@ class SavingsGoal(models.Model):
     is_achieved = models.BooleanField("達成済み", default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_achieved'], name='goal_user_achieved_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='goal_user_created_idx'),
+        ]
+    
     @property
     def progress_percentage(self):
         """進捗率を計算"""
@@ -61,3 +100,140 @@ class SavingsGoal(models.Model):
     
     def __str__(self):
         return self.title
+
+
+class DailyStudyRollup(models.Model):
+    """日別勉強集計モデル（ユーザー・科目・日付ごとの集計）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_study_rollups')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField("日付")
+    total_seconds = models.BigIntegerField("勉強秒数", default=0)
+    earned_amount = models.DecimalField("獲得金額", max_digits=12, decimal_places=2, default=0)
+    session_count = models.PositiveIntegerField("セッション数", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'subject', 'date'], name='unique_daily_study_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date'], name='rollup_user_date_idx'),
+        ]
+
+    @property
+    def total_hours(self):
+        return self.total_seconds / 3600
+
+    def __str__(self):
+        return f"{self.subject.name} - {self.date}"
+
+
+class LeaderboardEntry(models.Model):
+    """ランキング集計モデル（期間・科目名・ユーザーごとの合計。科目名が空の行は全科目の合計）"""
+    PERIOD_CHOICES = [
+        ('week', '週間'),
+        ('month', '月間'),
+    ]
+
+    period = models.CharField("期間の種類", max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField("期間の開始日")
+    subject_name = models.CharField("科目名", max_length=100, blank=True, default='')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    total_seconds = models.BigIntegerField("勉強秒数", default=0)
+    earned_amount = models.DecimalField("獲得金額", max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'period_start', 'subject_name', 'user'],
+                name='unique_leaderboard_entry'
+            ),
+        ]
+        indexes = [
+            # 上位の取得と順位（自分より上の件数）の計算に使う
+            models.Index(
+                fields=['period', 'period_start', 'subject_name', '-total_seconds'],
+                name='leaderboard_seconds_idx'
+            ),
+            models.Index(
+                fields=['period', 'period_start', 'subject_name', '-earned_amount'],
+                name='leaderboard_earned_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_period_display()} {self.period_start} {self.subject_name or '全科目'} - {self.user}"
+
+
+class LearningAnalysis(models.Model):
+    """AI学習分析結果のキャッシュ（分析入力のハッシュをキーに保存）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='learning_analyses')
+    input_hash = models.CharField("入力ハッシュ", max_length=64)
+    model_name = models.CharField("モデル名", max_length=100)
+    result = models.TextField("分析結果")
+    hit_count = models.PositiveIntegerField("再利用回数", default=0)
+    last_used_at = models.DateTimeField("最終利用日時", default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'input_hash'], name='unique_learning_analysis_input'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'last_used_at'], name='analysis_user_last_used_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class LearningAnalysisJob(models.Model):
+    """AI学習分析の非同期ジョブ"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '待機中'),
+        (STATUS_RUNNING, '実行中'),
+        (STATUS_SUCCEEDED, '完了'),
+        (STATUS_FAILED, '失敗'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='learning_analysis_jobs')
+    study_purpose = models.TextField("学習目的", blank=True)
+    force_refresh = models.BooleanField("再生成", default=False)
+    status = models.CharField("状態", max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    result = models.TextField("分析結果", blank=True)
+    cached = models.BooleanField("キャッシュ利用", default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField("開始日時", null=True, blank=True)
+    finished_at = models.DateTimeField("終了日時", null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='analysis_job_status_idx'),
+            models.Index(fields=['user', 'status'], name='analysis_job_user_status_idx'),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    def __str__(self):
+        return f"{self.user} - {self.get_status_display()} ({self.created_at.strftime('%Y-%m-%d %H:%M')})"
+
+
+class UserDataVersion(models.Model):
+    """
+    ユーザーのデータバージョン（統計キャッシュと ETag のキー）
+
+    データの変更時に version を加算します。全プロセス・バックグラウンドのコマンドで
+    同じ値を参照できるよう、キャッシュではなく DB に保存します。
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='data_version')
+    version = models.PositiveBigIntegerField("バージョン", default=0)
+
+    def __str__(self):
+        return f"{self.user} - {self.version}"
@@ -7,6 +7,8 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.decorators import login_required
 import json
 
+from .authentication import get_session_user
+
 @require_GET
 def oauth_callback_view(request):
     """
@@ -80,11 +82,13 @@ def oauth_status_view(request):
     """
     OAuth認証の状態を確認するAPIエンドポイント
     """
-    if request.user.is_authenticated:
+    # セッションとキャッシュ済みユーザーから判定（DBは参照しない）
+    user = get_session_user(request)
+    if user is not None:
         return JsonResponse({
             'authenticated': True,
-            'username': request.user.username,
-            'email': request.user.email
+            'username': user.username,
+            'email': user.email
         })
     else:
         return JsonResponse({
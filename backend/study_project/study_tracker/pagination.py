@@ -0,0 +1,140 @@
+"""
+一覧エンドポイント用のカーソル（キーセット）ページネーション
+
+既存クライアントは一覧を配列として受け取るため、cursor または page_size
+パラメータが指定された場合のみページングします。並び順はインデックスに
+沿ったキー（日時 + id）で固定し、カーソルにはページ端の行のキーの組を保存します。
+次のページは「キーの組がカーソルより小さい行」の条件で取得するため、
+何ページ目でも OFFSET なしで同じコストで取得できます。
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class OptionalKeysetPagination(BasePagination):
+    """
+    cursor / page_size が指定されたリクエストだけをページングするキーセットページネーション
+
+    ordering は (日時フィールド, 'id') の組で、どちらも降順です。
+    レスポンスは CursorPagination と同じ {'next', 'previous', 'results'} 形式です。
+    """
+    ordering = None
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'カーソルが正しくありません。'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (self.cursor_query_param not in request.query_params
+                and self.page_size_query_param not in request.query_params):
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request)
+
+        if position is not None:
+            queryset = queryset.filter(self._after(position, reverse))
+        order = [field.lstrip('-') if reverse else field for field in self.ordering]
+        rows = list(queryset.order_by(*order)[:page_size + 1])
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.first_key = self._key(rows[0]) if rows else position
+        self.last_key = self._key(rows[-1]) if rows else position
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def _fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _key(self, row):
+        # 一覧は .values() の辞書、それ以外はモデルインスタンス
+        if isinstance(row, dict):
+            return tuple(row[field] for field in self._fields())
+        return tuple(getattr(row, field) for field in self._fields())
+
+    def _after(self, position, reverse):
+        """キーの組 (日時, id) がカーソルより後（reverse の場合は前）の行の条件"""
+        time_field, id_field = self._fields()
+        time_value, id_value = position
+        op = 'gt' if reverse else 'lt'
+        bound = 'gte' if reverse else 'lte'
+        # 先頭の範囲条件でインデックスの走査範囲を絞る
+        return Q(**{f'{time_field}__{bound}': time_value}) & (
+            Q(**{f'{time_field}__{op}': time_value})
+            | Q(**{time_field: time_value, f'{id_field}__{op}': id_value})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            time_value = parse_datetime(data['k'][0])
+            id_value = int(data['k'][1])
+            reverse = bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, IndexError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if time_value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, (time_value, id_value)
+
+    def encode_cursor(self, position, reverse):
+        data = {'k': [position[0].isoformat(), position[1]]}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or self.last_key is None:
+            return None
+        return self.encode_cursor(self.last_key, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_key is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first_key, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class StudySessionPagination(OptionalKeysetPagination):
+    """勉強セッション一覧（開始日時の新しい順）"""
+    ordering = ('-start_time', '-id')
+
+
+class CreatedAtPagination(OptionalKeysetPagination):
+    """作成日時の新しい順（科目・貯金目標）"""
+    ordering = ('-created_at', '-id')
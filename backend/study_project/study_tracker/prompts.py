@@ -0,0 +1,204 @@
+"""
+学習分析プロンプトの構築
+
+正規化した学習データ（ai_services.collect_learning_data）から、トークン数の
+上限（settings.AI_PROMPT_TOKEN_BUDGET）に収まるプロンプトを組み立てます。
+データはインデント付き JSON ではなく区切り文字の表で出力し、上限を超える場合は
+価値の低い行（古いセッション・達成済みや期限の遠い目標・勉強時間の少ない科目）
+から省略し、長いメモは切り詰めます。
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# セッションのメモの最大文字数（上限に収まらない場合はメモなしの行にする）
+NOTE_MAX_CHARS = 60
+
+# 学習目的に使えるトークン数の上限（予算に対する割合）
+PURPOSE_BUDGET_RATIO = 0.25
+
+PROMPT_HEADER = (
+    "あなたは学習コーチAIです。以下のデータを分析して、ユーザーの学習状況についての"
+    "インサイトと今後のアクションプランを提案してください。"
+    "表は「|」区切りで、1行目が列名です。"
+)
+
+PROMPT_INSTRUCTIONS = """学習状況を分析して、以下の点についてのインサイトと今後のアクションを提案してください：
+1. 学習パターンの分析（いつ、どのように勉強しているか）
+2. 学習効率の評価と改善点
+3. 目標達成に向けた具体的なネクストアクション
+4. モチベーション維持のためのアドバイス
+5. 学習目的に照らした進捗評価
+
+回答は日本語で、友好的かつ励ましの要素を含め、具体的なアドバイスを提供してください。
+箇条書きやリストを適切に使用して読みやすくしてください。"""
+
+
+def estimate_tokens(text):
+    """
+    テキストのトークン数を概算する
+
+    ASCII 文字は約4文字で1トークン、日本語などの非 ASCII 文字は1文字で約1トークンとして
+    数えます（実際のトークナイザーより多めに見積もります）。
+    """
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def _truncate(text, max_chars):
+    text = ' '.join((text or '').split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max(max_chars - 1, 0)] + '…'
+
+
+def _cell(value):
+    # 区切り文字と改行を含まないようにする
+    return str(value).replace('|', '/').replace('\n', ' ')
+
+
+def _row(*values):
+    return '|'.join(_cell(value) for value in values)
+
+
+class _Section:
+    """見出し・列名と、優先度付きの行を持つ表"""
+
+    def __init__(self, title, columns):
+        self.title = title
+        self.header = _row(*columns)
+        self.rows = []
+
+    def render(self):
+        if not self.rows:
+            return ''
+        return '\n'.join([f"【{self.title}】", self.header] + self.rows)
+
+
+def _session_rows(sessions):
+    """最近のセッションは新しい順に価値が高い。メモ付きの行が入らない場合はメモなしの行を使う"""
+    for rank, session in enumerate(sessions):
+        base = (session['date'], session['subject'], session['duration_hours'])
+        note = _truncate(session['notes'], NOTE_MAX_CHARS)
+        candidates = [_row(*base, note), _row(*base, '')] if note else [_row(*base, '')]
+        yield rank, candidates
+
+
+def _goal_rank(goal):
+    # 未達成 → 期限が近い → 期限未設定 → 達成済みの順
+    return (goal['is_achieved'], goal['deadline'] == '未設定', goal['deadline'])
+
+
+def _goal_rows(goals):
+    for rank, goal in enumerate(sorted(goals, key=_goal_rank)):
+        yield rank, [_row(
+            goal['title'],
+            int(goal['target_amount']),
+            int(goal['current_amount']),
+            f"{goal['progress_percentage']}%",
+            goal['deadline'],
+            '達成' if goal['is_achieved'] else '未達成'
+        )]
+
+
+def _subject_rows(data):
+    """科目は過去30日の勉強時間が多い順に価値が高い"""
+    recent_hours = data['subject_hours']
+    trends = {trend['name']: trend for trend in data['learning_patterns']['subject_trends']}
+    subjects = sorted(data['subjects'], key=lambda subject: -recent_hours.get(subject['name'], 0))
+    for rank, subject in enumerate(subjects):
+        trend = trends.get(subject['name'], {})
+        yield rank, [_row(
+            subject['name'],
+            int(subject['hourly_rate']),
+            recent_hours.get(subject['name'], 0),
+            trend.get('recent_4_weeks_hours', 0),
+            trend.get('previous_4_weeks_hours', 0),
+            trend.get('slope_hours_per_week', 0)
+        )]
+
+
+def _interleave(*groups):
+    """
+    各表の行を (順位, 表の優先度) の順に並べる
+
+    どの表も上位の行から先に予算を使うため、1つの表だけが予算を使い切ることはありません。
+    """
+    rows = []
+    for priority, (section, ranked_rows) in enumerate(groups):
+        rows.extend((rank, priority, section, candidates) for rank, candidates in ranked_rows)
+    rows.sort(key=lambda row: row[:2])
+    return rows
+
+
+def build_learning_prompt(data, token_budget=None):
+    """
+    正規化した学習データからトークン数の上限に収まる分析用プロンプトを構築する
+
+    学習目的・集計値・学習パターン・指示文は常に含め、表の行は上限に収まる範囲で
+    価値の高い順に追加します。
+    """
+    if token_budget is None:
+        token_budget = settings.AI_PROMPT_TOKEN_BUDGET
+
+    patterns = data['learning_patterns']
+    purpose = data['study_purpose']
+    max_purpose_tokens = int(token_budget * PURPOSE_BUDGET_RATIO)
+    if estimate_tokens(purpose) > max_purpose_tokens:
+        # 日本語1文字1トークンとして安全側に切り詰める
+        purpose = _truncate(purpose, max_purpose_tokens)
+
+    fixed = '\n\n'.join([
+        PROMPT_HEADER,
+        f"【学習の目的】\n{purpose}",
+        "\n".join([
+            "【学習データ】",
+            f"今月の合計勉強時間: {data['total_month_hours']}時間",
+            f"今週の合計勉強時間: {data['total_week_hours']}時間",
+            f"時間帯別の勉強時間（0〜23時）: {','.join(str(value) for value in patterns['hour_of_day_hours'])}",
+            f"曜日別の勉強時間（月〜日）: {','.join(str(value) for value in patterns['weekday_hours'])}",
+            "セッション長（分）: 平均{mean_minutes} 中央値{median_minutes} 90%点{p90_minutes}".format(
+                **patterns['session_length']
+            ),
+            "連続学習日数: 現在{current_days}日 最長{longest_days}日 過去30日の学習日数{active_days_last_30}日".format(
+                **patterns['streaks']
+            ),
+        ]),
+    ])
+
+    subjects = _Section(
+        '科目（時給・過去30日の時間・直近4週の時間・前の4週の時間・週あたりの傾き）',
+        ['科目', '時給', '30日', '直近4週', '前4週', '傾き']
+    )
+    sessions = _Section('最近の学習セッション', ['日付', '科目', '時間', 'メモ'])
+    goals = _Section('貯金目標', ['目標', '目標額', '現在額', '達成率', '期限', '状態'])
+    sections = [subjects, sessions, goals]
+
+    used = estimate_tokens(fixed) + estimate_tokens(PROMPT_INSTRUCTIONS)
+    used += sum(estimate_tokens(f"【{section.title}】\n{section.header}\n") for section in sections)
+
+    omitted = 0
+    for _, _, section, candidates in _interleave(
+        (subjects, _subject_rows(data)),
+        (sessions, _session_rows(data['recent_sessions'])),
+        (goals, _goal_rows(data['savings_goals'])),
+    ):
+        for candidate in candidates:
+            cost = estimate_tokens(candidate) + 1
+            if used + cost <= token_budget:
+                section.rows.append(candidate)
+                used += cost
+                break
+        else:
+            omitted += 1
+
+    prompt = '\n\n'.join(
+        part for part in [fixed] + [section.render() for section in sections] + [PROMPT_INSTRUCTIONS] if part
+    )
+    logger.info(
+        f"学習分析プロンプト: 推定{estimate_tokens(prompt)}トークン（上限{token_budget}）, "
+        f"{len(prompt)}文字, 省略した行{omitted}件"
+    )
+    return prompt
@@ -0,0 +1,86 @@
+"""
+スライディングウィンドウカウンター方式のレート制限
+
+固定ウィンドウごとのカウンターを cache.add / cache.incr（アトミック操作）で
+更新し、直前のウィンドウのカウントを経過時間で按分して加えることで、
+ウィンドウ境界をまたいだバーストを抑えます。カウンターは Django のキャッシュに
+保存するため、REDIS_URL で共有キャッシュを設定すると複数のワーカー・インスタンス間で
+同じ制限が適用されます（未設定の場合はプロセスごとの LocMemCache）。
+"""
+import math
+import time
+
+from django.core.cache import cache
+
+RATE_LIMIT_KEY = 'rate_limit:{scope}:{ident}:{window}'
+
+
+class RateLimitResult:
+    """レート制限の判定結果"""
+
+    def __init__(self, allowed, limit, remaining, reset_after):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        # 現在のウィンドウが終わるまでの秒数
+        self.reset_after = reset_after
+
+    @property
+    def headers(self):
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(self.reset_after),
+        }
+
+
+class SlidingWindowRateLimiter:
+    """
+    window 秒あたり max_requests 回までのリクエストを許可する
+
+    拒否したリクエストはカウントから取り消すため、制限中に再試行を続けても
+    制限が延長されることはありません。
+    """
+
+    def __init__(self, scope, max_requests, window, cache_backend=None):
+        self.scope = scope
+        self.max_requests = max_requests
+        self.window = window
+        self.cache = cache_backend or cache
+
+    def _key(self, ident, window_index):
+        return RATE_LIMIT_KEY.format(scope=self.scope, ident=ident, window=window_index)
+
+    def _increment(self, key):
+        # add はキーが存在しない場合のみ作成する。直前のウィンドウを参照するため TTL は2ウィンドウ分
+        self.cache.add(key, 0, self.window * 2)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # add と incr の間にエントリが削除された場合
+            self.cache.set(key, 1, self.window * 2)
+            return 1
+
+    def hit(self, ident, now=None):
+        """ident のリクエストを1回記録し、許可するかどうかを返す"""
+        now = time.time() if now is None else now
+        window_index = int(now // self.window)
+        elapsed_ratio = (now % self.window) / self.window
+
+        current_key = self._key(ident, window_index)
+        current = self._increment(current_key)
+        previous = self.cache.get(self._key(ident, window_index - 1), 0)
+
+        # 直前のウィンドウのうち、スライディングウィンドウに含まれる割合だけを数える
+        estimated = previous * (1 - elapsed_ratio) + current
+        reset_after = max(1, math.ceil((window_index + 1) * self.window - now))
+
+        if estimated > self.max_requests:
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            return RateLimitResult(False, self.max_requests, 0, reset_after)
+
+        remaining = max(0, int(self.max_requests - estimated))
+        return RateLimitResult(True, self.max_requests, remaining, reset_after)
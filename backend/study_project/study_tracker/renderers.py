@@ -0,0 +1,56 @@
+"""
+JSON 以外のレスポンス形式用のレンダラー
+"""
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+def format_sse_event(event, data):
+    """Server-Sent Events の1イベント分の文字列を作る（data は JSON で送る）"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    text/event-stream 用のレンダラー
+
+    ストリーミング本体は StreamingHttpResponse で直接返すため、このレンダラーは
+    コンテンツネゴシエーションと、認証エラーなど通常のレスポンスを
+    'error' イベントとして返す場合にのみ使われます。
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return format_sse_event('error', data).encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    text/csv 用のレンダラー
+
+    エクスポート本体は StreamingHttpResponse で直接返すため、このレンダラーは
+    ?format=csv のコンテンツネゴシエーションと、エラーレスポンスにのみ使われます。
+    エラーレスポンスは Content-Type を application/json に切り替えて JSON で返します。
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = f"{JSONRenderer.media_type}; charset={self.charset}"
+        return JSONRenderer().render(data, renderer_context=renderer_context)
+
+
+class NDJSONRenderer(CSVRenderer):
+    """application/x-ndjson（1行1 JSON）用のレンダラー（用途は CSVRenderer と同じ）"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
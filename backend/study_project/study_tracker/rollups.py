@@ -0,0 +1,154 @@
+"""
+日別勉強集計（DailyStudyRollup）の更新・再構築処理
+
+セッションの終了・更新・削除時に、影響を受ける (ユーザー, 科目, 日付) の
+集計行だけを再計算します。統計系のビューはセッション履歴全体ではなく
+この集計行を読み込みます。
+"""
+import operator
+from datetime import datetime, time, timedelta
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .caching import bump_data_version
+from .models import StudySession, DailyStudyRollup
+from .stats import aggregate_sessions, seconds_from_duration
+
+
+def rollup_key(session):
+    """セッションが属する集計行のキー (user_id, subject_id, date) を返す。未終了なら None"""
+    if session is None or session.end_time is None:
+        return None
+    return (session.user_id, session.subject_id, timezone.localdate(session.start_time))
+
+
+def _day_range(date):
+    """ローカル日付の開始・終了日時を返す"""
+    start = timezone.make_aware(datetime.combine(date, time.min))
+    return start, start + timedelta(days=1)
+
+
+def refresh_rollup(user_id, subject_id, date):
+    """1つの集計行をその日のセッションから再計算する"""
+    day_start, day_end = _day_range(date)
+    totals = aggregate_sessions(StudySession.objects.filter(
+        user_id=user_id,
+        subject_id=subject_id,
+        end_time__isnull=False,
+        start_time__gte=day_start,
+        start_time__lt=day_end
+    ))
+
+    if totals['session_count'] == 0:
+        DailyStudyRollup.objects.filter(user_id=user_id, subject_id=subject_id, date=date).delete()
+        return None
+
+    rollup, _ = DailyStudyRollup.objects.update_or_create(
+        user_id=user_id,
+        subject_id=subject_id,
+        date=date,
+        defaults=totals
+    )
+    return rollup
+
+
+def refresh_rollups(keys):
+    """
+    複数の集計キーを重複なく再計算する（None は無視）
+
+    キーが含まれる日付の範囲のセッションを (ユーザー, 科目, ローカル日付) でグループ化した
+    1つの集計クエリで再計算し、集計行はまとめて作成・更新します。
+    """
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return
+
+    range_start = _day_range(min(key[2] for key in keys))[0]
+    range_end = _day_range(max(key[2] for key in keys))[1]
+    grouped = StudySession.objects.filter(
+        user_id__in={key[0] for key in keys},
+        subject_id__in={key[1] for key in keys},
+        end_time__isnull=False,
+        start_time__gte=range_start,
+        start_time__lt=range_end
+    ).annotate(
+        date=TruncDate('start_time', tzinfo=timezone.get_current_timezone())
+    ).values('user_id', 'subject_id', 'date').annotate(
+        duration_sum=Sum('duration'),
+        earned_sum=Sum('earned_amount'),
+        session_count=Count('id')
+    ).order_by()
+
+    rollups = [
+        DailyStudyRollup(
+            user_id=row['user_id'],
+            subject_id=row['subject_id'],
+            date=row['date'],
+            total_seconds=seconds_from_duration(row['duration_sum']),
+            earned_amount=row['earned_sum'],
+            session_count=row['session_count']
+        )
+        for row in grouped
+        if (row['user_id'], row['subject_id'], row['date']) in keys
+    ]
+    # セッションがなくなったキーの集計行は削除する
+    empty_keys = keys - {(rollup.user_id, rollup.subject_id, rollup.date) for rollup in rollups}
+
+    with transaction.atomic():
+        if empty_keys:
+            DailyStudyRollup.objects.filter(reduce(operator.or_, (
+                Q(user_id=user_id, subject_id=subject_id, date=date) for user_id, subject_id, date in empty_keys
+            ))).delete()
+        DailyStudyRollup.objects.bulk_create(
+            rollups,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['user', 'subject', 'date'],
+            update_fields=['total_seconds', 'earned_amount', 'session_count', 'updated_at']
+        )
+
+
+@transaction.atomic
+def rebuild_rollups(user_ids=None):
+    """
+    セッション履歴から集計テーブルを再構築する
+
+    (ユーザー, 科目, ローカル日付) でグループ化した1つの集計クエリから作成します。
+    user_ids を指定した場合は該当ユーザーのみ再構築します。
+    作成した集計行の数を返します。
+    """
+    rollups = DailyStudyRollup.objects.all()
+    sessions = StudySession.objects.filter(end_time__isnull=False)
+    if user_ids is not None:
+        rollups = rollups.filter(user_id__in=user_ids)
+        sessions = sessions.filter(user_id__in=user_ids)
+    rollups.delete()
+
+    grouped = sessions.annotate(
+        date=TruncDate('start_time', tzinfo=timezone.get_current_timezone())
+    ).values('user_id', 'subject_id', 'date').annotate(
+        duration_sum=Sum('duration'),
+        earned_sum=Sum('earned_amount'),
+        session_count=Count('id')
+    ).order_by()
+
+    created = DailyStudyRollup.objects.bulk_create([
+        DailyStudyRollup(
+            user_id=row['user_id'],
+            subject_id=row['subject_id'],
+            date=row['date'],
+            total_seconds=seconds_from_duration(row['duration_sum']),
+            earned_amount=row['earned_sum'],
+            session_count=row['session_count']
+        )
+        for row in grouped.iterator(chunk_size=2000)
+    ], batch_size=1000)
+
+    # 統計キャッシュと ETag を無効化
+    for user_id in {rollup.user_id for rollup in created}:
+        bump_data_version(user_id)
+    return len(created)
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.models import User
 from .models import Subject, StudySession, SavingsGoal
@@ -28,8 +29,8 @@ class StudySessionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = StudySession
-        fields = ['id', 'subject', 'subject_name', 'start_time', 'end_time', 'duration', 'notes', 'earned_amount', 'is_active', 'created_at']
-        read_only_fields = ['id', 'duration', 'earned_amount', 'is_active', 'created_at']
+        fields = ['id', 'client_id', 'subject', 'subject_name', 'start_time', 'end_time', 'duration', 'notes', 'earned_amount', 'is_active', 'created_at']
+        read_only_fields = ['id', 'client_id', 'duration', 'earned_amount', 'is_active', 'created_at']
     
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
@@ -41,21 +42,117 @@ class StudySessionSerializer(serializers.ModelSerializer):
             start = instance.start_time
             end = validated_data['end_time']
             validated_data['duration'] = end - start
+        
+        # 科目が変わった場合は新しい科目の時給を適用し直す
+        if 'subject' in validated_data and validated_data['subject'].pk != instance.subject_id:
+            instance.hourly_rate = None
             
-        return super().update(instance, validated_data)
+        instance = super().update(instance, validated_data)
+        
+        # 終了済みのセッションは獲得金額を保存
+        if instance.end_time:
+            instance.apply_earnings()
+            instance.save(update_fields=['hourly_rate', 'earned_amount'])
+        return instance
         
     def partial_update(self, instance, validated_data):
         # 部分更新の場合、subjectフィールドが必須でないようにする
         return self.update(instance, validated_data)
 
 
+class StudySessionListRepresentation:
+    """
+    勉強セッション一覧用の軽量な読み取り専用表現
+    
+    .values() の辞書から StudySessionSerializer と同じ形式の辞書を直接組み立て、
+    一覧取得時のフィールドごとのシリアライザー処理を省きます。
+    """
+    values_fields = (
+        'id', 'client_id', 'subject', 'subject__name', 'start_time', 'end_time',
+        'duration', 'notes', 'earned_amount', 'created_at'
+    )
+    duration_field = serializers.DurationField()
+    
+    @staticmethod
+    def format_datetime(value, tz):
+        """DateTimeField と同じ ISO 8601 形式（UTC は 'Z'）に変換する"""
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    
+    @classmethod
+    def to_representation(cls, row, tz=None):
+        # タイムゾーンの取得はコストがかかるため、複数行では呼び出し側で1回だけ取得して渡す
+        tz = tz or timezone.get_current_timezone()
+        return {
+            'id': row['id'],
+            'client_id': str(row['client_id']) if row['client_id'] else None,
+            'subject': row['subject'],
+            'subject_name': row['subject__name'],
+            'start_time': cls.format_datetime(row['start_time'], tz),
+            'end_time': cls.format_datetime(row['end_time'], tz) if row['end_time'] else None,
+            'duration': cls.duration_field.to_representation(row['duration']) if row['duration'] is not None else None,
+            'notes': row['notes'],
+            'earned_amount': float(row['earned_amount']),
+            'is_active': row['end_time'] is None,
+            'created_at': cls.format_datetime(row['created_at'], tz),
+        }
+    
+    @classmethod
+    def many(cls, rows):
+        tz = timezone.get_current_timezone()
+        return [cls.to_representation(row, tz) for row in rows]
+
+
+class StudySessionBatchItemSerializer(serializers.Serializer):
+    """一括登録する終了済みセッション1件分"""
+    client_id = serializers.UUIDField()
+    # 科目の存在・所有者の確認は StudySessionBatchSerializer でまとめて行う
+    subject = serializers.IntegerField()
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        if attrs['end_time'] <= attrs['start_time']:
+            raise serializers.ValidationError({"end_time": "終了時刻は開始時刻より後にしてください。"})
+        return attrs
+
+
+class StudySessionBatchSerializer(serializers.Serializer):
+    """
+    オフラインで記録した終了済みセッションの一括登録
+
+    科目はリクエスト内の全件分を1つのクエリで取得して確認し、
+    validated_data['sessions'] の各要素の subject を Subject インスタンスに置き換えます。
+    """
+    sessions = StudySessionBatchItemSerializer(many=True, allow_empty=False, max_length=settings.SESSION_BATCH_MAX_SIZE)
+
+    def validate_sessions(self, sessions):
+        subject_ids = {item['subject'] for item in sessions}
+        subjects = Subject.objects.filter(user=self.context['request'].user, id__in=subject_ids).in_bulk()
+
+        errors = [
+            {} if item['subject'] in subjects else {"subject": ["科目が見つかりません。"]}
+            for item in sessions
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        for item in sessions:
+            item['subject'] = subjects[item['subject']]
+        return sessions
+
+
 class SavingsGoalSerializer(serializers.ModelSerializer):
     progress_percentage = serializers.FloatField(read_only=True)
     
     class Meta:
         model = SavingsGoal
         fields = ['id', 'title', 'target_amount', 'current_amount', 'deadline', 'is_achieved', 'progress_percentage', 'created_at']
-        read_only_fields = ['id', 'progress_percentage', 'created_at']
+        # 金額と達成状態は勉強記録からの加算で決まる（reconcile_goals で再計算される）ため変更不可
+        read_only_fields = ['id', 'current_amount', 'is_achieved', 'progress_percentage', 'created_at']
     
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
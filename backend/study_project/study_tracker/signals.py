@@ -0,0 +1,38 @@
+from allauth.socialaccount.models import SocialAccount
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import invalidate_cached_user, invalidate_social_accounts
+from .tokens import remember_blacklisted
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """
+    ユーザーの更新（プロフィール・パスワード変更・無効化）と削除時に認証キャッシュを削除する
+
+    コミット前に他のリクエストが古い行をキャッシュし直す場合に備え、コミット後にも削除します。
+    """
+    invalidate_cached_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_cached_user(instance.pk))
+
+
+@receiver(post_save, sender=SocialAccount)
+@receiver(post_delete, sender=SocialAccount)
+def invalidate_social_accounts_cache(sender, instance, **kwargs):
+    """ソーシャルアカウントの連携・解除時に認証状態用のキャッシュを削除する"""
+    invalidate_social_accounts(instance.user_id)
+    transaction.on_commit(lambda: invalidate_social_accounts(instance.user_id))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def remember_blacklisted_token(sender, instance, created, **kwargs):
+    """ブラックリストへの追加（管理画面・他のプロセスを含む）をコミット後に共有キャッシュへ反映する"""
+    if created:
+        jti = instance.token.jti
+        exp = instance.token.expires_at.timestamp()
+        transaction.on_commit(lambda: remember_blacklisted(jti, exp))
@@ -0,0 +1,211 @@
+"""
+統計情報の集計クエリ
+
+StatsView と AI 学習分析で共通して使う集計処理です。Python 側でセッションを
+ループせず、グループ化した集計クエリ（ユーザーあたり定数回）で結果を得ます。
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DateField, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import Subject, DailyStudyRollup, StudySession
+
+ZERO_AMOUNT = Value(Decimal('0'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def seconds_from_duration(value):
+    """Sum('duration') の集計結果を秒数（int）に変換する"""
+    return int(value.total_seconds()) if value else 0
+
+
+def aggregate_sessions(queryset):
+    """セッションのクエリセットを1クエリで集計し、秒数・獲得金額・件数を返す"""
+    totals = queryset.aggregate(
+        duration_sum=Sum('duration'),
+        earned_sum=Coalesce(Sum('earned_amount'), ZERO_AMOUNT),
+        session_count=Count('id')
+    )
+    return {
+        'total_seconds': seconds_from_duration(totals['duration_sum']),
+        'earned_amount': totals['earned_sum'],
+        'session_count': totals['session_count'],
+    }
+
+
+def get_period_totals(user, periods):
+    """
+    期間ごとの勉強秒数と獲得金額を1クエリで集計する
+
+    periods は {名前: 開始日 or None} の辞書で、None は全期間を表します。
+    戻り値は {名前: {'total_seconds': int, 'earned_amount': Decimal}} です。
+    """
+    aggregates = {}
+    for name, start_date in periods.items():
+        condition = Q(date__gte=start_date) if start_date else Q()
+        aggregates[f'{name}_seconds'] = Coalesce(Sum('total_seconds', filter=condition), 0)
+        aggregates[f'{name}_earned'] = Coalesce(Sum('earned_amount', filter=condition), ZERO_AMOUNT)
+
+    totals = DailyStudyRollup.objects.filter(user=user).aggregate(**aggregates)
+    return {
+        name: {
+            'total_seconds': totals[f'{name}_seconds'],
+            'earned_amount': totals[f'{name}_earned'],
+        }
+        for name in periods
+    }
+
+
+def get_subject_totals(user, since=None):
+    """科目ごとの勉強秒数と獲得金額を1クエリで集計する（since 以降の日付のみ）"""
+    condition = Q(daily_rollups__date__gte=since) if since else Q()
+    return list(
+        Subject.objects.filter(user=user).annotate(
+            total_seconds=Coalesce(Sum('daily_rollups__total_seconds', filter=condition), 0),
+            total_earnings=Coalesce(Sum('daily_rollups__earned_amount', filter=condition), ZERO_AMOUNT)
+        ).values('id', 'name', 'total_seconds', 'total_earnings').order_by('id')
+    )
+
+
+def get_user_stats(user):
+    """StatsView のレスポンス（今週・今月・総額・科目別）を2クエリで組み立てる"""
+    today = timezone.localdate()
+    totals = get_period_totals(user, {
+        'week': today - timedelta(days=today.weekday()),
+        'month': today.replace(day=1),
+        'all': None,
+    })
+
+    return {
+        'total_hours_week': round(totals['week']['total_seconds'] / 3600, 2),
+        'total_hours_month': round(totals['month']['total_seconds'] / 3600, 2),
+        'total_savings': totals['all']['earned_amount'],
+        'subject_stats': [
+            {
+                'id': subject['id'],
+                'name': subject['name'],
+                'total_hours': round(subject['total_seconds'] / 3600, 2),
+                'total_earnings': subject['total_earnings']
+            }
+            for subject in get_subject_totals(user)
+        ]
+    }
+
+
+SERIES_BUCKETS = ('day', 'week', 'month')
+
+
+def bucket_start(date, bucket):
+    """日付が属するバケットの開始日（週は月曜日、月は1日）を返す"""
+    if bucket == 'week':
+        return date - timedelta(days=date.weekday())
+    if bucket == 'month':
+        return date.replace(day=1)
+    return date
+
+
+def next_bucket_start(date, bucket):
+    if bucket == 'week':
+        return date + timedelta(days=7)
+    if bucket == 'month':
+        return (date.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return date + timedelta(days=1)
+
+
+def previous_bucket_start(date, bucket):
+    return bucket_start(bucket_start(date, bucket) - timedelta(days=1), bucket)
+
+
+def bucket_count(start, end, bucket):
+    """start から end（その日を含む）までのバケット数"""
+    start, end = bucket_start(start, bucket), bucket_start(end, bucket)
+    if bucket == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days // (7 if bucket == 'week' else 1) + 1
+
+
+def bucket_starts(start, end, bucket):
+    """start から end（その日を含む）までのバケットの開始日を順に返す"""
+    date = bucket_start(start, bucket)
+    while date <= end:
+        yield date
+        date = next_bucket_start(date, bucket)
+
+
+def _series_rows(user, bucket, start, end, tz, subject_id):
+    """
+    バケットごとの (開始日, 秒数, 獲得金額, 件数) を1つのグループ化クエリで取得する
+
+    日別集計はサーバーのタイムゾーンの日付で保存しているため、同じタイムゾーンなら
+    日別集計を、それ以外はセッションを指定タイムゾーンで日付に変換して集計します。
+    """
+    if getattr(tz, 'key', None) == timezone.get_default_timezone_name():
+        queryset = DailyStudyRollup.objects.filter(user=user, date__gte=start, date__lte=end)
+        if bucket == 'day':
+            trunc = F('date')
+        else:
+            trunc = {'week': TruncWeek, 'month': TruncMonth}[bucket]('date')
+        seconds_field, count = 'total_seconds', Sum('session_count')
+    else:
+        queryset = StudySession.objects.filter(
+            user=user,
+            end_time__isnull=False,
+            start_time__gte=timezone.make_aware(datetime.combine(start, time.min), tz),
+            start_time__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+        )
+        if bucket == 'day':
+            trunc = TruncDate('start_time', tzinfo=tz)
+        else:
+            trunc = {'week': TruncWeek, 'month': TruncMonth}[bucket]('start_time', tzinfo=tz, output_field=DateField())
+        seconds_field, count = 'duration', Count('id')
+
+    queryset = queryset.annotate(bucket=trunc)
+    if subject_id is not None:
+        queryset = queryset.filter(subject_id=subject_id)
+
+    rows = queryset.values('bucket').annotate(
+        seconds=Sum(seconds_field),
+        earned=Coalesce(Sum('earned_amount'), ZERO_AMOUNT),
+        count=count
+    ).order_by('bucket')
+    for row in rows:
+        seconds = row['seconds']
+        if isinstance(seconds, timedelta):
+            seconds = seconds_from_duration(seconds)
+        yield row['bucket'], seconds or 0, row['earned'], row['count']
+
+
+def get_study_series(user, bucket, start, end, tz, subject_id=None):
+    """
+    日・週・月ごとの勉強時間と獲得金額を、0 で埋めた並列配列で返す
+
+    labels[i] はバケットの開始日で、hours / earnings / sessions の i 番目がその値です。
+    start はバケットの開始日に切り下げます。
+    """
+    start = bucket_start(start, bucket)
+    labels = list(bucket_starts(start, end, bucket))
+    index = {date: i for i, date in enumerate(labels)}
+    hours = [0.0] * len(labels)
+    earnings = [0.0] * len(labels)
+    sessions = [0] * len(labels)
+
+    for date, seconds, earned, count in _series_rows(user, bucket, start, end, tz, subject_id):
+        i = index.get(date)
+        if i is None:
+            continue
+        hours[i] = round(seconds / 3600, 2)
+        earnings[i] = round(float(earned), 2)
+        sessions[i] = count
+
+    return {
+        'bucket': bucket,
+        'timezone': str(tz),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'labels': [date.isoformat() for date in labels],
+        'hours': hours,
+        'earnings': earnings,
+        'sessions': sessions,
+    }
@@ -0,0 +1,1443 @@
+import io
+import json
+import sys
+import threading
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature, tag
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import ai_services
+from .ai_services import collect_learning_data, generate_content, run_learning_analysis, store_analysis
+from .analysis_jobs import claim_jobs, enqueue_analysis_job
+from .authentication import AUTH_USER_KEY, get_cached_user
+from .caching import bump_data_version, get_data_version
+from .features import get_learning_features
+from .goals import credit_active_goal, reconcile_goals
+from .leaderboards import current_period_start, rebuild_leaderboards
+from .llm_backends import LLMBackend, StubBackend, VertexAIBackend, get_backend
+from .models import (
+    DailyStudyRollup, LeaderboardEntry, LearningAnalysis, LearningAnalysisJob, SavingsGoal, Subject, StudySession
+)
+from .prompts import NOTE_MAX_CHARS, build_learning_prompt, estimate_tokens
+from .ratelimit import SlidingWindowRateLimiter
+from .rollups import rebuild_rollups
+from .serializers import StudySessionListRepresentation, StudySessionSerializer
+from .stats import get_user_stats
+from .tokens import blacklist_cache
+
+
+def create_finished_sessions(user, subjects, count, minutes=90, now=None):
+    """科目を順に使い、1日1件ずつ過去に遡って終了済みのセッションを作成する"""
+    now = now or timezone.now()
+    sessions = []
+    for i in range(count):
+        subject = subjects[i % len(subjects)]
+        start_time = now - timedelta(days=i, hours=2)
+        session = StudySession(
+            user=user,
+            subject=subject,
+            start_time=start_time,
+            end_time=start_time + timedelta(minutes=minutes),
+            duration=timedelta(minutes=minutes)
+        )
+        session.apply_earnings()
+        sessions.append(session)
+    return StudySession.objects.bulk_create(sessions)
+
+
+class StatsQueryCountTests(TestCase):
+    """統計の集計クエリ数がセッション数・科目数によらず一定であることの確認"""
+
+    def setUp(self):
+        cache.clear()
+
+    def create_user_with_history(self, username, subject_count, session_count):
+        user = User.objects.create_user(username)
+        subjects = [
+            Subject.objects.create(user=user, name=f"科目{i}", hourly_rate=1000 * (i + 1))
+            for i in range(subject_count)
+        ]
+        create_finished_sessions(user, subjects, session_count)
+        rebuild_rollups([user.id])
+        return user
+
+    def test_user_stats_runs_two_queries(self):
+        small = self.create_user_with_history('small', 1, 3)
+        large = self.create_user_with_history('large', 10, 400)
+
+        for user in (small, large):
+            with self.assertNumQueries(2):
+                stats = get_user_stats(user)
+            self.assertEqual(len(stats['subject_stats']), user.subjects.count())
+
+        stats = get_user_stats(small)
+        self.assertEqual(stats['total_savings'], Decimal('4500.00'))
+
+    def test_learning_data_query_count_does_not_grow(self):
+        small = self.create_user_with_history('small', 1, 3)
+        large = self.create_user_with_history('large', 10, 400)
+
+        query_counts = []
+        for user in (small, large):
+            with CaptureQueriesContext(connection) as queries:
+                collect_learning_data(user, "資格試験")
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+@override_settings(AI_BACKEND='stub', AI_STUB_LATENCY_MS=0)
+class LearningAnalysisCacheTests(TestCase):
+    """学習分析キャッシュの確認"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.subject = Subject.objects.create(user=self.user, name="英語")
+        create_finished_sessions(self.user, [self.subject], 5)
+
+    def test_cache_hit_skips_session_history_scan(self):
+        with mock.patch.object(ai_services, 'load_session_columns', wraps=ai_services.load_session_columns) as load:
+            first = run_learning_analysis(self.user, "資格試験")
+            second = run_learning_analysis(self.user, " 資格試験 ")
+            self.assertEqual(load.call_count, 1)
+
+            # 学習データが更新されると集計し直す
+            bump_data_version(self.user.id)
+            third = run_learning_analysis(self.user, "資格試験")
+            self.assertEqual(load.call_count, 2)
+
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['analysis'], first['analysis'])
+        self.assertFalse(third['cached'])
+
+    def test_store_analysis_survives_concurrent_insert(self):
+        LearningAnalysis.objects.create(user=self.user, input_hash='a' * 64, model_name='m', result="古い結果")
+
+        # 同じキーの行を別の処理が先に保存した場合の IntegrityError を模擬する
+        with mock.patch.object(LearningAnalysis.objects, 'update_or_create', side_effect=IntegrityError):
+            store_analysis(self.user, 'a' * 64, 'm', "新しい結果")
+
+        row = LearningAnalysis.objects.get(user=self.user, input_hash='a' * 64)
+        self.assertEqual(row.result, "新しい結果")
+
+
+@override_settings(AI_BACKEND='vertex', AI_STUB_LATENCY_MS=0)
+class AnalysisWorkerTests(TransactionTestCase):
+    """非同期分析ジョブの登録からワーカーによる実行までの確認"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.subject = Subject.objects.create(user=self.user, name="英語")
+        create_finished_sessions(self.user, [self.subject], 5)
+
+    def run_worker(self):
+        call_command('run_analysis_worker', '--once', '--stub', '--poll-interval', '0', stdout=io.StringIO())
+
+    def test_worker_runs_enqueued_job_with_stub_backend(self):
+        job = enqueue_analysis_job(self.user, "資格試験")
+        self.assertEqual(enqueue_analysis_job(self.user, " 資格試験").id, job.id)
+
+        self.run_worker()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, LearningAnalysisJob.STATUS_SUCCEEDED)
+        self.assertTrue(job.result.startswith('[stub:'))
+        self.assertIsNotNone(job.finished_at)
+
+        # --stub はワーカー内だけで使われ、設定は書き換えない
+        self.assertEqual(settings.AI_BACKEND, 'vertex')
+
+    def test_failed_generation_marks_job_failed(self):
+        job = enqueue_analysis_job(self.user, "資格試験")
+
+        with mock.patch.object(StubBackend, 'generate', side_effect=RuntimeError("quota")):
+            self.run_worker()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, LearningAnalysisJob.STATUS_FAILED)
+        self.assertFalse(LearningAnalysis.objects.exists())
+
+    def test_concurrent_claims_do_not_overlap(self):
+        jobs = [
+            LearningAnalysisJob.objects.create(user=self.user, study_purpose=f"目的{i}")
+            for i in range(4)
+        ]
+        other_claims = []
+        real_now = timezone.now
+
+        def now_with_concurrent_claim():
+            # 候補の読み込み後、最初の取得 UPDATE の直前に別のワーカーが2件取得する
+            if not other_claims:
+                other_claims.append(None)
+                other_claims.extend(claim_jobs(2))
+            return real_now()
+
+        with mock.patch('study_tracker.analysis_jobs.timezone.now', side_effect=now_with_concurrent_claim):
+            claimed = claim_jobs(len(jobs))
+
+        other_claims = other_claims[1:]
+        self.assertEqual(len(other_claims), 2)
+        self.assertFalse(set(claimed) & set(other_claims))
+        self.assertCountEqual(claimed + other_claims, [job.id for job in jobs])
+        self.assertEqual(
+            LearningAnalysisJob.objects.filter(status=LearningAnalysisJob.STATUS_RUNNING).count(),
+            len(jobs)
+        )
+
+
+class BackfillSessionEarningsTests(TestCase):
+    """獲得金額のバックフィル後に日別集計にも金額が反映されることの確認"""
+
+    def test_backfill_rebuilds_rollups(self):
+        user = User.objects.create_user('alice')
+        subject = Subject.objects.create(user=user, name="英語", hourly_rate=1000)
+        create_finished_sessions(user, [subject], 4)
+        # 獲得金額が保存される前の状態（金額なしの日別集計）を再現する
+        StudySession.objects.update(hourly_rate=None, earned_amount=0)
+        rebuild_rollups()
+        self.assertEqual(get_user_stats(user)['total_savings'], Decimal('0'))
+
+        call_command('backfill_session_earnings', stdout=io.StringIO())
+
+        self.assertEqual(get_user_stats(user)['total_savings'], Decimal('6000.00'))
+
+
+class ActiveSessionConstraintTests(TestCase):
+    """進行中セッションの一意制約とインデックスの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        self.subject = Subject.objects.create(user=self.user, name="英語", hourly_rate=1000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_second_active_session_returns_400(self):
+        self.assertEqual(self.client.post('/api/sessions/start/', {'subject': self.subject.id}).status_code, 200)
+
+        response = self.client.post('/api/sessions/', {
+            'subject': self.subject.id,
+            'start_time': timezone.now().isoformat()
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': '既に進行中の勉強セッションがあります。'})
+        self.assertEqual(StudySession.objects.filter(end_time__isnull=True).count(), 1)
+
+    def test_reopen_finished_session_while_active_returns_400(self):
+        finished = create_finished_sessions(self.user, [self.subject], 1)[0]
+        self.client.post('/api/sessions/start/', {'subject': self.subject.id})
+
+        response = self.client.patch(f'/api/sessions/{finished.id}/', {'end_time': None}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        finished.refresh_from_db()
+        self.assertIsNotNone(finished.end_time)
+
+    def assertIndexSearch(self, queryset):
+        """実行計画がテーブル全体の走査ではなくインデックスの検索になっていることを確認する"""
+        if connection.vendor == 'postgresql':
+            # 少量のテストデータでは順次走査が選ばれるため、インデックスが使えるかを確認する
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan)
+        else:
+            plan = queryset.explain()
+            self.assertIn('SEARCH', plan)
+            self.assertNotRegex(plan, r'SCAN \w+$')
+
+    def test_hot_queries_use_indexes(self):
+        other = User.objects.create_user('bob')
+        other_subject = Subject.objects.create(user=other, name="数学")
+        create_finished_sessions(self.user, [self.subject], 200)
+        create_finished_sessions(other, [other_subject], 200)
+        SavingsGoal.objects.bulk_create([
+            SavingsGoal(user=user, title=f"目標{i}", target_amount=1000, is_achieved=i % 4 != 0)
+            for user in (self.user, other)
+            for i in range(100)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        self.assertIndexSearch(StudySession.objects.filter(user=self.user, end_time__isnull=True))
+        self.assertIndexSearch(StudySession.objects.filter(
+            user=self.user, end_time__isnull=False, start_time__gte=timezone.now() - timedelta(days=30)
+        ))
+        self.assertIndexSearch(SavingsGoal.objects.filter(user=self.user, is_achieved=False))
+
+
+class ListPaginationAndFilterTests(TestCase):
+    """一覧のキーセットページネーションと絞り込みの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        self.subject = Subject.objects.create(user=self.user, name="英語", hourly_rate=1000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_sessions_keyset_pages_cover_ties_without_gaps(self):
+        # 開始日時が同じセッションを含め、(start_time, id) の順で重複・欠落なくたどれる
+        now = timezone.now()
+        create_finished_sessions(self.user, [self.subject], 5, now=now)
+        create_finished_sessions(self.user, [self.subject], 5, now=now)
+        expected = list(StudySession.objects.order_by('-start_time', '-id').values_list('id', flat=True))
+
+        ids = []
+        url = '/api/sessions/?page_size=3'
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(row['id'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(ids, expected)
+
+        # previous で1つ前のページに戻れる
+        first = self.client.get('/api/sessions/?page_size=3').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_unpaginated_list_is_an_array(self):
+        create_finished_sessions(self.user, [self.subject], 3)
+        self.assertEqual(len(self.client.get('/api/sessions/').json()), 3)
+
+    def test_invalid_calendar_date_returns_400(self):
+        for query in ('from=2024-02-30', 'to=2024-13-01', 'from=2024-02-30T10:00:00'):
+            self.assertEqual(self.client.get(f'/api/sessions/?{query}').status_code, 400, query)
+
+    def test_subject_and_goal_filters(self):
+        Subject.objects.create(user=self.user, name="数学")
+        SavingsGoal.objects.create(user=self.user, title="達成", target_amount=100, is_achieved=True)
+        SavingsGoal.objects.create(user=self.user, title="未達成", target_amount=100)
+
+        subjects = self.client.get('/api/subjects/?name=数').json()
+        self.assertEqual([subject['name'] for subject in subjects], ["数学"])
+        goals = self.client.get('/api/goals/?status=active&page_size=10').json()
+        self.assertEqual([goal['title'] for goal in goals['results']], ["未達成"])
+        self.assertEqual(self.client.get('/api/goals/?status=unknown').status_code, 400)
+
+
+@tag('benchmark')
+class SessionListBenchmarkTests(TestCase):
+    """勉強セッション一覧の読み取り経路のベンチマーク（10,000件）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice')
+        subjects = [Subject.objects.create(user=cls.user, name=f"科目{i}") for i in range(5)]
+        create_finished_sessions(cls.user, subjects, 10000)
+
+    def test_lean_representation_matches_serializer(self):
+        # 軽量表現はモデルインスタンスを作らず、values() の1クエリだけで組み立てる
+        with self.assertNumQueries(1):
+            rows = list(StudySession.objects.filter(user=self.user).values(*StudySessionListRepresentation.values_fields))
+            lean = StudySessionListRepresentation.many(rows)
+
+        with self.assertNumQueries(1):
+            sessions = StudySession.objects.filter(user=self.user).select_related('subject')
+            serialized = StudySessionSerializer(sessions, many=True).data
+
+        self.assertEqual(len(lean), 10000)
+        self.assertEqual(lean, [dict(row) for row in serialized])
+
+    def test_list_endpoint_query_count_is_constant(self):
+        cache.clear()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        # ETag の計算に使うデータバージョンの取得と、一覧の取得の2クエリ（件数によらない）
+        with self.assertNumQueries(2):
+            response = client.get('/api/sessions/?page_size=500')
+        self.assertEqual(len(response.json()['results']), 500)
+
+
+class ConditionalGetTests(TestCase):
+    """If-None-Match による条件付き GET の確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        self.subject = Subject.objects.create(user=self.user, name="英語")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_wildcard_matches_only_existing_objects(self):
+        self.assertEqual(self.client.get(f'/api/subjects/{self.subject.id}/', HTTP_IF_NONE_MATCH='*').status_code, 304)
+        self.assertEqual(self.client.get('/api/subjects/99999/', HTTP_IF_NONE_MATCH='*').status_code, 404)
+        self.assertEqual(self.client.get('/api/subjects/', HTTP_IF_NONE_MATCH='*').status_code, 304)
+
+    def test_matching_etag_returns_304(self):
+        etag = self.client.get(f'/api/subjects/{self.subject.id}/')['ETag']
+        self.assertEqual(self.client.get(f'/api/subjects/{self.subject.id}/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_background_writes_invalidate_stats_cache_and_etag(self):
+        first = self.client.get('/api/stats/')
+        self.assertEqual(first.status_code, 200)
+
+        # 304 と キャッシュヒットはデータバージョンの取得1回だけで応答する
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/stats/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/stats/').json(), first.json())
+
+        # 別プロセスのコマンド（ビューを経由しない書き込み）でもこのプロセスのキャッシュは使われなくなる
+        create_finished_sessions(self.user, [self.subject], 2, minutes=60)
+        call_command('rebuild_study_rollups', stdout=io.StringIO())
+
+        response = self.client.get('/api/stats/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertNotEqual(response.json(), first.json())
+
+
+@tag('benchmark')
+def create_feature_sessions(user, subjects, count):
+    """時間帯・曜日・セッション長がばらつく終了済みのセッションを count 件作成する"""
+    now = timezone.now()
+    sessions = []
+    for i in range(count):
+        start_time = now - timedelta(days=i % 700, hours=(i * 7) % 24, minutes=i % 60)
+        duration = timedelta(minutes=15 + (i * 13) % 180)
+        sessions.append(StudySession(
+            user=user,
+            subject=subjects[i % len(subjects)],
+            start_time=start_time,
+            end_time=start_time + duration,
+            duration=duration
+        ))
+    StudySession.objects.bulk_create(sessions, batch_size=5000)
+
+
+class LearningFeaturesTests(TestCase):
+    """学習特徴量が Python のループで求めた値と一致することの確認"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        subjects = [Subject.objects.create(user=self.user, name=f"科目{i}") for i in range(8)]
+        create_feature_sessions(self.user, subjects, 2000)
+
+    def test_features_match_python_loop(self):
+        with self.assertNumQueries(2):
+            features = get_learning_features(self.user)
+
+        hour_seconds = [0] * 24
+        weekday_seconds = [0] * 7
+        total_seconds = 0
+        days = set()
+        for start_time, duration in StudySession.objects.values_list('start_time', 'duration'):
+            local = timezone.localtime(start_time)
+            hour_seconds[local.hour] += duration.total_seconds()
+            weekday_seconds[local.weekday()] += duration.total_seconds()
+            total_seconds += duration.total_seconds()
+            days.add(local.date())
+        longest = run = 0
+        for day in sorted(days):
+            run = run + 1 if day - timedelta(days=1) in days else 1
+            longest = max(longest, run)
+
+        self.assertEqual(features['session_count'], 2000)
+        self.assertAlmostEqual(features['total_hours'], total_seconds / 3600, places=1)
+        self.assertEqual(features['hour_of_day_hours'], [round(value / 3600, 2) for value in hour_seconds])
+        self.assertEqual(features['weekday_hours'], [round(value / 3600, 2) for value in weekday_seconds])
+        self.assertEqual(features['streaks']['longest_days'], longest)
+        self.assertEqual(len(features['subject_trends']), 8)
+
+
+@tag('benchmark')
+class LearningFeaturesBenchmarkTests(TestCase):
+    """学習特徴量の計算のベンチマーク（100,000件、--tag benchmark で実行）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice')
+        subjects = [Subject.objects.create(user=cls.user, name=f"科目{i}") for i in range(8)]
+        create_feature_sessions(cls.user, subjects, 100000)
+
+    def test_query_count_does_not_grow_with_history(self):
+        # 件数によらず、列の読み込みと科目名の取得の2クエリで計算する
+        with self.assertNumQueries(2):
+            features = get_learning_features(self.user)
+        self.assertEqual(features['session_count'], 100000)
+
+
+class SlidingWindowRateLimiterTests(TestCase):
+    """スライディングウィンドウのレート制限の確認"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_limit_and_window_weighting(self):
+        limiter = SlidingWindowRateLimiter('test', max_requests=5, window=60)
+        start = 6000.0
+
+        results = [limiter.hit('user:1', now=start + i) for i in range(6)]
+        self.assertEqual([result.allowed for result in results], [True] * 5 + [False])
+        self.assertEqual(results[4].remaining, 0)
+        self.assertEqual(results[5].headers['X-RateLimit-Reset'], '55')
+        # 別のクライアントは別に数える
+        self.assertTrue(limiter.hit('user:2', now=start).allowed)
+
+        # 次のウィンドウの半分の時点では直前のウィンドウの5件を半分（2.5件）として数える
+        allowed = [limiter.hit('user:1', now=start + 90 + i * 0.01).allowed for i in range(4)]
+        self.assertEqual(allowed, [True, True, False, False])
+
+    def test_cache_round_trips_per_request(self):
+        backend = mock.Mock(wraps=cache)
+        limiter = SlidingWindowRateLimiter('bench', max_requests=100, window=60, cache_backend=backend)
+        start = 6000.0
+
+        # 許可する場合は add / incr / get の3回
+        for i in range(100):
+            limiter.hit('user:1', now=start + i * 0.01)
+        self.assertEqual(len(backend.method_calls), 300)
+
+        # 拒否する場合はカウントの取り消し（decr）を含めて4回
+        backend.reset_mock()
+        self.assertFalse(limiter.hit('user:1', now=start + 1).allowed)
+        self.assertEqual([call[0] for call in backend.method_calls], ['add', 'incr', 'get', 'decr'])
+
+
+@override_settings(ADMISSION_POOLS={'ai': 1, 'reports': 2})
+class AdmissionStreamingTests(TestCase):
+    """ストリーミングレスポンスのスロットが送信完了時に解放されることの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        subject = Subject.objects.create(user=self.user, name="英語", hourly_rate=1000)
+        create_finished_sessions(self.user, [subject], 3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_export_slot_is_released_after_streaming(self):
+        response = self.client.get('/api/sessions/export/?format=csv')
+        self.assertEqual(response.status_code, 200)
+        # 送信中はスロットを確保したまま
+        self.assertEqual(self.client.get('/api/sessions/export/?format=csv').status_code, 503)
+
+        body = b''.join(response.streaming_content)
+        self.assertEqual(len(body.decode('utf-8').splitlines()), 4)
+        self.assertEqual(self.client.get('/api/stats/').status_code, 200)
+
+    def test_slot_is_released_when_closed_midway(self):
+        response = self.client.get('/api/sessions/export/?format=csv')
+        next(iter(response.streaming_content))
+        response.close()
+        second = self.client.get('/api/sessions/export/?format=csv')
+        self.assertEqual(second.status_code, 200)
+        b''.join(second.streaming_content)
+
+
+class LLMBackendTests(TestCase):
+    """LLM バックエンドとモデルがプロセス内で再利用されることの確認"""
+
+    def fake_vertexai(self):
+        vertexai = mock.MagicMock()
+        generative_models = mock.MagicMock()
+        generative_models.GenerativeModel.side_effect = lambda name, generation_config: mock.MagicMock(
+            name=name, generation_config=generation_config
+        )
+        vertexai.generative_models = generative_models
+        return mock.patch.dict(sys.modules, {
+            'vertexai': vertexai,
+            'vertexai.generative_models': generative_models,
+        }), vertexai, generative_models
+
+    def test_get_backend_returns_shared_instance(self):
+        self.assertIs(get_backend('stub'), get_backend('stub'))
+        with override_settings(AI_BACKEND='stub'):
+            self.assertIs(get_backend(), get_backend('stub'))
+        with self.assertRaises(ValueError):
+            get_backend('unknown')
+
+    @override_settings(GCP_PROJECT_ID='project')
+    def test_vertex_initializes_once_and_caches_models_per_config(self):
+        patcher, vertexai, generative_models = self.fake_vertexai()
+        backend = VertexAIBackend()
+        with patcher:
+            first = backend.get_model('gemini', 0.2)
+            self.assertIs(backend.get_model('gemini', 0.2), first)
+            other = backend.get_model('gemini', 0.7)
+
+        self.assertIsNot(other, first)
+        vertexai.init.assert_called_once()
+        self.assertEqual(generative_models.GenerativeModel.call_count, 2)
+        generative_models.GenerationConfig.assert_any_call(temperature=0.7)
+
+    def test_generate_content_passes_temperature(self):
+        backend = mock.Mock(spec=LLMBackend)
+        backend.generate.return_value = "応答"
+
+        self.assertEqual(generate_content("プロンプト", 'model', temperature=0.7, backend=backend), "応答")
+        backend.generate.assert_called_once_with("プロンプト", 'model', 0.7)
+
+
+def learning_data(subject_count, goal_count, session_count, purpose="資格試験に合格する", note="復習"):
+    """build_learning_prompt に渡す正規化済みの学習データを作成する"""
+    return {
+        "study_purpose": purpose,
+        "total_month_hours": 12.5,
+        "total_week_hours": 3.0,
+        "subject_hours": {f"科目{i}": float(i) for i in range(subject_count)},
+        "subjects": [{"name": f"科目{i}", "hourly_rate": 1000.0} for i in range(subject_count)],
+        "recent_sessions": [
+            {"date": f"2026-09-{30 - i:02d}", "subject": "科目0", "duration_hours": 1.5, "notes": note}
+            for i in range(session_count)
+        ],
+        "savings_goals": [
+            {
+                "title": f"目標{i}",
+                "target_amount": 10000.0,
+                "current_amount": 5000.0,
+                "deadline": f"2027-{i % 12 + 1:02d}-01",
+                "is_achieved": i % 2 == 1,
+                "progress_percentage": 50.0,
+            }
+            for i in range(goal_count)
+        ],
+        "learning_patterns": {
+            "hour_of_day_hours": [0.0] * 24,
+            "weekday_hours": [0.0] * 7,
+            "session_length": {"mean_minutes": 60, "median_minutes": 60, "p90_minutes": 90},
+            "streaks": {"current_days": 1, "longest_days": 5, "active_days_last_30": 10},
+            "subject_trends": [],
+        },
+    }
+
+
+class LearningPromptTests(TestCase):
+    """学習分析プロンプトのトークン上限と省略の確認"""
+
+    def test_small_input_is_included_in_full(self):
+        prompt = build_learning_prompt(learning_data(2, 2, 3), token_budget=2000)
+
+        for text in ("科目0|1000", "科目1|1000", "目標0|10000", "目標1|10000", "2026-09-28|科目0|1.5|復習"):
+            self.assertIn(text, prompt)
+        self.assertNotIn('"subjects"', prompt)
+
+    def test_heavy_user_prompt_stays_within_budget(self):
+        sizes = []
+        for count in (50, 500):
+            prompt = build_learning_prompt(learning_data(count, count, 15), token_budget=800)
+            self.assertLessEqual(estimate_tokens(prompt), 800)
+            sizes.append(estimate_tokens(prompt))
+
+            # 価値の高い行（勉強時間の多い科目・最新のセッション・期限の近い未達成の目標）は残る
+            self.assertIn(f"\n科目{count - 1}|1000|", prompt)
+            self.assertIn("2026-09-30|科目0", prompt)
+            self.assertIn("目標0|", prompt)
+            self.assertNotIn("\n科目0|1000|", prompt)
+        self.assertLessEqual(abs(sizes[0] - sizes[1]), 20)
+
+    def test_long_notes_and_purpose_are_truncated(self):
+        prompt = build_learning_prompt(
+            learning_data(1, 0, 1, purpose="合格" * 500, note="あ" * 500 + "|改行\nあり"),
+            token_budget=1000
+        )
+
+        self.assertIn("あ" * (NOTE_MAX_CHARS - 1) + "…", prompt)
+        self.assertNotIn("あ" * NOTE_MAX_CHARS, prompt)
+        self.assertNotIn("合格" * 200, prompt)
+        self.assertLessEqual(estimate_tokens(prompt), 1000)
+
+
+class FakeStreamingBackend(LLMBackend):
+    """決まったチャンクを返し、指定があればその後に失敗するテスト用バックエンド"""
+    name = 'fake'
+
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.calls = 0
+
+    def stream(self, prompt, model_name, temperature=0.2):
+        self.calls += 1
+        yield from self.chunks
+        if self.error:
+            raise self.error
+
+
+def parse_sse(body):
+    """SSE の本文を (イベント名, data の JSON) のリストに変換する"""
+    events = []
+    for block in body.decode('utf-8').split('\n\n'):
+        if not block:
+            continue
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+class LearningAnalysisStreamTests(TestCase):
+    """学習分析の Server-Sent Events の確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        subject = Subject.objects.create(user=self.user, name="英語", hourly_rate=1000)
+        create_finished_sessions(self.user, [subject], 3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stream(self, backend):
+        with mock.patch.object(ai_services, 'get_backend', return_value=backend):
+            response = self.client.post(
+                '/api/analyze-learning/stream/',
+                {'study_purpose': "資格試験"},
+                format='json',
+                HTTP_ACCEPT='text/event-stream'
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/event-stream'))
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+            body = b''.join(response.streaming_content)
+        self.assertTrue(body.endswith(b'\n\n'))
+        return parse_sse(body)
+
+    def test_chunks_then_done_and_cached_replay(self):
+        backend = FakeStreamingBackend(["学習", "は順調", "です"])
+
+        events = self.stream(backend)
+        self.assertEqual(events, [
+            ('chunk', {'text': "学習"}),
+            ('chunk', {'text': "は順調"}),
+            ('chunk', {'text': "です"}),
+            ('done', {'cached': False}),
+        ])
+
+        # 2回目はキャッシュ済みの全文を1チャンクで返し、モデルは呼び出さない
+        events = self.stream(backend)
+        self.assertEqual(events, [('chunk', {'text': "学習は順調です"}), ('done', {'cached': True})])
+        self.assertEqual(backend.calls, 1)
+
+    def test_error_event_after_partial_output(self):
+        events = self.stream(FakeStreamingBackend(["途中まで"], error=RuntimeError("connection reset")))
+
+        self.assertEqual(events[0], ('chunk', {'text': "途中まで"}))
+        self.assertEqual(events[-1][0], 'error')
+        self.assertIn('message', events[-1][1])
+        self.assertNotIn('done', [event for event, _ in events])
+        # 失敗した結果はキャッシュしない
+        self.assertFalse(LearningAnalysis.objects.exists())
+
+
+class CachedUserTests(TestCase):
+    """JWT 認証ユーザーのキャッシュの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'secret-pass')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_cache_does_not_hold_password_hash(self):
+        self.assertEqual(self.client.get('/api/subjects/').status_code, 200)
+
+        entry = cache.get(AUTH_USER_KEY.format(user_id=self.user.id))
+        self.assertEqual(entry['username'], 'alice')
+        self.assertNotIn('password', entry)
+        self.assertNotIn(self.user.password, repr(entry))
+
+        # 2回目はキャッシュから解決する（ユーザーの SELECT なし）
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/api/subjects/').status_code, 200)
+        self.assertFalse(any('auth_user' in query['sql'] for query in ctx.captured_queries))
+
+    def test_deactivation_is_applied_immediately(self):
+        self.assertEqual(self.client.get('/api/subjects/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/subjects/').status_code, 401)
+
+    def test_saving_cached_user_keeps_password(self):
+        get_cached_user(self.user.id)
+        cached = get_cached_user(self.user.id)
+        cached.email = 'new@example.com'
+        cached.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, 'new@example.com')
+        self.assertTrue(self.user.check_password('secret-pass'))
+
+    def test_session_auth_check_uses_cached_hash(self):
+        client = APIClient()
+        client.login(username='alice', password='secret-pass')
+        self.assertTrue(client.get('/api/auth/check/').json()['isAuthenticated'])
+        self.assertTrue(client.get('/api/auth/check/').json()['isAuthenticated'])
+
+        # パスワード変更でセッションは無効になる
+        self.user.set_password('another-pass')
+        self.user.save()
+        self.assertFalse(client.get('/api/auth/check/').json()['isAuthenticated'])
+
+
+class AuthStatusCheckTests(TestCase):
+    """認証状態チェックがセッション・ユーザー・ソーシャルアカウントをDBから読まずに応答することの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'secret-pass')
+        self.client = APIClient()
+        self.client.login(username='alice', password='secret-pass')
+
+    def test_hot_path_runs_no_queries(self):
+        first = self.client.get('/api/auth/check/').json()
+        self.assertEqual(first['authType'], 'session')
+        self.assertEqual(self.client.get('/api/auth/oauth-status/').json()['username'], 'alice')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/auth/check/').json(), first)
+            self.assertTrue(self.client.get('/api/auth/oauth-status/').json()['authenticated'])
+            self.assertFalse(APIClient().get('/api/auth/check/').json()['isAuthenticated'])
+
+    def test_linking_social_account_is_reflected(self):
+        from allauth.socialaccount.models import SocialAccount
+
+        self.assertEqual(self.client.get('/api/auth/check/').json()['socialAccounts'], [])
+        SocialAccount.objects.create(user=self.user, provider='google', uid='1')
+
+        response = self.client.get('/api/auth/check/').json()
+        self.assertEqual(response['authType'], 'social')
+        self.assertEqual(response['socialAccounts'], [{'provider': 'google'}])
+
+    def test_purge_deletes_only_expired_sessions(self):
+        from django.contrib.sessions.models import Session
+
+        Session.objects.bulk_create([
+            Session(session_key=f'expired{i}', session_data='', expire_date=timezone.now() - timedelta(days=1))
+            for i in range(5)
+        ])
+        call_command('purge_expired_sessions', '--batch-size', '2', stdout=io.StringIO())
+
+        self.assertFalse(Session.objects.filter(session_key__startswith='expired').exists())
+        self.assertTrue(Session.objects.exists())
+        self.assertTrue(self.client.get('/api/auth/check/').json()['isAuthenticated'])
+
+
+class BlacklistCacheTests(TestCase):
+    """リフレッシュトークンのブラックリスト判定の確認"""
+
+    def setUp(self):
+        cache.clear()
+        blacklist_cache.__init__()
+        self.user = User.objects.create_user('alice')
+        self.client = APIClient()
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/token/refresh/', {'refresh': token}, format='json')
+
+    def blacklist_queries(self, queries):
+        return [query for query in queries if 'token_blacklist_blacklistedtoken' in query['sql'] and 'JOIN' in query['sql']]
+
+    def test_db_is_checked_once_per_token(self):
+        token = RefreshToken.for_user(self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertFalse(blacklist_cache.contains(token['jti']))
+            self.assertFalse(blacklist_cache.contains(token['jti']))
+        self.assertEqual(len(self.blacklist_queries(ctx.captured_queries)), 1)
+
+        # このプロセスでブラックリストに追加したトークンはすぐに拒否される
+        self.assertEqual(self.refresh(str(token)).status_code, 200)
+        self.assertEqual(self.refresh(str(token)).status_code, 401)
+
+    def test_tokens_blacklisted_elsewhere_are_rejected_immediately(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(blacklist_cache.contains(token['jti']))
+
+        # 他のプロセスでのブラックリスト追加（このプロセスの辞書には入らない）
+        with self.captureOnCommitCallbacks(execute=True):
+            RefreshToken.blacklist(token)
+        self.assertEqual(self.refresh(str(token)).status_code, 401)
+
+    def test_negative_answers_are_not_served_from_process_memory(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(blacklist_cache.contains(token['jti']))
+
+        # 共有キャッシュへの反映が失われても、DB で確認し直す
+        RefreshToken.blacklist(token)
+        cache.clear()
+        self.assertTrue(blacklist_cache.contains(token['jti']))
+
+
+class ExportTests(TestCase):
+    """エクスポートの圧縮・エラーレスポンスの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        subject = Subject.objects.create(user=self.user, name="英語", hourly_rate=1000)
+        create_finished_sessions(self.user, [subject], 3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, query='format=csv', **extra):
+        response = self.client.get(f'/api/sessions/export/?{query}', **extra)
+        if response.streaming:
+            response.content_bytes = b''.join(response.streaming_content)
+        return response
+
+    def test_gzip_respects_q_values(self):
+        cases = {
+            'gzip': True,
+            'gzip, deflate, br': True,
+            'gzip;q=0': False,
+            'gzip; q=0.0, identity': False,
+            '*;q=0.5': True,
+            '*, gzip;q=0': False,
+            'br': False,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                response = self.export(HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.get('Content-Encoding') == 'gzip', expected)
+                if not expected:
+                    self.assertTrue(response.content_bytes.decode('utf-8-sig').startswith('id,subject'))
+
+    def test_errors_are_returned_as_json(self):
+        for query in ('format=csv&from=bad', 'format=ndjson&from=bad'):
+            with self.subTest(query=query):
+                response = self.export(query)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response['Content-Type'], 'application/json; charset=utf-8')
+                self.assertIn('from', response.json())
+
+
+class ConcurrentGoalCreditTests(TransactionTestCase):
+    """同時に終了・一括登録した場合に貯金目標への加算が失われないことの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        self.subject = Subject.objects.create(user=self.user, name="英語", hourly_rate=1000)
+        # 最初の目標は1件目の加算で達成され、以降の加算は次の目標に入る
+        SavingsGoal.objects.create(user=self.user, title="本", target_amount=1000)
+        SavingsGoal.objects.create(user=self.user, title="旅行", target_amount=100000)
+        self.session = StudySession.objects.create(
+            user=self.user, subject=self.subject, start_time=timezone.now() - timedelta(hours=1)
+        )
+
+    def run_parallel(self, requests):
+        barrier = threading.Barrier(len(requests))
+        responses = [None] * len(requests)
+
+        def run(index, method, path, data):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                responses[index] = getattr(client, method)(path, data, format='json')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(i, *request)) for i, request in enumerate(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def batch_request(self, index):
+        start_time = timezone.now() - timedelta(days=1, hours=index + 2)
+        return ('post', '/api/sessions/batch/', {'sessions': [{
+            'client_id': str(uuid.UUID(int=index + 1)),
+            'subject': self.subject.id,
+            'start_time': start_time.isoformat(),
+            'end_time': (start_time + timedelta(hours=1)).isoformat()
+        }]})
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_parallel_stop_and_batch_credit_every_session_once(self):
+        stop = ('post', f'/api/sessions/{self.session.id}/stop/', {})
+        responses = self.run_parallel([stop, stop] + [self.batch_request(i) for i in range(4)])
+
+        self.assertEqual(sorted(response.status_code for response in responses[:2]), [200, 400])
+        self.assertTrue(all(response.status_code == 201 for response in responses[2:]))
+
+        earned = StudySession.objects.filter(user=self.user).aggregate(total=Sum('earned_amount'))['total']
+        credited = SavingsGoal.objects.filter(user=self.user).aggregate(total=Sum('current_amount'))['total']
+        self.assertEqual(credited, earned)
+        self.assertEqual(
+            list(SavingsGoal.objects.filter(user=self.user).order_by('id').values_list('is_achieved', flat=True)),
+            [True, False]
+        )
+
+    def test_second_stop_is_rejected_and_credits_once(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post(f'/api/sessions/{self.session.id}/stop/').status_code, 200)
+        self.assertEqual(client.post(f'/api/sessions/{self.session.id}/stop/').status_code, 400)
+
+        self.session.refresh_from_db()
+        self.assertEqual(
+            list(SavingsGoal.objects.filter(user=self.user).order_by('id').values_list('current_amount', 'is_achieved')),
+            [(self.session.earned_amount, True), (Decimal('0.00'), False)]
+        )
+
+    def test_goal_achieved_while_waiting_is_skipped(self):
+        first, second = SavingsGoal.objects.filter(user=self.user).order_by('id')
+        fired = []
+
+        def achieve_first_goal_before_update(execute, sql, params, many, context):
+            # 加算先を選んだ後、UPDATE の前に別の加算で最初の目標が達成された状態を作る
+            if sql.startswith('UPDATE "study_tracker_savingsgoal"') and not fired:
+                fired.append(sql)
+                SavingsGoal.objects.filter(id=first.id).update(is_achieved=True)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(achieve_first_goal_before_update), transaction.atomic():
+            goal_id = credit_active_goal(self.user.id, Decimal('500'), timezone.now())
+
+        self.assertEqual(goal_id, second.id)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.current_amount, first.is_achieved), (Decimal('0.00'), True))
+        self.assertEqual((second.current_amount, second.is_achieved), (Decimal('500.00'), False))
+
+
+class SessionBatchTests(TestCase):
+    """オフライン記録の一括登録の確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        self.subject = Subject.objects.create(user=self.user, name="英語", hourly_rate=1000)
+        self.goal = SavingsGoal.objects.create(user=self.user, title="本", target_amount=100000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.start_time = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=3)
+
+    def item(self, day, hours, client_id=None, subject=None):
+        start_time = self.start_time + timedelta(days=day)
+        return {
+            'client_id': client_id or str(uuid.uuid4()),
+            'subject': subject or self.subject.id,
+            'start_time': start_time.isoformat(),
+            'end_time': (start_time + timedelta(hours=hours)).isoformat(),
+        }
+
+    def post(self, items):
+        return self.client.post('/api/sessions/batch/', {'sessions': items}, format='json')
+
+    def test_replay_is_idempotent(self):
+        items = [self.item(0, 1), self.item(1, 2)]
+        first = self.post(items + [dict(items[0])])
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(len(first.json()['created']), 2)
+        self.assertEqual(first.json()['duplicates'], [items[0]['client_id']])
+        self.assertEqual(first.json()['credited_amount'], 3000)
+
+        replay = self.post(items)
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()['created'], [])
+        self.assertCountEqual(replay.json()['duplicates'], [item['client_id'] for item in items])
+        self.assertEqual(replay.json()['credited_amount'], 0)
+
+        self.assertEqual(StudySession.objects.filter(user=self.user).count(), 2)
+        self.goal.refresh_from_db()
+        self.assertEqual(self.goal.current_amount, Decimal('3000.00'))
+
+    def test_invalid_item_rejects_whole_batch(self):
+        other = Subject.objects.create(user=User.objects.create_user('bob'), name="数学")
+        items = [self.item(0, 1), self.item(1, -1), self.item(2, 1, subject=other.id)]
+
+        response = self.post(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sessions', response.json())
+        self.assertFalse(StudySession.objects.filter(user=self.user).exists())
+        self.goal.refresh_from_db()
+        self.assertEqual(self.goal.current_amount, Decimal('0'))
+
+    def test_batch_shares_created_at_and_updates_rollups_and_goal(self):
+        items = [self.item(0, 1), self.item(0, 0.5), self.item(2, 2)]
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.post(items).status_code, 201)
+        # 登録時刻は作成時に設定する（作成後の UPDATE はしない）
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "study_tracker_studysession"') for query in ctx.captured_queries
+        ))
+
+        created_at = set(StudySession.objects.filter(user=self.user).values_list('created_at', flat=True))
+        self.assertEqual(len(created_at), 1)
+
+        rollups = dict(DailyStudyRollup.objects.filter(user=self.user).values_list('date', 'total_seconds'))
+        self.assertEqual(rollups, {
+            timezone.localdate(self.start_time): 5400,
+            timezone.localdate(self.start_time + timedelta(days=2)): 7200,
+        })
+        self.goal.refresh_from_db()
+        self.assertEqual(self.goal.current_amount, Decimal('3500.00'))
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        self.assertEqual(self.post([self.item(0, 1)]).status_code, 201)
+
+        query_counts = []
+        for size in (3, 30):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.post([self.item(day % 3, 1) for day in range(size)]).status_code, 201)
+            query_counts.append(len(ctx.captured_queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+class GoalReconcileTests(TestCase):
+    """live の加算と reconcile_goals が同じルールで計算することの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        self.subject = Subject.objects.create(user=self.user, name="英語", hourly_rate=1000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def goals(self):
+        return list(SavingsGoal.objects.filter(user=self.user).order_by('created_at', 'id').values_list(
+            'title', 'current_amount', 'is_achieved'
+        ))
+
+    def study(self, hours):
+        session = StudySession.objects.create(
+            user=self.user, subject=self.subject, start_time=timezone.now() - timedelta(hours=hours)
+        )
+        self.assertEqual(self.client.post(f'/api/sessions/{session.id}/stop/').status_code, 200)
+
+    def batch(self, *hours):
+        start_time = timezone.now() - timedelta(days=2)
+        response = self.client.post('/api/sessions/batch/', {'sessions': [{
+            'client_id': str(uuid.uuid4()),
+            'subject': self.subject.id,
+            'start_time': (start_time + timedelta(hours=i * 3)).isoformat(),
+            'end_time': (start_time + timedelta(hours=i * 3 + h)).isoformat()
+        } for i, h in enumerate(hours)]}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_reconcile_is_noop_after_live_credits(self):
+        # 目標がない間の獲得金額はどの目標にも加算されない
+        self.study(1)
+        SavingsGoal.objects.create(user=self.user, title="本", target_amount=1500)
+        SavingsGoal.objects.create(user=self.user, title="旅行", target_amount=5000)
+        # 一括登録は1回の加算として最初の目標に入り、目標金額を超えた分もその目標に残る
+        self.batch(1, 1)
+        self.study(2)
+        SavingsGoal.objects.create(user=self.user, title="PC", target_amount=100000)
+        self.batch(3)
+        self.study(1)
+
+        expected = [
+            ("本", Decimal('2000.00'), True),
+            ("旅行", Decimal('5000.00'), True),
+            ("PC", Decimal('1000.00'), False),
+        ]
+        self.assertEqual(self.goals(), expected)
+        self.assertEqual(reconcile_goals([self.user.id]), [])
+
+        # 再計算は live の加算を上書きしない（繰り返し実行しても変わらない）
+        call_command('reconcile_goals', stdout=io.StringIO())
+        self.assertEqual(self.goals(), expected)
+
+    def test_reconcile_restores_drifted_amounts(self):
+        goal = SavingsGoal.objects.create(user=self.user, title="本", target_amount=5000)
+        self.study(2)
+        SavingsGoal.objects.filter(id=goal.id).update(current_amount=0)
+
+        changes = reconcile_goals([self.user.id])
+        self.assertEqual([(change.current_amount, change.new_amount) for change in changes],
+                         [(Decimal('0.00'), Decimal('2000.00'))])
+        self.assertEqual(self.goals(), [("本", Decimal('2000.00'), False)])
+
+    def test_user_edits_are_not_rewritten_by_reconcile(self):
+        # 金額と達成状態は API からは変更できない（作成時の指定も無視する）
+        response = self.client.post('/api/goals/', {
+            'title': "本", 'target_amount': 5000, 'current_amount': 300, 'is_achieved': True
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        goal_id = response.json()['id']
+        self.study(2)
+
+        response = self.client.patch(f'/api/goals/{goal_id}/', {
+            'title': "技術書", 'current_amount': 9999, 'is_achieved': True
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['current_amount'], response.json()['is_achieved']), ('2000.00', False))
+
+        self.assertEqual(reconcile_goals([self.user.id]), [])
+        self.assertEqual(self.goals(), [("技術書", Decimal('2000.00'), False)])
+
+    def test_target_change_is_reconciled_immediately(self):
+        first = SavingsGoal.objects.create(user=self.user, title="本", target_amount=5000)
+        SavingsGoal.objects.create(user=self.user, title="旅行", target_amount=5000)
+        self.study(1)
+        self.study(2)
+
+        # 目標金額を下げると、達成後の加算は次の目標に移る
+        response = self.client.patch(f'/api/goals/{first.id}/', {'target_amount': 1000}, format='json')
+        self.assertEqual(response.json()['is_achieved'], True)
+        self.assertEqual(self.goals(), [("本", Decimal('1000.00'), True), ("旅行", Decimal('2000.00'), False)])
+        self.assertEqual(reconcile_goals([self.user.id]), [])
+
+
+class StudySeriesTests(TestCase):
+    """推移グラフのパラメータの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        subject = Subject.objects.create(user=self.user, name="英語", hourly_rate=1000)
+        create_finished_sessions(self.user, [subject], 3)
+        rebuild_rollups([self.user.id])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_invalid_calendar_date_returns_400(self):
+        for query in ('from=2024-02-30', 'to=2024-13-01', 'from=2024-1-x'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/stats/series/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(query.split('=')[0], response.json())
+
+    def test_valid_range(self):
+        today = timezone.localdate()
+        response = self.client.get(f'/api/stats/series/?from={today - timedelta(days=6)}&to={today}')
+        self.assertEqual(response.status_code, 200)
+
+
+class LeaderboardTests(TestCase):
+    """ランキングの順位・公開範囲・パラメータの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.users = []
+        for name, count in (('alice', 3), ('bob', 5), ('carol', 3)):
+            user = User.objects.create_user(name)
+            subject = Subject.objects.create(user=user, name="英語", hourly_rate=1000)
+            create_finished_sessions(user, [subject], count, minutes=60, now=timezone.now().replace(hour=12))
+            self.users.append(user)
+        rebuild_rollups([user.id for user in self.users])
+        for period in ('week', 'month'):
+            rebuild_leaderboards(period, current_period_start(period))
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_others_are_returned_without_usernames(self):
+        data = self.client.get('/api/leaderboard/?period=month&limit=10').json()
+        # 3人とも今日のセッションがあるため、全員がランキングに含まれる
+        self.assertEqual(len(data['entries']), 3)
+
+        mine = [entry for entry in data['entries'] if entry['is_me']]
+        others = [entry for entry in data['entries'] if not entry['is_me']]
+        self.assertEqual([entry['username'] for entry in mine], ['alice'])
+        self.assertTrue(all(set(entry) == {'rank', 'value', 'is_me'} for entry in others))
+        self.assertEqual(data['me']['rank'], mine[0]['rank'])
+
+    def test_invalid_date_returns_400(self):
+        for value in ('2024-13-01', '2024-02-30', 'today'):
+            with self.subTest(date=value):
+                response = self.client.get(f'/api/leaderboard/?date={value}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('date', response.json())
+
+
+    def test_subject_names_are_normalized(self):
+        for user, name in ((self.users[0], "Math"), (self.users[1], " math  ")):
+            subject = Subject.objects.create(user=user, name=name, hourly_rate=1000)
+            create_finished_sessions(user, [subject], 1, minutes=30, now=timezone.now().replace(hour=12))
+        rebuild_rollups([user.id for user in self.users])
+        rebuild_leaderboards('month', current_period_start('month'))
+
+        data = self.client.get('/api/leaderboard/?period=month&subject=MATH').json()
+        self.assertEqual(data['subject'], 'math')
+        self.assertEqual(len(data['entries']), 2)
+        self.assertEqual(data['me']['value'], 0.5)
+
+    def test_rebuild_upserts_and_removes_stale_rows(self):
+        start = current_period_start('month')
+        board = LeaderboardEntry.objects.filter(period='month', period_start=start)
+        before = {(entry.user_id, entry.subject_name): entry.id for entry in board}
+
+        StudySession.objects.filter(user=self.users[2]).delete()
+        rebuild_rollups([self.users[2].id])
+        self.assertEqual(rebuild_leaderboards('month', start), 4)
+
+        after = {(entry.user_id, entry.subject_name): entry.id for entry in board.all()}
+        self.assertEqual({key for key in before if key[0] != self.users[2].id}, set(after))
+        # 既存の行は作り直さずに更新する
+        self.assertTrue(all(before[key] == entry_id for key, entry_id in after.items()))
+
+    def test_rebuild_loop_survives_database_errors(self):
+        class StopLoop(Exception):
+            pass
+
+        with mock.patch(
+            'study_tracker.management.commands.rebuild_leaderboards.rebuild_leaderboards',
+            side_effect=OperationalError("deadlock detected")
+        ), mock.patch(
+            'study_tracker.management.commands.rebuild_leaderboards.time.sleep', side_effect=StopLoop
+        ), self.assertLogs('study_tracker', level='ERROR') as logs:
+            with self.assertRaises(StopLoop):
+                call_command('rebuild_leaderboards', '--every', '60', stdout=io.StringIO())
+        self.assertIn("deadlock detected", logs.output[0])
+
+
+class RollupMaintenanceTests(TestCase):
+    """セッションの作成・更新・終了・削除後の日別集計が全件の再構築と一致することの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        self.english = Subject.objects.create(user=self.user, name="英語", hourly_rate=1000)
+        self.math = Subject.objects.create(user=self.user, name="数学", hourly_rate=1500)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def rollups(self):
+        return sorted(DailyStudyRollup.objects.filter(user=self.user).values_list(
+            'subject_id', 'date', 'total_seconds', 'earned_amount', 'session_count'
+        ))
+
+    def assertMatchesRebuild(self, step):
+        live = self.rollups()
+        rebuild_rollups([self.user.id])
+        self.assertEqual(live, self.rollups(), step)
+
+    def test_rollups_follow_every_mutation(self):
+        start = timezone.now() - timedelta(days=3, hours=5)
+        response = self.client.post('/api/sessions/', {
+            'subject': self.english.id,
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(hours=1)).isoformat()
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        created_id = response.json()['id']
+        self.assertMatchesRebuild('create')
+
+        session_id = self.client.post('/api/sessions/start/', {'subject': self.math.id}).json()['id']
+        StudySession.objects.filter(id=session_id).update(start_time=timezone.now() - timedelta(hours=2))
+        self.assertEqual(self.client.post(f'/api/sessions/{session_id}/stop/').status_code, 200)
+        self.assertMatchesRebuild('stop')
+
+        session_id = self.client.post('/api/sessions/start/', {'subject': self.english.id}).json()['id']
+        response = self.client.patch(f'/api/sessions/{session_id}/', {
+            'end_time': (timezone.now() + timedelta(minutes=30)).isoformat()
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertMatchesRebuild('PATCH end_time')
+
+        # 日付と科目をまたぐ更新は移動元・移動先の両方の集計行を再計算する
+        response = self.client.patch(f'/api/sessions/{created_id}/', {
+            'subject': self.math.id,
+            'start_time': (start - timedelta(days=2)).isoformat(),
+            'end_time': (start - timedelta(days=2) + timedelta(hours=2)).isoformat()
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertMatchesRebuild('PATCH start_time / subject')
+
+        self.assertEqual(self.client.delete(f'/api/sessions/{created_id}/').status_code, 204)
+        self.assertMatchesRebuild('destroy')
+        self.assertEqual(len(self.rollups()), 2)
+
+
+class ActiveSessionMigrationTests(TransactionTestCase):
+    """一意制約を追加するマイグレーションが既存の重複した進行中セッションを解消することの確認"""
+
+    migrate_from = [('study_tracker', '0003_session_earnings')]
+    migrate_to = [('study_tracker', '0004_active_session_constraint')]
+
+    def tearDown(self):
+        # 以降のテストのために最新のスキーマに戻す
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicate_active_sessions_are_closed_before_constraint(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        user = apps.get_model('auth', 'User').objects.create(username='alice')
+        subject = apps.get_model('study_tracker', 'Subject').objects.create(user=user, name="英語")
+        StudySession = apps.get_model('study_tracker', 'StudySession')
+        now = timezone.now()
+        ids = [
+            StudySession.objects.create(user=user, subject=subject, start_time=now - timedelta(hours=hours)).id
+            for hours in (3, 2, 1)
+        ]
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+
+        sessions = StudySession.objects.order_by('id')
+        self.assertEqual([session.end_time is None for session in sessions], [False, False, True])
+        self.assertEqual(sessions.last().id, ids[-1])
+        self.assertEqual([session.duration for session in sessions[:2]], [timedelta(0)] * 2)
+
+
+class LeaderboardSubjectMigrationTests(TransactionTestCase):
+    """科目名を正規化するマイグレーションが同じ科目名になる行を合算することの確認"""
+
+    migrate_from = [('study_tracker', '0010_user_data_version')]
+    migrate_to = [('study_tracker', '0011_normalize_leaderboard_subjects')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_rows_with_same_normalized_name_are_merged(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        user = apps.get_model('auth', 'User').objects.create(username='alice')
+        LeaderboardEntry = apps.get_model('study_tracker', 'LeaderboardEntry')
+        start = current_period_start('week')
+        for name, seconds in (("Math", 600), ("math ", 300), ("英語", 100), ("", 1000)):
+            LeaderboardEntry.objects.create(
+                period='week', period_start=start, subject_name=name, user=user,
+                total_seconds=seconds, earned_amount=seconds
+            )
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+
+        rows = dict(LeaderboardEntry.objects.values_list('subject_name', 'total_seconds'))
+        self.assertEqual(rows, {"math": 900, "英語": 100, "": 1000})
+
+
+class DataVersionTests(TransactionTestCase):
+    """データバージョンが DB に保存され、プロセスのキャッシュによらず共有されることの確認"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+
+    def test_version_survives_cache_loss_and_follows_transactions(self):
+        self.assertEqual(get_data_version(self.user.id), '0')
+        bump_data_version(self.user.id)
+        bump_data_version(self.user.id)
+        version = get_data_version(self.user.id)
+        self.assertEqual(version, '2')
+
+        # 別のプロセス（プロセス内キャッシュが空）からも同じバージョンが見える
+        cache.clear()
+        self.assertEqual(get_data_version(self.user.id), version)
+
+        # ロールバックされた変更ではバージョンは変わらない
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                bump_data_version(self.user.id)
+                raise RuntimeError()
+        self.assertEqual(get_data_version(self.user.id), version)
@@ -0,0 +1,121 @@
+"""
+ブラックリスト済みリフレッシュトークンの高速な判定
+
+simplejwt の RefreshToken はトークンを検証するたびに BlacklistedToken と
+OutstandingToken を結合したクエリでブラックリストを確認します。
+ここでは判定結果を JTI ごとに共有キャッシュへ保存し、DB の確認は JTI ごとに1回までにします。
+ブラックリストへの追加は BlacklistedToken の post_save で共有キャッシュに書き込むため、
+どのプロセスで追加されたトークンもすぐに拒否されます。
+プロセス内の辞書には「ブラックリスト済み」の判定だけを保持し、「含まれない」の判定は
+辞書からは返しません（古い状態のまま失効したトークンを受け付けないため）。
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
+
+BLACKLIST_KEY = 'jwt_blacklist:{jti}'
+
+# 期限切れの JTI を辞書から削除する間隔（秒）
+EXPIRED_PURGE_INTERVAL = 60
+
+
+def remember_blacklisted(jti, exp):
+    """ブラックリスト済みの JTI をトークンの有効期限まで共有キャッシュに保存する"""
+    cache.set(BLACKLIST_KEY.format(jti=jti), exp, timeout=max(int(exp - time.time()), 1))
+
+
+class BlacklistCache:
+    """ブラックリスト済み JTI（JTI → 有効期限のエポック秒）のプロセス内キャッシュ"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis = {}
+        self._purged_at = 0
+
+    def add(self, jti, exp):
+        with self._lock:
+            self._jtis[jti] = exp
+
+            now = time.time()
+            if now - self._purged_at > EXPIRED_PURGE_INTERVAL:
+                self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > now}
+                self._purged_at = now
+
+    def contains(self, jti):
+        """
+        JTI がブラックリストに含まれるか
+
+        辞書にない場合は共有キャッシュ、それにもなければ DB で確認します。
+        「含まれない」の判定は JWT_BLACKLIST_NEGATIVE_TTL 秒だけ共有キャッシュに保存し、
+        その間にブラックリストへ追加された場合は post_save で上書きされます。
+        """
+        if jti in self._jtis:
+            return True
+
+        key = BLACKLIST_KEY.format(jti=jti)
+        exp = cache.get(key)
+        if exp is None:
+            expires_at = BlacklistedToken.objects.filter(token__jti=jti).values_list(
+                'token__expires_at', flat=True
+            ).first()
+            if expires_at is None:
+                # 確認後に追加された「ブラックリスト済み」を上書きしないよう、未登録の場合だけ保存する
+                cache.add(key, 0, timeout=settings.JWT_BLACKLIST_NEGATIVE_TTL)
+                return False
+            exp = expires_at.timestamp()
+            remember_blacklisted(jti, exp)
+
+        if not exp:
+            return False
+        self.add(jti, exp)
+        return True
+
+
+blacklist_cache = BlacklistCache()
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """ブラックリストの確認に BlacklistCache を使う RefreshToken"""
+
+    def check_blacklist(self):
+        if blacklist_cache.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_cache.add(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+        remember_blacklisted(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+        return result
+
+
+class CachedBlacklistTokenRefreshSerializer(TokenRefreshSerializer):
+    """CachedBlacklistRefreshToken でリフレッシュトークンを検証・ローテーションする"""
+
+    def validate(self, attrs):
+        refresh = CachedBlacklistRefreshToken(attrs['refresh'])
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+
+            data['refresh'] = str(refresh)
+
+        return data
+
+
+class CachedBlacklistTokenRefreshView(TokenRefreshView):
+    serializer_class = CachedBlacklistTokenRefreshSerializer
@@ -5,10 +5,11 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
-    TokenRefreshView,
     TokenVerifyView,
 )
 from . import views
+from .authentication import get_session_user, get_social_accounts
+from .tokens import CachedBlacklistTokenRefreshView
 # OAuth関連の追加ビューをインポート
 from .oauth_views import oauth_callback_view, oauth_to_jwt_view, oauth_status_view
 
@@ -22,58 +23,30 @@ router.register(r'goals', views.SavingsGoalViewSet, basename='savings-goal')
 def check_auth(request):
     """
     認証状態をチェックするエンドポイント
-    JWTトークンやセッション認証など、複数の認証方式に対応
+    セッション認証（Google OAuth 経由のログインを含む）の状態を返す
     """
     from django.http import JsonResponse
     import logging
     
     logger = logging.getLogger('study_tracker')
     
-    # セッション認証の状態確認
-    if request.user.is_authenticated:
-        logger.info(f"認証状態チェック: ユーザー {request.user.username} は認証済み")
+    # セッション（cached_db）とキャッシュ済みのユーザー・ソーシャルアカウントから判定（DBは参照しない）
+    user = get_session_user(request)
+    if user is not None:
+        social_accounts = get_social_accounts(user.pk)
+        logger.info(f"認証状態チェック: ユーザー {user.username} は認証済み")
         return JsonResponse({
-            "isAuthenticated": True, 
-            "username": request.user.username,
-            "authType": "session" if not request.auth else "jwt"
+            "isAuthenticated": True,
+            "username": user.username,
+            "authType": "social" if social_accounts else "session",
+            "socialAccounts": social_accounts
         })
     
-    # Django AllAuthの状態も確認
-    from allauth.socialaccount.models import SocialAccount
-    social_accounts = []
-    
-    # SocialAccount をチェック（allauth認証の場合）
-    if hasattr(request, 'session') and request.session.session_key:
-        # セッションがあり、ユーザーがログインしているか確認
-        from django.contrib.sessions.models import Session
-        from django.contrib.auth.models import User
-        
-        try:
-            session = Session.objects.get(session_key=request.session.session_key)
-            session_data = session.get_decoded()
-            uid = session_data.get('_auth_user_id')
-            
-            if uid:
-                user = User.objects.get(id=uid)
-                # SocialAccountの確認
-                social_accounts = list(SocialAccount.objects.filter(user=user).values('provider'))
-                
-                logger.info(f"認証状態チェック: allauth経由でユーザー {user.username} は認証済み")
-                return JsonResponse({
-                    "isAuthenticated": True,
-                    "username": user.username,
-                    "authType": "social",
-                    "socialAccounts": social_accounts
-                })
-        except Exception as e:
-            logger.error(f"認証状態チェックエラー: {str(e)}")
-            pass
-    
     logger.info("認証状態チェック: 認証されていません")
     return JsonResponse({
         "isAuthenticated": False,
         "authType": "none",
-        "social_accounts": social_accounts
+        "social_accounts": []
     })
 
 # Google OAuthコールバック後にトークンを取得するカスタムエンドポイント
@@ -123,7 +96,7 @@ urlpatterns = [
     
     # JWT認証用エンドポイント
     path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/token/refresh/', CachedBlacklistTokenRefreshView.as_view(), name='token_refresh'),
     path('auth/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path('auth/oauth-to-jwt/', oauth_to_jwt, name='oauth-to-jwt'),
     
@@ -140,8 +113,16 @@ urlpatterns = [
     
     # ユーザー情報
     path('user/', views.UserView.as_view(), name='user'),
+
+    # キャッシュのヒット率（管理者用）
+    path('metrics/cache/', views.CacheMetricsView.as_view(), name='cache-metrics'),
     
     # 統計と分析
     path('stats/', views.StatsView.as_view(), name='stats'),
+    path('stats/series/', views.StudySeriesView.as_view(), name='stats-series'),
+    path('stats/features/', views.LearningFeaturesView.as_view(), name='stats-features'),
+    path('leaderboard/', views.LeaderboardView.as_view(), name='leaderboard'),
     path('analyze-learning/', views.analyze_learning_view, name='analyze-learning'),
+    path('analyze-learning/stream/', views.analyze_learning_stream_view, name='analyze-learning-stream'),
+    path('analyze-learning/jobs/<int:job_id>/', views.analyze_learning_job_view, name='analyze-learning-job'),
 ]
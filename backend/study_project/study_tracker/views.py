@@ -1,28 +1,60 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from django.utils.text import compress_sequence
 from django.utils import timezone
-from django.db.models import Sum, F, ExpressionWrapper, fields
-from datetime import timedelta
-from django.utils.decorators import method_decorator
+from django.db import IntegrityError, transaction
+import zoneinfo
+from collections import defaultdict
+from decimal import Decimal
 
 from rest_framework import viewsets, status, permissions, generics
-from rest_framework.decorators import action, api_view
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.decorators import action, api_view, renderer_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 # JWT関連インポート
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Subject, StudySession, SavingsGoal
+from .models import Subject, StudySession, SavingsGoal, LearningAnalysisJob
+from .caching import (
+    ConditionalGetMixin, UserDataVersionMixin, bump_data_version, get_cache_metrics, get_or_build_user_data
+)
+from .filters import SavingsGoalFilter, StudySessionFilter, SubjectFilter, parse_date_param
+from .pagination import CreatedAtPagination, StudySessionPagination
+from .exports import accepts_gzip, stream_sessions
+from .renderers import CSVRenderer, EventStreamRenderer, NDJSONRenderer, format_sse_event
+from .rollups import rollup_key, refresh_rollup, refresh_rollups
+from .features import get_learning_features
+from .goals import credit_active_goal, credit_time, reconcile_goals
+from .leaderboards import (
+    METRICS, PERIODS, current_period_start, get_leaderboard_page, get_rank, normalize_subject_name,
+    refresh_leaderboards
+)
+from .stats import (
+    SERIES_BUCKETS,
+    bucket_count,
+    bucket_start,
+    get_study_series,
+    get_user_stats,
+    previous_bucket_start
+)
 from .serializers import (
     UserSerializer,
     SubjectSerializer, 
     StudySessionSerializer, 
+    StudySessionListRepresentation,
+    StudySessionBatchSerializer,
     SavingsGoalSerializer,
     RegisterSerializer
 )
 
 # AI分析サービスのインポート
-from .ai_services import analyze_learning
+from .ai_services import run_learning_analysis, stream_learning_analysis
+from .analysis_jobs import enqueue_analysis_job
 
 
 class RegisterView(generics.CreateAPIView):
@@ -116,25 +148,76 @@ class UserView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class SubjectViewSet(viewsets.ModelViewSet):
+class SubjectViewSet(ConditionalGetMixin, UserDataVersionMixin, viewsets.ModelViewSet):
     """勉強科目のCRUD操作を行うViewSet"""
     serializer_class = SubjectSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtPagination
+    filter_backends = [SubjectFilter]
+    etag_actions = ('list', 'retrieve')
     
     def get_queryset(self):
         return Subject.objects.filter(user=self.request.user)
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
 
+ACTIVE_SESSION_EXISTS_MESSAGE = '既に進行中の勉強セッションがあります。'
 
-class StudySessionViewSet(viewsets.ModelViewSet):
+
+class StudySessionViewSet(ConditionalGetMixin, UserDataVersionMixin, viewsets.ModelViewSet):
     """勉強セッションのCRUD操作を行うViewSet"""
     serializer_class = StudySessionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StudySessionPagination
+    filter_backends = [StudySessionFilter]
+    etag_actions = ('list', 'retrieve', 'current')
     
     def get_queryset(self):
-        return StudySession.objects.filter(user=self.request.user)
+        # シリアライザーが subject.name を参照するため科目を同時に取得
+        return StudySession.objects.filter(user=self.request.user).select_related('subject')
+
+    def list(self, request, *args, **kwargs):
+        # 一覧は .values() から直接組み立てる軽量表現で返す
+        queryset = self.filter_queryset(self.get_queryset()).values(*StudySessionListRepresentation.values_fields)
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(StudySessionListRepresentation.many(page))
+        return Response(StudySessionListRepresentation.many(queryset))
+
+    def perform_create(self, serializer):
+        # 進行中（end_time なし）のセッションは DB の一意制約で1つに制限
+        try:
+            with transaction.atomic():
+                super().perform_create(serializer)
+                keys = [rollup_key(serializer.instance)]
+                refresh_rollups(keys)
+                refresh_leaderboards(keys)
+        except IntegrityError:
+            raise ValidationError({'error': ACTIVE_SESSION_EXISTS_MESSAGE})
+
+    def perform_update(self, serializer):
+        # 更新前後で日付・科目が変わる可能性があるため両方の集計を再計算
+        old_key = rollup_key(serializer.instance)
+        was_active = serializer.instance.end_time is None
+        try:
+            with transaction.atomic():
+                super().perform_update(serializer)
+                session = serializer.instance
+                keys = [old_key, rollup_key(session)]
+                refresh_rollups(keys)
+                refresh_leaderboards(keys)
+                # 進行中のセッションを終了した場合は stop() と同じく貯金目標に加算
+                if was_active and session.end_time:
+                    credit_active_goal(session.user_id, session.earned_amount, credit_time(session))
+        except IntegrityError:
+            raise ValidationError({'error': ACTIVE_SESSION_EXISTS_MESSAGE})
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        keys = [rollup_key(instance)]
+        super().perform_destroy(instance)
+        refresh_rollups(keys)
+        refresh_leaderboards(keys)
         
     def update(self, request, *args, **kwargs):
         # 部分更新をサポート
@@ -143,7 +226,94 @@ class StudySessionViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        勉強セッションの履歴を CSV / NDJSON でストリーミング出力する
+
+        ?format=csv|ndjson と一覧と同じ絞り込み（subject, from, to, status）に対応し、
+        Accept-Encoding が gzip を受け付ける（q=0 でない）場合は圧縮しながら送信します。
+        """
+        renderer = request.accepted_renderer
+        queryset = self.filter_queryset(self.get_queryset()).order_by('start_time', 'id')
+        content = stream_sessions(queryset, renderer.format)
+
+        use_gzip = accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if use_gzip:
+            content = compress_sequence(chunk.encode('utf-8') for chunk in content)
+
+        response = StreamingHttpResponse(content, content_type=f"{renderer.media_type}; charset=utf-8")
+        filename = f"study_sessions_{timezone.localdate():%Y%m%d}.{renderer.format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Vary'] = 'Accept-Encoding'
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        return response
     
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        オフラインで記録した終了済みセッションを一括登録する
+
+        各セッションはクライアントが発行した client_id で識別し、登録済みの client_id は
+        スキップして duplicates として返します（同じリクエストを再送しても二重登録されません）。
+        登録・日別集計の更新・貯金目標への加算は1つのトランザクションで行います。
+        """
+        serializer = StudySessionBatchSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            # 同じユーザーの一括登録を直列化し、登録済みの確認から作成までの間に重複が入らないようにする
+            get_user_model().objects.select_for_update().filter(pk=request.user.pk).exists()
+
+            items = serializer.validated_data['sessions']
+            existing = set(StudySession.objects.filter(
+                user=request.user,
+                client_id__in=[item['client_id'] for item in items]
+            ).values_list('client_id', flat=True))
+
+            # 1回の一括登録は同じ登録時刻にそろえ、貯金目標へはまとめて加算する（reconcile_goals と同じ単位）
+            created_at = timezone.now()
+            sessions = []
+            duplicates = []
+            for item in items:
+                if item['client_id'] in existing:
+                    duplicates.append(item['client_id'])
+                    continue
+                # 同じリクエスト内の重複は最初の1件のみ登録
+                existing.add(item['client_id'])
+
+                session = StudySession(
+                    user=request.user,
+                    duration=item['end_time'] - item['start_time'],
+                    created_at=created_at,
+                    **item
+                )
+                session.apply_earnings()
+                sessions.append(session)
+
+            StudySession.objects.bulk_create(sessions)
+            credits = defaultdict(Decimal)
+            for session in sessions:
+                credits[credit_time(session)] += session.earned_amount
+
+            keys = {rollup_key(session) for session in sessions}
+            refresh_rollups(keys)
+            refresh_leaderboards(keys)
+
+            for credited_at in sorted(credits):
+                credit_active_goal(request.user.id, credits[credited_at], credited_at)
+            credited_amount = sum(credits.values(), Decimal('0'))
+
+        if sessions:
+            bump_data_version(request.user.id)
+        return Response({
+            'created': StudySessionSerializer(sessions, many=True).data,
+            'duplicates': [str(client_id) for client_id in duplicates],
+            'credited_amount': float(credited_amount)
+        }, status=status.HTTP_201_CREATED if sessions else status.HTTP_200_OK)
+
     @action(detail=False, methods=['post'])
     def start(self, request):
         subject_id = request.data.get('subject')
@@ -152,51 +322,60 @@ class StudySessionViewSet(viewsets.ModelViewSet):
         except Subject.DoesNotExist:
             return Response({'error': '科目が見つかりません。'}, status=status.HTTP_404_NOT_FOUND)
             
-        # 進行中のセッションがあるか確認
-        active_session = StudySession.objects.filter(user=request.user, end_time=None).first()
-        if active_session:
-            return Response({'error': '既に進行中の勉強セッションがあります。'}, status=status.HTTP_400_BAD_REQUEST)
-            
-        session = StudySession.objects.create(
-            user=request.user,
-            subject=subject,
-            start_time=timezone.now()
-        )
+        # 進行中のセッションは DB の一意制約で1つに制限（同時リクエストでも重複しない）
+        try:
+            with transaction.atomic():
+                session = StudySession.objects.create(
+                    user=request.user,
+                    subject=subject,
+                    start_time=timezone.now()
+                )
+        except IntegrityError:
+            return Response({'error': ACTIVE_SESSION_EXISTS_MESSAGE}, status=status.HTTP_400_BAD_REQUEST)
+        bump_data_version(request.user.id)
         
         return Response(StudySessionSerializer(session).data)
     
     @action(detail=True, methods=['post'])
     def stop(self, request, pk=None):
         try:
-            session = StudySession.objects.get(id=pk, user=request.user)
+            session = StudySession.objects.select_related('subject').get(id=pk, user=request.user)
         except StudySession.DoesNotExist:
             return Response({'error': '勉強セッションが見つかりません。'}, status=status.HTTP_404_NOT_FOUND)
-            
+
+        already_stopped = Response({'error': 'このセッションは既に終了しています。'}, status=status.HTTP_400_BAD_REQUEST)
         if session.end_time:
-            return Response({'error': 'このセッションは既に終了しています。'}, status=status.HTTP_400_BAD_REQUEST)
+            return already_stopped
             
         end_time = timezone.now()
         session.end_time = end_time
         session.duration = end_time - session.start_time
-        session.save()
+        session.apply_earnings()
         
-        # 仮想貯金を計算して追加
-        earned_amount = session.earned_amount
-        
-        # アクティブな貯金目標があれば、そこに加算
-        active_goal = SavingsGoal.objects.filter(user=request.user, is_achieved=False).first()
-        if active_goal:
-            from decimal import Decimal
-            active_goal.current_amount += Decimal(str(earned_amount))
-            if active_goal.current_amount >= active_goal.target_amount:
-                active_goal.is_achieved = True
-            active_goal.save()
+        with transaction.atomic():
+            # 未終了の場合のみ終了する（別の端末から同時に終了された場合は更新0件）
+            stopped = StudySession.objects.filter(id=session.id, end_time__isnull=True).update(
+                end_time=session.end_time,
+                duration=session.duration,
+                hourly_rate=session.hourly_rate,
+                earned_amount=session.earned_amount
+            )
+            if not stopped:
+                return already_stopped
+            
+            # 日別集計とランキングを更新
+            refresh_rollup(*rollup_key(session))
+            refresh_leaderboards([rollup_key(session)])
+            
+            # 終了時刻までに作成された未達成の貯金目標があれば、獲得金額を加算
+            credit_active_goal(request.user.id, session.earned_amount, credit_time(session))
         
+        bump_data_version(request.user.id)
         return Response(StudySessionSerializer(session).data)
     
     @action(detail=False, methods=['get'])
     def current(self, request):
-        session = StudySession.objects.filter(user=request.user, end_time=None).first()
+        session = StudySession.objects.filter(user=request.user, end_time=None).select_related('subject').first()
         if not session:
             return Response({'active': False})
         return Response({
@@ -205,83 +384,231 @@ class StudySessionViewSet(viewsets.ModelViewSet):
         })
 
 
-class SavingsGoalViewSet(viewsets.ModelViewSet):
-    """貯金目標のCRUD操作を行うViewSet"""
+class SavingsGoalViewSet(ConditionalGetMixin, UserDataVersionMixin, viewsets.ModelViewSet):
+    """
+    貯金目標のCRUD操作を行うViewSet
+
+    current_amount と is_achieved は勉強記録からの加算で決まるため読み取り専用です。
+    目標金額の変更や目標の削除で加算先が変わる場合は、その場で reconcile_goals と同じ
+    再計算を行い、定期的な再計算で後から金額が書き換わらないようにします。
+    """
     serializer_class = SavingsGoalSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtPagination
+    filter_backends = [SavingsGoalFilter]
+    etag_actions = ('list', 'retrieve')
     
     def get_queryset(self):
         return SavingsGoal.objects.filter(user=self.request.user)
-
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+    
+    def perform_update(self, serializer):
+        target_changed = serializer.validated_data.get(
+            'target_amount', serializer.instance.target_amount
+        ) != serializer.instance.target_amount
+        with transaction.atomic():
+            super().perform_update(serializer)
+            if target_changed:
+                reconcile_goals([self.request.user.id])
+                serializer.instance.refresh_from_db()
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            reconcile_goals([self.request.user.id])
 
 
-class StatsView(APIView):
+class StatsView(ConditionalGetMixin, APIView):
     """統計情報を取得するビュー"""
     permission_classes = [IsAuthenticated]
     
+    def get_etag_extra(self):
+        # 今週・今月の範囲は日付で変わる
+        return timezone.localdate().isoformat()
+    
     def get(self, request):
-        # 今週の勉強時間
-        now = timezone.now()
-        week_start = now - timedelta(days=now.weekday())
-        week_sessions = StudySession.objects.filter(
-            user=request.user,
-            end_time__isnull=False,
-            start_time__gte=week_start
-        )
-        
-        total_this_week = sum(
-            [session.duration.total_seconds() / 3600 if session.duration else 0 for session in week_sessions]
-        )
-        
-        # 今月の勉強時間
-        month_start = now.replace(day=1)
-        month_sessions = StudySession.objects.filter(
-            user=request.user,
-            end_time__isnull=False,
-            start_time__gte=month_start
-        )
-        
-        total_this_month = sum(
-            [session.duration.total_seconds() / 3600 if session.duration else 0 for session in month_sessions]
+        # 日別集計に対するグループ化クエリで統計を計算（データバージョン単位でキャッシュ）
+        stats = get_or_build_user_data(
+            'stats',
+            request.user.id,
+            lambda: get_user_stats(request.user),
+            timeout=settings.STATS_CACHE_TIMEOUT,
+            extra=timezone.localdate().isoformat(),
+            version=self.data_version
         )
-        
-        # 総貯金額
-        total_savings = sum(
-            [session.earned_amount for session in StudySession.objects.filter(
-                user=request.user, 
-                end_time__isnull=False
-            )]
+        return Response(stats)
+
+
+class StudySeriesView(ConditionalGetMixin, APIView):
+    """
+    日・週・月ごとの勉強時間と獲得金額の推移を取得するビュー（グラフ表示用）
+
+    - bucket: day（デフォルト） / week / month
+    - from / to: 日付（YYYY-MM-DD、to を含む。省略時は今日までの DEFAULT_BUCKETS 個分）
+    - subject: 科目ID
+    - tz: タイムゾーン名（例: Asia/Tokyo、省略時はサーバーのタイムゾーン）
+    """
+    permission_classes = [IsAuthenticated]
+    DEFAULT_BUCKETS = {'day': 30, 'week': 12, 'month': 12}
+    MAX_BUCKETS = 1000
+
+    def get_series_params(self):
+        params = self.request.query_params
+
+        bucket = params.get('bucket', 'day')
+        if bucket not in SERIES_BUCKETS:
+            raise ValidationError({'bucket': 'day / week / month のいずれかを指定してください。'})
+
+        tz_name = params.get('tz')
+        if tz_name:
+            try:
+                tz = zoneinfo.ZoneInfo(tz_name)
+            except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+                raise ValidationError({'tz': 'タイムゾーン名が正しくありません。'})
+        else:
+            tz = timezone.get_default_timezone()
+
+        end = self._parse_date(params, 'to') or timezone.localdate(timezone=tz)
+        start = self._parse_date(params, 'from')
+        if start is None:
+            start = bucket_start(end, bucket)
+            for _ in range(self.DEFAULT_BUCKETS[bucket] - 1):
+                start = previous_bucket_start(start, bucket)
+        if start > end:
+            raise ValidationError({'from': '開始日は終了日以前にしてください。'})
+        if bucket_count(start, end, bucket) > self.MAX_BUCKETS:
+            raise ValidationError({'from': f'期間が長すぎます（最大{self.MAX_BUCKETS}区間）。'})
+
+        subject = params.get('subject')
+        if subject and not subject.isdigit():
+            raise ValidationError({'subject': '科目IDが正しくありません。'})
+
+        return {
+            'bucket': bucket,
+            'start': start,
+            'end': end,
+            'tz': tz,
+            'subject_id': int(subject) if subject else None,
+        }
+
+    @staticmethod
+    def _parse_date(params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        return parse_date_param(value, name)
+
+    def get_etag_extra(self):
+        # from / to の省略時は今日の日付で範囲が決まる
+        params = self.get_series_params()
+        return '|'.join(str(value) for value in params.values())
+
+    def get(self, request):
+        params = self.get_series_params()
+        series = get_or_build_user_data(
+            'series',
+            request.user.id,
+            lambda: get_study_series(request.user, **params),
+            timeout=settings.STATS_CACHE_TIMEOUT,
+            extra='|'.join(str(value) for value in params.values()),
+            version=self.data_version
         )
-        
-        # 科目ごとの勉強時間
-        subject_stats = []
-        for subject in Subject.objects.filter(user=request.user):
-            subject_sessions = StudySession.objects.filter(
-                user=request.user,
-                subject=subject,
-                end_time__isnull=False
-            )
-            
-            total_hours = sum(
-                [session.duration.total_seconds() / 3600 if session.duration else 0 for session in subject_sessions]
-            )
-            
-            subject_stats.append({
-                'id': subject.id,
-                'name': subject.name,
-                'total_hours': round(total_hours, 2),
-                'total_earnings': sum([session.earned_amount for session in subject_sessions])
-            })
-        
+        return Response(series)
+
+
+class LeaderboardView(APIView):
+    """
+    週間・月間ランキングと自分の順位を取得するビュー
+
+    - period: week（デフォルト） / month
+    - metric: hours（デフォルト） / earnings
+    - subject: 科目名（省略時は全科目の合計。大文字・小文字と前後の空白は区別しない）
+    - date: 対象期間に含まれる日付（YYYY-MM-DD、省略時は今日）
+    - limit / offset: 取得する範囲（limit は最大 MAX_LIMIT）
+
+    他のユーザーの行は順位と値のみを返し、ユーザー名は返しません（自分の行のみ username を含みます）。
+    順位の計算コストは順位（自分より上の行数）に比例します（get_rank を参照）。
+    """
+    permission_classes = [IsAuthenticated]
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    def get(self, request):
+        params = request.query_params
+
+        period = params.get('period', 'week')
+        if period not in PERIODS:
+            raise ValidationError({'period': 'week または month を指定してください。'})
+        metric = params.get('metric', 'hours')
+        if metric not in METRICS:
+            raise ValidationError({'metric': 'hours または earnings を指定してください。'})
+
+        date = parse_date_param(params['date'], 'date') if params.get('date') else timezone.localdate()
+
+        try:
+            limit = min(int(params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+            offset = int(params.get('offset', 0))
+        except ValueError:
+            raise ValidationError({'limit': 'limit と offset は整数で指定してください。'})
+        if limit < 1 or offset < 0:
+            raise ValidationError({'limit': 'limit は1以上、offset は0以上を指定してください。'})
+
+        subject_name = normalize_subject_name(params.get('subject', ''))
+        start = current_period_start(period, date)
+        entries = get_leaderboard_page(period, start, subject_name, metric, offset, limit)
+
         return Response({
-            'total_hours_week': round(total_this_week, 2),
-            'total_hours_month': round(total_this_month, 2),
-            'total_savings': total_savings,
-            'subject_stats': subject_stats
+            'period': period,
+            'start': start.isoformat(),
+            'subject': subject_name or None,
+            'metric': metric,
+            'entries': [self._entry(entry, request.user) for entry in entries],
+            'me': get_rank(period, start, subject_name, metric, request.user.id),
         })
 
+    @staticmethod
+    def _entry(entry, user):
+        """他のユーザーの行は順位と値のみ返し、ユーザー名は自分の行にだけ付ける"""
+        if entry['user_id'] != user.id:
+            return {'rank': entry['rank'], 'value': entry['value'], 'is_me': False}
+        return {'rank': entry['rank'], 'username': user.username, 'value': entry['value'], 'is_me': True}
+
+
+class LearningFeaturesView(ConditionalGetMixin, APIView):
+    """学習パターンの特徴量（時間帯・曜日の分布、セッション長、連続学習日数、科目別傾向）を取得するビュー"""
+    permission_classes = [IsAuthenticated]
+
+    def get_etag_extra(self):
+        # 直近N日・週の範囲は日付で変わる
+        return timezone.localdate().isoformat()
+
+    def get(self, request):
+        features = get_or_build_user_data(
+            'features',
+            request.user.id,
+            lambda: get_learning_features(request.user),
+            timeout=settings.STATS_CACHE_TIMEOUT,
+            extra=timezone.localdate().isoformat(),
+            version=self.data_version
+        )
+        return Response(features)
+
+
+class CacheMetricsView(APIView):
+    """キャッシュのヒット率を取得する管理者用ビュー"""
+    permission_classes = [IsAdminUser]
+    namespaces = ('stats', 'series', 'features', 'auth_user')
+
+    def get(self, request):
+        return Response({namespace: get_cache_metrics(namespace) for namespace in self.namespaces})
+
+
+INSUFFICIENT_DATA_MESSAGE = "学習分析を行うには、少なくとも3つの完了した勉強セッションが必要です。もう少し勉強記録を増やしてから再度お試しください。"
+
+
+def has_enough_sessions_for_analysis(user):
+    """学習分析に必要な完了済みセッション（3件以上）があるか確認"""
+    return StudySession.objects.filter(user=user, end_time__isnull=False)[:3].count() >= 3
+
 
 @api_view(['POST'])
 def analyze_learning_view(request):
@@ -294,23 +621,30 @@ def analyze_learning_view(request):
         study_purpose = request.data.get('study_purpose', '')
         
         # 十分なデータがあるか確認
-        session_count = StudySession.objects.filter(
-            user=request.user,
-            end_time__isnull=False
-        ).count()
-        
-        if session_count < 3:
+        if not has_enough_sessions_for_analysis(request.user):
             return Response({
                 "error": False,
-                "analysis": "学習分析を行うには、少なくとも3つの完了した勉強セッションが必要です。もう少し勉強記録を増やしてから再度お試しください。"
+                "analysis": INSUFFICIENT_DATA_MESSAGE
             })
             
-        # AI分析を実行
-        analysis_result = analyze_learning(request.user, study_purpose)
+        force_refresh = str(request.data.get('force_refresh', '')).lower() in ('1', 'true')
+        
+        # 非同期モード: ジョブを登録してすぐにジョブIDを返す（結果は analyze-learning/jobs/<id>/ で取得）
+        if str(request.data.get('async', '')).lower() in ('1', 'true'):
+            job = enqueue_analysis_job(request.user, study_purpose, force_refresh=force_refresh)
+            return Response({
+                "error": False,
+                "job_id": job.id,
+                "status": job.status
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        # AI分析を実行（入力が前回と同じならキャッシュ済みの結果を返す）
+        analysis_result = run_learning_analysis(request.user, study_purpose, force_refresh=force_refresh)
         
         return Response({
             "error": False,
-            "analysis": analysis_result
+            "analysis": analysis_result['analysis'],
+            "cached": analysis_result['cached']
         })
             
     except Exception as e:
@@ -324,3 +658,50 @@ def analyze_learning_view(request):
             "error": True,
             "message": "分析中にエラーが発生しました。後でもう一度お試しください。"
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+def analyze_learning_job_view(request, job_id):
+    """非同期の学習分析ジョブの状態と結果を返すエンドポイント"""
+    try:
+        job = LearningAnalysisJob.objects.get(id=job_id, user=request.user)
+    except LearningAnalysisJob.DoesNotExist:
+        return Response({"error": True, "message": "分析ジョブが見つかりません。"}, status=status.HTTP_404_NOT_FOUND)
+    
+    data = {
+        "job_id": job.id,
+        "status": job.status,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "error": job.status == LearningAnalysisJob.STATUS_FAILED
+    }
+    if job.is_finished:
+        data["analysis"] = job.result
+        data["cached"] = job.cached
+    return Response(data)
+
+
+@api_view(['POST'])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def analyze_learning_stream_view(request):
+    """
+    学習分析の結果を生成されたそばから Server-Sent Events で返すエンドポイント
+    
+    イベント: chunk（{"text": 断片}）、done（{"cached": bool}）、error（{"message": ...}）
+    """
+    study_purpose = request.data.get('study_purpose', '')
+    force_refresh = str(request.data.get('force_refresh', '')).lower() in ('1', 'true')
+    
+    if not has_enough_sessions_for_analysis(request.user):
+        events = iter([('chunk', {'text': INSUFFICIENT_DATA_MESSAGE}), ('done', {'cached': False})])
+    else:
+        events = stream_learning_analysis(request.user, study_purpose, force_refresh=force_refresh)
+    
+    response = StreamingHttpResponse(
+        (format_sse_event(event, data) for event, data in events),
+        content_type='text/event-stream; charset=utf-8'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # nginx などのプロキシでバッファリングさせない
+    response['X-Accel-Buffering'] = 'no'
+    return response
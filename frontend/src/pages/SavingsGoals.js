@@ -89,8 +89,6 @@ function SavingsGoals() {
       title: '',
       target_amount: '',
       deadline: '',
-      current_amount: 0,
-      is_achieved: false,
     },
     validationSchema: validationSchema,
     onSubmit: async (values) => {
@@ -122,8 +120,6 @@ function SavingsGoals() {
         title: goal.title,
         target_amount: goal.target_amount,
         deadline: goal.deadline || '',
-        current_amount: goal.current_amount,
-        is_achieved: goal.is_achieved,
       });
     } else {
       setSelectedGoal(null);
@@ -164,25 +160,6 @@ function SavingsGoals() {
     }
   };
   
-  // 目標達成状態の切り替え
-  const handleToggleAchieved = async (goal) => {
-    try {
-      const updatedGoal = { ...goal, is_achieved: !goal.is_achieved };
-      await API.goals.update(goal.id, updatedGoal);
-      
-      if (!goal.is_achieved) {
-        setSnackbar({ open: true, message: '貯金目標を達成しました！おめでとうございます！', severity: 'success' });
-      } else {
-        setSnackbar({ open: true, message: '貯金目標を未達成に戻しました', severity: 'info' });
-      }
-      
-      fetchData();
-    } catch (error) {
-      console.error('目標状態変更エラー:', error);
-      setSnackbar({ open: true, message: '貯金目標の状態変更に失敗しました', severity: 'error' });
-    }
-  };
-  
   // スナックバーを閉じる
   const handleCloseSnackbar = () => {
     setSnackbar({ ...snackbar, open: false });
@@ -353,32 +330,21 @@ function SavingsGoals() {
                 
                 <Divider />
                 
-                <CardActions sx={{ justifyContent: 'space-between', p: 2 }}>
-                  <Box>
-                    <IconButton 
-                      size="small"
-                      onClick={() => handleOpenDialog(goal)}
-                      color="primary"
-                    >
-                      <EditIcon fontSize="small" />
-                    </IconButton>
-                    <IconButton 
-                      size="small"
-                      onClick={() => handleOpenDeleteDialog(goal)}
-                      color="error"
-                    >
-                      <DeleteIcon fontSize="small" />
-                    </IconButton>
-                  </Box>
-                  
-                  <Button 
+                <CardActions sx={{ p: 2 }}>
+                  <IconButton 
                     size="small"
-                    onClick={() => handleToggleAchieved(goal)}
-                    color={goal.is_achieved ? "inherit" : "success"}
-                    variant={goal.is_achieved ? "text" : "contained"}
+                    onClick={() => handleOpenDialog(goal)}
+                    color="primary"
                   >
-                    {goal.is_achieved ? '未達成に戻す' : '達成済みにする'}
-                  </Button>
+                    <EditIcon fontSize="small" />
+                  </IconButton>
+                  <IconButton 
+                    size="small"
+                    onClick={() => handleOpenDeleteDialog(goal)}
+                    color="error"
+                  >
+                    <DeleteIcon fontSize="small" />
+                  </IconButton>
                 </CardActions>
               </Card>
             </Grid>
@@ -425,22 +391,10 @@ function SavingsGoals() {
             />
             
             {selectedGoal && (
-              <TextField
-                fullWidth
-                margin="normal"
-                id="current_amount"
-                name="current_amount"
-                label="現在の金額"
-                type="number"
-                InputProps={{
-                  startAdornment: <InputAdornment position="start">¥</InputAdornment>,
-                }}
-                value={formik.values.current_amount}
-                onChange={formik.handleChange}
-                onBlur={formik.handleBlur}
-                error={formik.touched.current_amount && Boolean(formik.errors.current_amount)}
-                helperText={formik.touched.current_amount && formik.errors.current_amount}
-              />
+              <Typography variant="body2" color="text.secondary" sx={{ mt: 1 }}>
+                現在の金額（¥{Math.round(selectedGoal.current_amount).toLocaleString()}）と達成状態は、
+                勉強の記録から自動で加算・判定されます。
+              </Typography>
             )}
             
             <TextField
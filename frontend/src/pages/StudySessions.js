@@ -47,6 +47,9 @@ function StudySessions() {
   const [sessions, setSessions] = useState([]);
   const [page, setPage] = useState(0);
   const [rowsPerPage, setRowsPerPage] = useState(10);
+  // 各ページの取得に使うカーソル（先頭ページは null）。一覧はサーバー側でページングする
+  const [cursors, setCursors] = useState([null]);
+  const [hasNext, setHasNext] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [openDialog, setOpenDialog] = useState(false);
@@ -54,12 +57,32 @@ function StudySessions() {
   const [selectedSession, setSelectedSession] = useState(null);
   const [snackbar, setSnackbar] = useState({ open: false, message: '', severity: 'success' });
   
-  // セッションデータ取得
-  const fetchSessions = async () => {
+  // セッションデータ取得（指定ページの分だけ取得し、次のページのカーソルを記録）
+  const fetchSessions = async (pageIndex = page, pageCursors = cursors, pageSize = rowsPerPage) => {
     try {
       setLoading(true);
-      const response = await API.sessions.getAll();
-      setSessions(response.data);
+      const params = { page_size: pageSize };
+      if (pageCursors[pageIndex]) {
+        params.cursor = pageCursors[pageIndex];
+      }
+      const response = await API.sessions.list(params);
+      const { results, next } = response.data;
+      
+      // 削除などで最後のページが空になった場合は前のページを表示
+      if (results.length === 0 && pageIndex > 0) {
+        setPage(pageIndex - 1);
+        await fetchSessions(pageIndex - 1, pageCursors, pageSize);
+        return;
+      }
+      
+      const nextCursor = next ? new URL(next, window.location.origin).searchParams.get('cursor') : null;
+      const updatedCursors = pageCursors.slice(0, pageIndex + 1);
+      if (nextCursor) {
+        updatedCursors.push(nextCursor);
+      }
+      setSessions(results);
+      setCursors(updatedCursors);
+      setHasNext(Boolean(nextCursor));
     } catch (error) {
       console.error('セッション取得エラー:', error);
       setError('勉強記録の読み込みに失敗しました。');
@@ -135,15 +158,18 @@ function StudySessions() {
     setSnackbar({ ...snackbar, open: false });
   };
   
-  // ページ変更
+  // ページ変更（前後のページのカーソルで取得）
   const handleChangePage = (event, newPage) => {
     setPage(newPage);
+    fetchSessions(newPage);
   };
   
-  // 1ページあたりの行数変更
+  // 1ページあたりの行数変更（カーソルを破棄して先頭から取得し直す）
   const handleChangeRowsPerPage = (event) => {
-    setRowsPerPage(parseInt(event.target.value, 10));
+    const pageSize = parseInt(event.target.value, 10);
+    setRowsPerPage(pageSize);
     setPage(0);
+    fetchSessions(0, [null], pageSize);
   };
   
   // 時間をフォーマット（00:00:00）
@@ -245,67 +271,65 @@ function StudySessions() {
                 </TableRow>
               </TableHead>
               <TableBody>
-                {sessions
-                  .slice(page * rowsPerPage, page * rowsPerPage + rowsPerPage)
-                  .map((session) => (
-                    <TableRow key={session.id}>
-                      <TableCell component="th" scope="row">
-                        {session.subject_name}
-                        {session.is_active && (
-                          <Chip 
-                            label="進行中" 
-                            color="primary" 
-                            size="small" 
-                            sx={{ ml: 1 }} 
-                          />
-                        )}
-                      </TableCell>
-                      <TableCell>
-                        {format(parseISO(session.start_time), 'yyyy年MM月dd日 HH:mm', { locale: ja })}
-                      </TableCell>
-                      <TableCell>
-                        {session.end_time 
-                          ? format(parseISO(session.end_time), 'yyyy年MM月dd日 HH:mm', { locale: ja }) 
-                          : '-'
-                        }
-                      </TableCell>
-                      <TableCell>
-                        {session.duration ? formatDuration(session.duration) : '-'}
-                      </TableCell>
-                      <TableCell align="right">
-                        {session.earned_amount 
-                          ? `¥${Math.round(session.earned_amount).toLocaleString()}` 
-                          : '-'
-                        }
-                      </TableCell>
-                      <TableCell align="right">
-                        <IconButton 
-                          size="small" 
+                {sessions.map((session) => (
+                  <TableRow key={session.id}>
+                    <TableCell component="th" scope="row">
+                      {session.subject_name}
+                      {session.is_active && (
+                        <Chip 
+                          label="進行中" 
                           color="primary" 
-                          onClick={() => handleOpenDialog(session)}
-                          sx={{ mr: 1 }}
-                          disabled={session.is_active}
-                        >
-                          <EditIcon fontSize="small" />
-                        </IconButton>
-                        <IconButton 
                           size="small" 
-                          color="error" 
-                          onClick={() => handleOpenDeleteDialog(session)}
-                          disabled={session.is_active}
-                        >
-                          <DeleteIcon fontSize="small" />
-                        </IconButton>
-                      </TableCell>
-                    </TableRow>
-                  ))}
+                          sx={{ ml: 1 }} 
+                        />
+                      )}
+                    </TableCell>
+                    <TableCell>
+                      {format(parseISO(session.start_time), 'yyyy年MM月dd日 HH:mm', { locale: ja })}
+                    </TableCell>
+                    <TableCell>
+                      {session.end_time 
+                        ? format(parseISO(session.end_time), 'yyyy年MM月dd日 HH:mm', { locale: ja }) 
+                        : '-'
+                      }
+                    </TableCell>
+                    <TableCell>
+                      {session.duration ? formatDuration(session.duration) : '-'}
+                    </TableCell>
+                    <TableCell align="right">
+                      {session.earned_amount 
+                        ? `¥${Math.round(session.earned_amount).toLocaleString()}` 
+                        : '-'
+                      }
+                    </TableCell>
+                    <TableCell align="right">
+                      <IconButton 
+                        size="small" 
+                        color="primary" 
+                        onClick={() => handleOpenDialog(session)}
+                        sx={{ mr: 1 }}
+                        disabled={session.is_active}
+                      >
+                        <EditIcon fontSize="small" />
+                      </IconButton>
+                      <IconButton 
+                        size="small" 
+                        color="error" 
+                        onClick={() => handleOpenDeleteDialog(session)}
+                        disabled={session.is_active}
+                      >
+                        <DeleteIcon fontSize="small" />
+                      </IconButton>
+                    </TableCell>
+                  </TableRow>
+                ))}
               </TableBody>
             </Table>
           </TableContainer>
           <TablePagination
             rowsPerPageOptions={[5, 10, 25]}
             component="div"
-            count={sessions.length}
+            count={hasNext ? -1 : page * rowsPerPage + sessions.length}
             rowsPerPage={rowsPerPage}
             page={page}
             onPageChange={handleChangePage}
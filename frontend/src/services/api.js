@@ -358,6 +358,8 @@ const API = {
   // 勉強セッション関連
   sessions: {
     getAll: () => axiosInstance.get('/sessions/'),
+    // page_size / cursor を指定するとサーバー側でページングした {next, previous, results} を返す
+    list: (params) => axiosInstance.get('/sessions/', { params }),
     getById: (id) => axiosInstance.get(`/sessions/${id}/`),
     create: (sessionData) => axiosInstance.post('/sessions/', sessionData),
     update: (id, sessionData) => axiosInstance.put(`/sessions/${id}/`, sessionData),